@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+"""Measures bytes on the wire and latency of a big property collector reply
+with and without HTTP compression. The reply is served by a local stub server
+which can be throttled to emulate a WAN link. No vCenter is needed.
+
+    python benchmarks/bench_compression.py [-n objects] [-r rounds] [-b KB/s]
+"""
+
+import sys
+import os
+import time
+import threading
+import BaseHTTPServer
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysphere.ZSI.client import Binding, _gzip
+
+def retrieve_properties_reply(count):
+    objects = []
+    for i in xrange(count):
+        objects.append(
+            '<objects><obj type="VirtualMachine">vm-%d</obj>'
+            '<propSet><name>config.files.vmPathName</name>'
+            '<val xsi:type="xsd:string">[datastore%d] vm-%d/vm-%d.vmx</val>'
+            '</propSet><propSet><name>name</name>'
+            '<val xsi:type="xsd:string">vm-%d</val></propSet>'
+            '<propSet><name>runtime.powerState</name>'
+            '<val xsi:type="VirtualMachinePowerState">poweredOn</val>'
+            '</propSet></objects>' % (i, i % 16, i, i, i))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            '<soapenv:Body><RetrievePropertiesExResponse xmlns="urn:vim25">'
+            '<returnval>%s</returnval></RetrievePropertiesExResponse>'
+            '</soapenv:Body></soapenv:Envelope>' % "".join(objects))
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.0"
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.getheader('content-length')))
+        body = self.server.reply
+        accept = self.headers.getheader('accept-encoding') or ''
+        self.send_response(200)
+        self.send_header("Content-Type", 'text/xml; charset="utf-8"')
+        if 'gzip' in accept:
+            body = self.server.gzip_reply
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", "%d" % len(body))
+        self.end_headers()
+        self.server.sent = len(body)
+        rate = self.server.bandwidth
+        chunk = rate and max(rate / 100, 1) or len(body)
+        for i in xrange(0, len(body), chunk):
+            self.wfile.write(body[i:i+chunk])
+            if rate:
+                time.sleep(float(chunk) / rate)
+
+    def log_message(self, *args):
+        pass
+
+def start_server(reply, bandwidth):
+    server = BaseHTTPServer.HTTPServer(("127.0.0.1", 0), StubHandler)
+    server.reply = reply
+    server.gzip_reply = _gzip(reply)
+    server.bandwidth = bandwidth
+    server.sent = 0
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+def bench(server, compression, rounds):
+    url = "http://127.0.0.1:%d/sdk" % server.server_address[1]
+    binding = Binding(url=url, compression=compression)
+    best = None
+    for _ in xrange(rounds):
+        start = time.time()
+        binding.Send(None, 'RetrievePropertiesEx', {})
+        data = binding.ReceiveRaw()
+        binding.ReceiveSOAP()
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    print "%-12s %10d bytes on the wire %10d bytes XML  %8.3fs" % (
+           compression and "compressed" or "plain", server.sent, len(data),
+           best)
+    return data
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-n", "--objects", type="int", default=5000,
+                      help="number of objects in the reply")
+    parser.add_option("-r", "--rounds", type="int", default=3,
+                      help="rounds per mode, the best one is reported")
+    parser.add_option("-b", "--bandwidth", type="int", default=0,
+                      help="throttle the stub server to this many KB/s")
+    options, args = parser.parse_args()
+
+    server = start_server(retrieve_properties_reply(options.objects),
+                          options.bandwidth * 1024)
+    plain = bench(server, False, options.rounds)
+    compressed = bench(server, True, options.rounds)
+    server.shutdown()
+    sys.exit(plain != compressed and 1 or 0)
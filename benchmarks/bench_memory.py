@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""Measures the memory taken by decoded VirtualMachineConfigInfo objects
+with the default pyclasses and with __slots__ pyclasses (ZSI_PYCLASS_SLOTS=1,
+see wsdl2py --slots), in bytes per VM. Every mode runs in its own process as
+the pyclasses are made when the types module is imported. No server is
+needed.
+
+    python benchmarks/bench_memory.py [-n vms]
+"""
+
+import sys
+import os
+import gc
+import time
+import subprocess
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysphere.resources import VimService_services as VI
+from pysphere.ZSI.parse import ParsedSoap
+from bench_parse import DEVICES
+
+SCALARS = (str, unicode, int, long, float, bool, type(None))
+
+def vm_config(i):
+    extra_config = "".join(['<extraConfig><key>guestinfo.key%d</key>'
+                            '<value xsi:type="xsd:string">value %d</value>'
+                            '</extraConfig>' % (k, k) for k in xrange(8)])
+    return (
+        '<val xsi:type="VirtualMachineConfigInfo">'
+        '<changeVersion>2013-01-01T00:00:00.000000Z</changeVersion>'
+        '<modified>1970-01-01T00:00:00Z</modified>'
+        '<name>vm-%(i)d</name><guestFullName>Ubuntu Linux (64-bit)'
+        '</guestFullName><version>vmx-08</version>'
+        '<uuid>4201a3c4-0000-0000-0000-%(i)012d</uuid>'
+        '<instanceUuid>5001b3c4-0000-0000-0000-%(i)012d</instanceUuid>'
+        '<template>false</template><guestId>ubuntu64Guest</guestId>'
+        '<alternateGuestName></alternateGuestName>'
+        '<annotation>benchmark vm %(i)d</annotation>'
+        '<files><vmPathName>[datastore1] vm-%(i)d/vm-%(i)d.vmx</vmPathName>'
+        '<snapshotDirectory>[datastore1] vm-%(i)d/</snapshotDirectory>'
+        '<suspendDirectory>[datastore1] vm-%(i)d/</suspendDirectory>'
+        '<logDirectory>[datastore1] vm-%(i)d/</logDirectory></files>'
+        '<hardware><numCPU>2</numCPU><numCoresPerSocket>1</numCoresPerSocket>'
+        '<memoryMB>4096</memoryMB>%(devices)s</hardware>'
+        '%(extra)s</val>' % {'i':i, 'extra':extra_config,
+        'devices':(DEVICES % {'i':i, 'disk':2000 + i % 4,
+                   'mac':"%02x:%02x" % (i / 256 % 256, i % 256)}
+                  ).replace('VirtualDevice ', 'device ').replace(
+                    '</VirtualDevice>', '</device>')})
+
+def retrieve_properties_reply(count):
+    objects = []
+    for i in xrange(count):
+        objects.append('<objects><obj type="VirtualMachine">vm-%d</obj>'
+                       '<propSet><name>config</name>%s</propSet></objects>'
+                       % (i, vm_config(i)))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            '<soapenv:Body><RetrievePropertiesExResponse xmlns="urn:vim25">'
+            '<returnval>%s</returnval></RetrievePropertiesExResponse>'
+            '</soapenv:Body></soapenv:Envelope>' % "".join(objects))
+
+def deep_size(obj):
+    """sys.getsizeof of obj and of everything it references (instance
+    dictionaries, slots, containers), each object counted once."""
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, type):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, SCALARS):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+            continue
+        if isinstance(o, (list, tuple)):
+            stack.extend(o)
+            continue
+        d = getattr(o, '__dict__', None)
+        if d is not None:
+            stack.append(d)
+        for cls in type(o).__mro__:
+            for name in cls.__dict__.get('__slots__', ()):
+                value = getattr(o, name, None)
+                if value is not None:
+                    stack.append(value)
+    return total
+
+def measure(count):
+    slots = bool(int(os.environ.get('ZSI_PYCLASS_SLOTS', 0)))
+    ps = ParsedSoap(retrieve_properties_reply(count))
+    gc.collect()
+    start = time.time()
+    response = ps.Parse(VI.RetrievePropertiesExResponseMsg.typecode)
+    elapsed = time.time() - start
+    configs = [o.PropSet[0].Val for o in response._returnval.Objects]
+    print "%-8s %10d bytes per VM config  parsed in %.3fs" % (
+           slots and "slots" or "dict", deep_size(configs) / count, elapsed)
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-n", "--vms", type="int", default=1000,
+                      help="number of VM configs in the reply")
+    parser.add_option("--single", action="store_true", default=False,
+                      help="only measure the mode of this process")
+    options, args = parser.parse_args()
+
+    if options.single:
+        measure(options.vms)
+    else:
+        for slots in ("0", "1"):
+            env = dict(os.environ, ZSI_PYCLASS_SLOTS=slots)
+            subprocess.check_call([sys.executable, __file__, "-n",
+                                   str(options.vms), "--single"], env=env)
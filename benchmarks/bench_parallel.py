@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""Times the parsing of a RetrievePropertiesEx reply full of
+VirtualMachineConfigInfo objects serially and with ZSI.parallel worker pools
+of increasing size. No server is needed.
+
+    python benchmarks/bench_parallel.py [-n vms] [-r rounds] [-p max processes]
+"""
+
+import sys
+import os
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysphere.resources import VimService_services as VI
+from pysphere.ZSI.parse import ParsedSoap
+from pysphere.ZSI.parallel import ParallelParser
+from bench_memory import retrieve_properties_reply
+
+def bench(reply, rounds, processes):
+    typecode = VI.RetrievePropertiesExResponseMsg.typecode
+    if processes:
+        parser = ParallelParser([VI.__name__], processes, min_items=2)
+        parse = parser.items('returnval', 'objects')
+        #start the workers
+        parse(reply, typecode)
+    else:
+        parse = lambda data, tc: ParsedSoap(data).Parse(tc)
+    best = None
+    for _ in xrange(rounds):
+        start = time.time()
+        response = parse(reply, typecode)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    if processes:
+        parser.close()
+    print "%-14s %8.3fs  %d objects" % (
+           processes and "%d processes" % processes or "serial", best,
+           len(response._returnval.Objects))
+    return best
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-n", "--vms", type="int", default=2000,
+                      help="number of VM configs in the reply")
+    parser.add_option("-r", "--rounds", type="int", default=3,
+                      help="rounds per mode, the best one is reported")
+    parser.add_option("-p", "--processes", type="int", default=4,
+                      help="largest worker pool to time")
+    options, args = parser.parse_args()
+
+    reply = retrieve_properties_reply(options.vms)
+    serial = bench(reply, options.rounds, 0)
+    processes = 1
+    while processes <= options.processes:
+        print "x%.2f" % (serial / max(bench(reply, options.rounds, processes),
+                                      1e-9))
+        processes *= 2
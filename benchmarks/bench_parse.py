@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""Times the parsing of RetrievePropertiesEx replies full of xsi:type
+substitutions (anyType property values, VirtualDevice subtypes) with and
+without the substitute typecode cache of TypeDefinition. No server is needed,
+the reply is generated unless the replies of a recorded session (see
+bench_suite.py) are given.
+
+    python benchmarks/bench_parse.py [-n vms] [-r rounds] [-i session.json]
+"""
+
+import sys
+import os
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysphere.resources import VimService_services as VI
+from pysphere.ZSI.parse import ParsedSoap
+from pysphere.ZSI.schema import TypeDefinition
+from pysphere.ZSI.replay import Recording, _operation
+from pysphere.ZSI.client import _Decompressor
+
+DEVICES = (
+    '<VirtualDevice xsi:type="VirtualDisk"><key>%(disk)d</key>'
+    '<deviceInfo><label>Hard disk 1</label><summary>16,777,216 KB</summary>'
+    '</deviceInfo><backing xsi:type="VirtualDiskFlatVer2BackingInfo">'
+    '<fileName>[datastore1] vm-%(i)d/vm-%(i)d.vmdk</fileName>'
+    '<diskMode>persistent</diskMode><thinProvisioned>true</thinProvisioned>'
+    '</backing><controllerKey>1000</controllerKey><unitNumber>0</unitNumber>'
+    '<capacityInKB>16777216</capacityInKB></VirtualDevice>'
+    '<VirtualDevice xsi:type="VirtualE1000"><key>4000</key>'
+    '<deviceInfo><label>Network adapter 1</label><summary>VM Network'
+    '</summary></deviceInfo>'
+    '<backing xsi:type="VirtualEthernetCardNetworkBackingInfo">'
+    '<deviceName>VM Network</deviceName><useAutoDetect>false</useAutoDetect>'
+    '</backing><controllerKey>100</controllerKey><unitNumber>7</unitNumber>'
+    '<addressType>assigned</addressType>'
+    '<macAddress>00:50:56:00:%(mac)s</macAddress></VirtualDevice>'
+    '<VirtualDevice xsi:type="VirtualCdrom"><key>3002</key>'
+    '<deviceInfo><label>CD/DVD drive 1</label><summary>Remote device'
+    '</summary></deviceInfo>'
+    '<backing xsi:type="VirtualCdromRemotePassthroughBackingInfo">'
+    '<deviceName></deviceName><useAutoDetect>false</useAutoDetect>'
+    '<exclusive>false</exclusive></backing>'
+    '<controllerKey>201</controllerKey><unitNumber>0</unitNumber>'
+    '</VirtualDevice>')
+
+def retrieve_properties_reply(count):
+    objects = []
+    for i in xrange(count):
+        devices = DEVICES % {'i':i, 'disk':2000 + i % 4,
+                             'mac':"%02x:%02x" % (i / 256 % 256, i % 256)}
+        objects.append(
+            '<objects><obj type="VirtualMachine">vm-%d</obj>'
+            '<propSet><name>config.hardware.device</name>'
+            '<val xsi:type="ArrayOfVirtualDevice">%s</val></propSet>'
+            '<propSet><name>name</name>'
+            '<val xsi:type="xsd:string">vm-%d</val></propSet>'
+            '<propSet><name>runtime.powerState</name>'
+            '<val xsi:type="VirtualMachinePowerState">poweredOn</val>'
+            '</propSet></objects>' % (i, devices, i))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            '<soapenv:Body><RetrievePropertiesExResponse xmlns="urn:vim25">'
+            '<returnval>%s</returnval></RetrievePropertiesExResponse>'
+            '</soapenv:Body></soapenv:Envelope>' % "".join(objects))
+
+def recorded_replies(path):
+    replies = []
+    for exchange in Recording.load(path).exchanges:
+        if _operation(exchange['request']) != 'RetrievePropertiesEx' or \
+           exchange['status'] != 200:
+            continue
+        body = exchange['body']
+        for header, value in exchange['headers']:
+            if header.lower() == 'content-encoding':
+                decompressor = _Decompressor(value)
+                body = decompressor.feed(body) + decompressor.flush()
+        replies.append(body)
+    return replies
+
+class _NoCache(dict):
+    def setdefault(self, key, value):
+        return value
+
+def bench(replies, rounds, cached):
+    substitutes = TypeDefinition._substitutes
+    if cached:
+        TypeDefinition._substitutes = {}
+    else:
+        TypeDefinition._substitutes = _NoCache()
+    try:
+        typecode = VI.RetrievePropertiesExResponseMsg.typecode
+        best = None
+        for _ in xrange(rounds):
+            start = time.time()
+            for reply in replies:
+                ParsedSoap(reply).Parse(typecode)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+    finally:
+        TypeDefinition._substitutes = substitutes
+    print "%-10s %8.3fs" % (cached and "cached" or "uncached", best)
+    return best
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-n", "--vms", type="int", default=2000,
+                      help="number of VMs in the generated reply")
+    parser.add_option("-r", "--rounds", type="int", default=3,
+                      help="rounds per mode, the best one is reported")
+    parser.add_option("-i", "--input",
+                      help="parse the RetrievePropertiesEx replies of this "
+                           "recorded session instead")
+    options, args = parser.parse_args()
+
+    if options.input:
+        replies = recorded_replies(options.input)
+    else:
+        replies = [retrieve_properties_reply(options.vms)]
+    print "%d replies, %d bytes" % (len(replies),
+                                    sum([len(r) for r in replies]))
+    uncached = bench(replies, options.rounds, False)
+    cached = bench(replies, options.rounds, True)
+    print "x%.2f" % (uncached / max(cached, 1e-9))
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+"""Compares the time spent serializing big requests with the default DOM
+based writer (ElementProxy + c14n) and with StreamElementProxy, and checks
+both produce the same message. No server is needed.
+
+    python benchmarks/bench_serialization.py [-n objects] [-r rounds]
+"""
+
+import sys
+import os
+import time
+from optparse import OptionParser
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysphere.resources import VimService_services as VI
+from pysphere.ZSI import SoapWriter
+from pysphere.ZSI.wstools.Utility import ElementProxy, StreamElementProxy
+from pysphere import VIMor, MORTypes
+
+def retrieve_properties_request(count):
+    request = VI.RetrievePropertiesExRequestMsg()
+    _this = request.new__this(VIMor("propertyCollector",
+                                    MORTypes.PropertyCollector))
+    _this.set_attribute_type(MORTypes.PropertyCollector)
+    request.set_element__this(_this)
+    request.set_element_options(request.new_options())
+
+    spec_set = request.new_specSet()
+    prop_set = spec_set.new_propSet()
+    prop_set.set_element_type(MORTypes.VirtualMachine)
+    prop_set.set_element_pathSet(['name', 'runtime.powerState',
+                                  'config.files.vmPathName'])
+    prop_set.set_element_all(False)
+    spec_set.set_element_propSet([prop_set])
+
+    object_sets = []
+    for i in xrange(count):
+        object_set = spec_set.new_objectSet()
+        obj = object_set.new_obj(VIMor("vm-%d" % i, MORTypes.VirtualMachine))
+        obj.set_attribute_type(MORTypes.VirtualMachine)
+        object_set.set_element_obj(obj)
+        object_set.set_element_skip(False)
+        object_sets.append(object_set)
+    spec_set.set_element_objectSet(object_sets)
+    request.set_element_specSet([spec_set])
+    return request
+
+def reconfig_request(count):
+    request = VI.ReconfigVM_TaskRequestMsg()
+    _this = request.new__this(VIMor("vm-1", MORTypes.VirtualMachine))
+    _this.set_attribute_type(MORTypes.VirtualMachine)
+    request.set_element__this(_this)
+    spec = request.new_spec()
+    spec.set_element_annotation("benchmark & <notes>")
+    extra_config = []
+    for i in xrange(count):
+        ec = spec.new_extraConfig()
+        ec.set_element_key("guestinfo.key%d" % i)
+        ec.set_element_value("value %d" % i)
+        extra_config.append(ec)
+    spec.set_element_extraConfig(extra_config)
+    request.set_element_spec(spec)
+    return request
+
+def serialize(request, writerclass):
+    sw = SoapWriter(nsdict={}, header=True, outputclass=writerclass)
+    sw.serialize(request, request.typecode)
+    return str(sw)
+
+def bench(name, request, rounds):
+    results = {}
+    for writerclass in (ElementProxy, StreamElementProxy):
+        best = None
+        for _ in xrange(rounds):
+            start = time.time()
+            soapdata = serialize(request, writerclass)
+            elapsed = time.time() - start
+            if best is None or elapsed < best:
+                best = elapsed
+        results[writerclass] = (best, soapdata)
+    dom_time, dom_data = results[ElementProxy]
+    stream_time, stream_data = results[StreamElementProxy]
+    print "%-22s %8d bytes  dom %8.3fs  stream %8.3fs  x%.1f  %s" % (
+           name, len(dom_data), dom_time, stream_time,
+           dom_time / max(stream_time, 1e-9),
+           dom_data == stream_data and "identical" or "DIFFERENT")
+    return dom_data == stream_data
+
+if __name__ == "__main__":
+    parser = OptionParser()
+    parser.add_option("-n", "--objects", type="int", default=5000,
+                      help="number of objectSets/extraConfig options")
+    parser.add_option("-r", "--rounds", type="int", default=3,
+                      help="rounds per writer, the best one is reported")
+    options, args = parser.parse_args()
+
+    ok = bench("RetrievePropertiesEx", retrieve_properties_request(
+                                          options.objects), options.rounds)
+    ok = bench("ReconfigVM_Task", reconfig_request(options.objects),
+               options.rounds) and ok
+    sys.exit(not ok and 1 or 0)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+"""End to end timings of common pysphere calls, replayed offline from a
+recorded session so they can run without a vCenter (e.g. in CI).
+
+Record a session once against a live server:
+
+    python benchmarks/bench_suite.py record -s host -u user -p password \\
+                                            -o session.json
+
+Replay it as many rounds as wanted, results are written as JSON:
+
+    python benchmarks/bench_suite.py replay -i session.json [-r rounds] \\
+                                            [-o results.json]
+
+The recording holds the SOAP replies of the server (passwords in the
+requests are not stored). Each step reports the best and mean wall time and
+the number of requests it makes.
+"""
+
+import sys
+import os
+import time
+import platform
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from pysphere import VIServer
+from pysphere.ZSI.replay import Recording, RecordingHTTPConnection, \
+                                RecordingHTTPSConnection, ReplayHTTPConnection
+
+REPLAY_URL = "http://replay/sdk"
+
+def scenario(host, user, password, transport, recording, options):
+    """Yields (step name, callable) pairs, every callable uses the results of
+    the previous ones. The calls must be deterministic so the replay sends
+    the requests that were recorded."""
+    state = {}
+
+    def connect():
+        server = VIServer()
+        server.connect(host, user, password, transport=transport,
+                       transdict={'recording':recording})
+        state['server'] = server
+    yield "connect", connect
+
+    def get_registered_vms():
+        state['paths'] = sorted(state['server'].get_registered_vms())
+    yield "get_registered_vms", get_registered_vms
+
+    def get_vm_by_path():
+        state['vms'] = [state['server'].get_vm_by_path(path)
+                        for path in state['paths'][:options.vms]]
+    yield "get_vm_by_path", get_vm_by_path
+
+    def get_entity_statistic():
+        pm = state['server'].get_performance_manager()
+        for vm in state['vms']:
+            if vm.is_powered_on():
+                pm.get_entity_statistic(vm._mor, ['cpu.usage', 'mem.usage'])
+                break
+    yield "get_entity_statistic", get_entity_statistic
+
+    def event_paging():
+        collector = state['server'].get_event_history_collector()
+        collector.get_latest_events()
+        for _ in xrange(options.pages):
+            if not collector.read_previous_events(100):
+                break
+    yield "event_paging", event_paging
+
+    def task_waits():
+        collector = state['server'].get_task_history_collector()
+        for task in collector.get_latest_tasks()[:options.vms]:
+            task.wait_for_state([task.STATE_SUCCESS, task.STATE_ERROR],
+                                check_interval=0, timeout=60)
+    yield "task_waits", task_waits
+
+    def disconnect():
+        state['server'].disconnect()
+    yield "disconnect", disconnect
+
+def requests_made(recording, transport):
+    if transport is ReplayHTTPConnection:
+        return len(recording.exchanges) - len(recording._pending)
+    return len(recording.exchanges)
+
+def run(host, user, password, transport, recording, options, results):
+    for name, step in scenario(host, user, password, transport, recording,
+                               options):
+        before = requests_made(recording, transport)
+        start = time.time()
+        step()
+        elapsed = time.time() - start
+        result = results.setdefault(name, {'times':[]})
+        result['times'].append(elapsed)
+        result['requests'] = requests_made(recording, transport) - before
+
+def report(results, options, mode):
+    steps = {}
+    for name, result in results.iteritems():
+        times = result['times']
+        steps[name] = {'best':min(times), 'mean':sum(times) / len(times),
+                       'rounds':len(times), 'requests':result['requests']}
+        print >> sys.stderr, "%-22s best %8.4fs  mean %8.4fs  %5d requests" % (
+                   name, steps[name]['best'], steps[name]['mean'],
+                   steps[name]['requests'])
+    data = {'mode':mode, 'timestamp':time.time(),
+            'python':platform.python_version(), 'steps':steps}
+    if options.output:
+        f = open(options.output, 'w')
+        try:
+            json.dump(data, f, indent=1, sort_keys=True)
+        finally:
+            f.close()
+    else:
+        print json.dumps(data, indent=1, sort_keys=True)
+
+if __name__ == "__main__":
+    parser = OptionParser(usage="%prog record|replay [options]")
+    parser.add_option("-s", "--server", help="server to record from")
+    parser.add_option("-u", "--user")
+    parser.add_option("-p", "--password")
+    parser.add_option("-i", "--input", help="recording to replay")
+    parser.add_option("-o", "--output",
+                      help="recording (record) or JSON results (replay) file")
+    parser.add_option("-r", "--rounds", type="int", default=5,
+                      help="rounds to replay")
+    parser.add_option("-n", "--vms", type="int", default=20,
+                      help="number of VMs and tasks to query")
+    parser.add_option("--pages", type="int", default=5,
+                      help="number of event pages to read")
+    options, args = parser.parse_args()
+    if len(args) != 1 or args[0] not in ("record", "replay"):
+        parser.error("either 'record' or 'replay' must be given")
+
+    results = {}
+    if args[0] == "record":
+        if not (options.server and options.user and options.password
+                and options.output):
+            parser.error("record needs --server, --user, --password and "
+                         "--output")
+        recording = Recording()
+        transport = RecordingHTTPSConnection
+        if options.server.lower().startswith("http://"):
+            transport = RecordingHTTPConnection
+        run(options.server, options.user, options.password, transport,
+            recording, options, results)
+        recording.save(options.output)
+        options.output = None
+    else:
+        if not options.input:
+            parser.error("replay needs --input")
+        recording = Recording.load(options.input)
+        for _ in xrange(options.rounds):
+            recording.rewind()
+            run(REPLAY_URL, "user", "password", ReplayHTTPConnection,
+                recording, options, results)
+    report(results, options, args[0])
@@ -6,8 +6,8 @@
 from inspect import isclass
 
 from pysphere.ZSI import _children, _child_elements, _floattypes, \
-    _stringtypes, _seqtypes, _find_attrNodeNS, _find_arraytype, _find_href, \
-    _find_encstyle, _resolve_prefix, _find_xsi_attr, _find_type, \
+    _stringtypes, _seqtypes, _find_attrNodeNS, _find_encstyle, \
+    _resolve_prefix, \
     _get_element_nsuri_name, _get_idstr, _Node, EvaluateException, \
     UNICODE_ENCODING, _valid_encoding, ParseException
 
@@ -28,7 +28,6 @@ except ImportError:
 
 _is_xsd_or_soap_ns = lambda ns: ns in [
                         SCHEMA.XSD3, SOAP.ENC, SCHEMA.XSD1, SCHEMA.XSD2, ]
-_find_nil = lambda E: _find_xsi_attr(E, "null") or _find_xsi_attr(E, "nil")
 
 def _get_xsitype(pyclass):
     '''returns the xsi:type as a tuple, coupled with ZSI.schema
@@ -148,7 +147,7 @@ class TypeCode:
             tag --
         '''
         if len(_children(elt)): return elt
-        href = _find_href(elt)
+        href = ps.GetElementAttrs(elt).href
         if not href:
             if self.minOccurs is 0 or self.nilled(elt, ps): return None
             raise EvaluateException('Required' + tag + ' missing',
@@ -206,7 +205,7 @@ class TypeCode:
             elt -- the DOM element being parsed
             ps -- the ParsedSoap object.
         '''
-        typeName = _find_type(elt)
+        typeName = ps.GetElementAttrs(elt).type
         if typeName is None or typeName == "":
             return (None,None)
 
@@ -249,7 +248,7 @@ class TypeCode:
             elt -- the DOM element being parsed
             ps -- the ParsedSoap object.
         '''
-        if _find_nil(elt) not in [ "true",  "1"]: return False
+        if ps.GetElementAttrs(elt).nil not in [ "true",  "1"]: return False
         if self.nillable is False:
             raise EvaluateException('Non-nillable element is NIL',
                     ps.Backtrace(elt))
@@ -415,7 +414,7 @@ class SimpleType(TypeCode):
     def parse(self, elt, ps):
         self.checkname(elt, ps)
         if len(_children(elt)) == 0:
-            href = _find_href(elt)
+            href = ps.GetElementAttrs(elt).href
             if not href:
                 if self.nilled(elt, ps) is False:
                     # No content, no HREF, not NIL:  empty string
@@ -514,6 +513,25 @@ class SimpleType(TypeCode):
         return el
 
 
+class _AnyNode:
+    '''An element parsed by Any whose child elements are pending, the
+    result is the list of their values, or for structs (named) the
+    typecode's listify of their names and values.
+    '''
+    def __init__(self, typecode, elements, named=False):
+        self.typecode = typecode
+        self.elements = elements
+        self.named = named
+        self.index = 0
+        self.values = []
+
+    def result(self):
+        if not self.named:
+            return self.values
+        return self.typecode.listify([ (str(e.localName), v)
+                            for e,v in zip(self.elements, self.values) ])
+
+
 class Any(TypeCode):
     '''When the type isn't defined in the schema, but must be specified
     in the incoming operation.
@@ -535,37 +553,76 @@ class Any(TypeCode):
         if self.aslist: return [ k for _,k in v ]
         return dict(v)
 
-    def parse_into_dict_or_list(self, elt, ps):
-        c = _child_elements(elt)
-        count = len(c)
-        v = []
-        if count == 0:
-            href = _find_href(elt)
-            if not href: return v
+    def _child_typecode(self):
+        '''The typecode parsing the child elements, one is shared by all
+        the descendants.
+        '''
+        child = getattr(self, '_child', None)
+        if child is None:
+            child = self.__class__(**self.kwargs)
+            child._child = child
+            self._child = child
+        return child
+
+    def _resolve(self, value, ps):
+        '''Parses the descendants of value if it's an _AnyNode, using an
+        explicit stack rather than recursion.
+        '''
+        if not isinstance(value, _AnyNode):
+            return value
+
+        stack = [value]
+        while True:
+            node = stack[-1]
+            if node.index < len(node.elements):
+                c_elt = node.elements[node.index]
+                node.index += 1
+                value = node.typecode._child_typecode()._parse(c_elt, ps)
+                if isinstance(value, _AnyNode):
+                    stack.append(value)
+                else:
+                    node.values.append(value)
+                continue
+
+            stack.pop()
+            value = node.result()
+            if not stack:
+                return value
+            stack[-1].values.append(value)
+
+    def _dict_or_list(self, elt, c, ps):
+        if len(c) == 0:
+            href = ps.GetElementAttrs(elt).href
+            if not href: return []
             elt = ps.FindLocalHREF(href, elt)
             self.checktype(elt, ps)
             c = _child_elements(elt)
-            count = len(c)
-            if count == 0: return self.listify(v)
+            if len(c) == 0: return self.listify([])
         if self.nilled(elt, ps): return Nilled
+        return _AnyNode(self, c, named=True)
 
-        for c_elt in c:
-            v.append((str(c_elt.localName), self.__class__(**self.kwargs).parse(c_elt, ps)))
-
-        return self.listify(v)
+    def parse_into_dict_or_list(self, elt, ps):
+        return self._resolve(self._dict_or_list(elt, _child_elements(elt), ps),
+                             ps)
 
     def parse(self, elt, ps):
+        return self._resolve(self._parse(elt, ps), ps)
+
+    def _parse(self, elt, ps):
+        '''Parses elt, or returns an _AnyNode if its child elements
+        have to be parsed first.
+        '''
         (ns,type) = self.checkname(elt, ps)
         if not type and self.nilled(elt, ps): return Nilled
         if len(_children(elt)) == 0:
-            href = _find_href(elt)
+            href = ps.GetElementAttrs(elt).href
             if not href:
                 if self.minOccurs < 1:
                     if _is_xsd_or_soap_ns(ns):
                         parser = Any.parsemap.get((None,type))
                         if parser: return parser.parse(elt, ps)
                     if ((ns,type) == (SOAP.ENC,'Array') or
-                        (_find_arraytype(elt) or '').endswith('[0]')):
+                        (ps.GetElementAttrs(elt).arraytype or '').endswith('[0]')):
                         return []
                     return None
                 raise EvaluateException('Required Any missing',
@@ -575,14 +632,14 @@ class Any(TypeCode):
         if not type and elt.namespaceURI == SOAP.ENC:
             ns,type = SOAP.ENC, elt.localName
         if not type or (ns,type) == (SOAP.ENC,'Array'):
-            if self.aslist or _find_arraytype(elt):
-                return [ self.__class__(**self.kwargs).parse(e, ps)
-                            for e in _child_elements(elt) ]
-            if len(_child_elements(elt)) == 0:
+            c = _child_elements(elt)
+            if self.aslist or ps.GetElementAttrs(elt).arraytype:
+                return _AnyNode(self, c)
+            if len(c) == 0:
                 #raise EvaluateException("Any cannot parse untyped element",
                 #        ps.Backtrace(elt))
                 return self.simple_value(elt, ps)
-            return self.parse_into_dict_or_list(elt, ps)
+            return self._dict_or_list(elt, c, ps)
         parser = Any.parsemap.get((ns,type))
         if not parser and _is_xsd_or_soap_ns(ns):
             parser = Any.parsemap.get((None,type))
@@ -1213,6 +1270,62 @@ class Boolean(SimpleType):
         return 'false'
 
 
+def _text_content(elt):
+    '''Text of an element holding only text (and comment) nodes, else None.
+    '''
+    text = []
+    for node in elt.childNodes:
+        if node.nodeType in (_Node.TEXT_NODE, _Node.CDATA_SECTION_NODE):
+            text.append(node.nodeValue)
+        elif node.nodeType == _Node.ELEMENT_NODE:
+            return None
+    return ''.join(text)
+
+def _get_text_parser(typecode):
+    '''Returns a function parsing an element without attributes for
+    typecode, converting its text directly instead of going through the
+    name/type/nil/href checks of typecode.parse, or None if typecode has
+    its own parsing logic. Elements it can't handle are passed to
+    typecode.parse.
+    '''
+    if typecode.attribute_typecode_dict is not None:
+        return None
+    parse = getattr(typecode.parse, 'im_func', None)
+
+    if parse is SimpleType.parse.im_func:
+        def parser(elt, ps):
+            if not elt.childNodes:
+                return typecode.text_to_data(typecode.empty_content, elt, ps)
+            text = _text_content(elt)
+            if text is None:
+                return typecode.parse(elt, ps)
+            return typecode.text_to_data(text, elt, ps)
+        return parser
+
+    if parse is Integer.parse.im_func:
+        rmin, rmax = Integer.ranges.get(typecode.type[1], (_ignored, _ignored))
+        def parser(elt, ps):
+            text = _text_content(elt)
+            if not text:
+                return typecode.parse(elt, ps)
+            v = typecode.text_to_data(text, elt, ps)
+            if (rmin is not _ignored and v < rmin) or \
+               (rmax is not _ignored and v > rmax):
+                return typecode.parse(elt, ps)
+            return v
+        return parser
+
+    if parse is Boolean.parse.im_func:
+        def parser(elt, ps):
+            text = _text_content(elt)
+            if not text:
+                return typecode.parse(elt, ps)
+            return typecode.text_to_data(text.lower(), elt, ps)
+        return parser
+
+    return None
+
+
 #XXX NOT FIXED YET
 class XML(TypeCode):
     """Opaque XML which shouldn't be parsed.
@@ -1239,7 +1352,7 @@ class XML(TypeCode):
             return elt
         c = _child_elements(elt)
         if not c:
-            href = _find_href(elt)
+            href = ps.GetElementAttrs(elt).href
             if not href:
                 if self.minOccurs == 0: return None
                 raise EvaluateException('Embedded XML document missing',
@@ -1302,7 +1415,7 @@ class XML(TypeCode):
         ## copy xmlns: attributes into appended node
         parent = pyobj.parentNode
         while parent.nodeType == _Node.ELEMENT_NODE:
-            for attr in [a for a in parent.attributes 
+            for attr in [a for a in parent.attributes.values()
                         if a.name.startswith('xmlns:') 
                         and a.name not in child.attributes.keys()]:
                 child.setAttributeNode(attr.cloneNode(1))
@@ -1374,7 +1487,7 @@ class AnyType(TypeCode):
                     self.nspname,self.pname,nspname,pname), ps.Backtrace(elt))
 
         #locate xsi:type
-        prefix, typeName = SplitQName(_find_type(elt))
+        prefix, typeName = SplitQName(ps.GetElementAttrs(elt).type)
         namespaceURI = _resolve_prefix(elt, prefix)
         pyclass = GTD(namespaceURI, typeName)
         if not pyclass:
@@ -1462,7 +1575,7 @@ class AnyElement(AnyType):
 
         # Allow use of "<any>" element declarations w/ local
         # element declarations
-        prefix, typeName = SplitQName(_find_type(elt))
+        prefix, typeName = SplitQName(ps.GetElementAttrs(elt).type)
         if not skip and typeName:
             namespaceURI = _resolve_prefix(elt, prefix)
             # First look thru user defined namespaces, if don't find
@@ -1691,7 +1804,7 @@ class List(SimpleType):
         '''
         self.checkname(elt, ps)
         if len(_children(elt)) == 0:
-            href = _find_href(elt)
+            href = ps.GetElementAttrs(elt).href
             if not href:
                 if self.nilled(elt, ps) is False:
                     return []
@@ -4,11 +4,10 @@
 '''
 
 from pysphere.ZSI import _children, _child_elements, \
-    _inttypes, _stringtypes, _seqtypes, _find_arraytype, _find_href, \
-    _find_type, _get_idstr, EvaluateException
+    _inttypes, _stringtypes, _seqtypes, _get_idstr, _Node, EvaluateException
 
-from pysphere.ZSI.TC import _get_xsitype, TypeCode, Any, AnyElement, AnyType, \
-     Nilled
+from pysphere.ZSI.TC import _get_xsitype, _get_text_parser, TypeCode, Any, \
+     AnyElement, AnyType, Nilled, UNBOUNDED
 
 from pysphere.ZSI.schema import ElementDeclaration, TypeDefinition, \
     _get_substitute_element, _is_substitute_element
@@ -92,8 +91,11 @@ class ComplexType(TypeCode):
     logger = _GetLogger('ZSI.TCcompound.ComplexType')
     class _DictHolder: pass
 
+    # field table of the specialized parser, False if it can't be used
+    _fields = None
+
     def __init__(self, pyclass, ofwhat, pname=None, inorder=False, inline=False,
-    mutable=True, mixed=False, mixed_aname='_text', **kw):
+    mutable=True, mixed=False, mixed_aname='_text', specialized=False, **kw):
         """pyclass -- the Python class to hold the fields
         ofwhat -- a list of fields to be in the complexType
         inorder -- fields must be in exact order or not
@@ -102,12 +104,16 @@ class ComplexType(TypeCode):
         type -- the (URI,localname) of the datatype
         mixed -- mixed content model? True/False
         mixed_aname -- if mixed is True, specify text content here. Default _text
+        specialized -- parse with a field lookup table built on first use
+            instead of matching every child against every field, see
+            parse_specialized (wsdl2py --specialized)
         """
         TypeCode.__init__(self, pname, pyclass=pyclass, **kw)
         self.inorder = inorder
         self.inline = inline
         self.mutable = mutable
         self.mixed = mixed
+        self.specialized = specialized
         self.mixed_aname = None
         if mixed is True:
             self.mixed_aname = mixed_aname
@@ -128,6 +134,15 @@ class ComplexType(TypeCode):
             _check_typecode_list(self.ofwhat, 'ComplexType')
 
     def parse(self, elt, ps):
+        if self.specialized is True:
+            fields = self._fields
+            if fields is None:
+                fields = self._fields = self._specialize()
+            if fields is not False:
+                return self.parse_specialized(elt, ps, fields)
+        return self._parse_generic(elt, ps)
+
+    def _parse_generic(self, elt, ps):
         debug = self.logger.debugOn()
         debug and self.logger.debug('parse')
 
@@ -144,7 +159,7 @@ class ComplexType(TypeCode):
                 what = TypeDefinition.getSubstituteType(self, elt, ps)
                 return what.parse(elt, ps)
 
-        href = _find_href(elt)
+        href = ps.GetElementAttrs(elt).href
         if href:
             if _children(elt):
                 raise EvaluateException('Struct has content and HREF',
@@ -177,6 +192,7 @@ class ComplexType(TypeCode):
 
         # Clone list of kids (we null it out as we process)
         c, crange = c[:], range(len(c))
+        counts = {}
         # Loop over all items we're expecting
 
         for j,c_elt in [ (j, c[j]) for j in crange if c[j] ]:
@@ -212,6 +228,7 @@ class ComplexType(TypeCode):
                         self.logger.debug("substitutionGroup: %s", subwhat)
 
                 if match:
+                    counts[what.aname] = counts.get(what.aname, 0) + 1
                     if what.maxOccurs > 1:
                         attr = getattr(pyobj, what.aname, None)
                         if attr is not None:
@@ -235,8 +252,118 @@ class ComplexType(TypeCode):
                 else:
                     if hasattr(what, 'default'):
                         setattr(pyobj, what.aname, what.default)
-                    # elif what.minOccurs > 0 and not hasattr(pyobj, what.aname):
-                    #     raise EvaluateException('Element "' + what.aname + '" missing from complexType', ps.Backtrace(elt))
+
+            if c[j] is not None:
+                self._unexpected(c_elt, ps)
+
+        self._check_occurs(counts, elt, ps)
+
+        if isinstance(pyobj, ComplexType._DictHolder):
+            return pyobj.__dict__
+
+        return pyobj
+
+    def _unexpected(self, c_elt, ps):
+        raise EvaluateException('Unexpected element (%s,%s) in complexType' %
+                                (c_elt.namespaceURI, c_elt.localName),
+                                ps.Backtrace(c_elt))
+
+    def _check_occurs(self, counts, elt, ps):
+        '''Raises EvaluateException if a field of the type is found less than
+        minOccurs or more than maxOccurs times, counts maps the anames of
+        the fields to the number of elements parsed for each.
+        '''
+        for what in self.ofwhat:
+            if callable(what): what = what()
+            if isinstance(what, AnyElement) or hasattr(what, 'default'):
+                continue
+            count = counts.get(what.aname, 0)
+            if count < what.minOccurs:
+                raise EvaluateException('Element "%s" missing from complexType'
+                                        % what.aname, ps.Backtrace(elt))
+            if what.maxOccurs != UNBOUNDED and count > what.maxOccurs:
+                raise EvaluateException('Element "%s" found %d times in '
+                                        'complexType, maxOccurs is %s' %
+                                        (what.aname, count, what.maxOccurs),
+                                        ps.Backtrace(elt))
+
+    def _specialize(self):
+        '''Returns the field table of parse_specialized, a dict of element
+        local name -> (typecode, text parser, repeated), or False if
+        the content model needs the generic parser (mixed or ordered
+        content, wildcards, substitution groups, defaults, ambiguous names).
+        '''
+        if self.mixed is True or self.inorder is True:
+            return False
+
+        fields = {}
+        for what in self.ofwhat:
+            if callable(what): what = what()
+            if isinstance(what, (AnyElement, ElementDeclaration)) or \
+               hasattr(what, 'default') or what.pname in fields:
+                return False
+            fields[what.pname] = (what, _get_text_parser(what),
+                                  what.maxOccurs > 1)
+        return fields
+
+    def parse_specialized(self, elt, ps, fields):
+        '''Parses elt looking up each child in the field table made by
+        _specialize, simple contents are converted in place. The typecode
+        checks (name, xsi:type, nil, href) are only made if elt has
+        attributes, xsi:type substitutions are delegated as in parse.
+        '''
+        if elt.hasAttributes():
+            xtype = self.checkname(elt, ps)
+            if self.type and xtype not in [ self.type, (None,None) ]:
+                if isinstance(self, TypeDefinition):
+                    what = TypeDefinition.getSubstituteType(self, elt, ps)
+                    return what.parse(elt, ps)
+                return self._parse_generic(elt, ps)
+            if ps.GetElementAttrs(elt).href:
+                return self._parse_generic(elt, ps)
+            if self.nilled(elt, ps): return Nilled
+
+        if self.pyclass:
+            try:
+                pyobj = self.pyclass()
+            except Exception, e:
+                raise TypeError("Constructing element (%s,%s) with pyclass(%s), %s" \
+                    %(self.nspname, self.pname, self.pyclass.__name__, str(e)))
+        else:
+            pyobj = ComplexType._DictHolder()
+
+        if self.attribute_typecode_dict is not None:
+            attributes = self.parse_attributes(elt, ps)
+            if attributes:
+                setattr(pyobj, self.attrs_aname, attributes)
+
+        counts = {}
+        for c_elt in elt.childNodes:
+            if c_elt.nodeType != _Node.ELEMENT_NODE:
+                continue
+            field = fields.get(c_elt.localName)
+            if field is None:
+                self._unexpected(c_elt, ps)
+            what, parser, repeated = field
+            if what.nspname and what.nspname != c_elt.namespaceURI:
+                self._unexpected(c_elt, ps)
+            counts[what.aname] = counts.get(what.aname, 0) + 1
+
+            if parser is None or c_elt.hasAttributes():
+                value = what.parse(c_elt, ps)
+            else:
+                value = parser(c_elt, ps)
+
+            if repeated:
+                attr = getattr(pyobj, what.aname, None)
+                if attr is not None:
+                    attr.append(value)
+                else:
+                    setattr(pyobj, what.aname, [value])
+            else:
+                setattr(pyobj, what.aname, value)
+
+        self._check_occurs(counts, elt, ps)
 
         if isinstance(pyobj, ComplexType._DictHolder):
             return pyobj.__dict__
@@ -549,16 +676,16 @@ class Array(TypeCode):
         return int(o[1:-1])
 
     def parse(self, elt, ps):
-        href = _find_href(elt)
+        href = ps.GetElementAttrs(elt).href
         if href:
             if _children(elt):
                 raise EvaluateException('Array has content and HREF',
                         ps.Backtrace(elt))
             elt = ps.FindLocalHREF(href, elt)
         if self.nilled(elt, ps): return Nilled
-        if not _find_arraytype(elt) and self.undeclared is False:
+        if not ps.GetElementAttrs(elt).arraytype and self.undeclared is False:
             raise EvaluateException('Array expected', ps.Backtrace(elt))
-        t = _find_type(elt)
+        t = ps.GetElementAttrs(elt).type
         if t:
             pass # XXX should check the type, but parsing that is hairy.
         offset = self.parse_offset(elt, ps)
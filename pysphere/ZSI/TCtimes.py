@@ -11,6 +11,7 @@ from time import mktime as _mktime, localtime as _localtime, gmtime as _gmtime
 from datetime import tzinfo as _tzinfo, timedelta as _timedelta,\
     datetime as _datetime, MAXYEAR
 from math import modf as _modf
+from calendar import timegm as _timegm
 
 MINYEAR = 1970
 
@@ -112,6 +113,45 @@ def _fix_none_fields(tv):
     if ltv[2] is None: ltv[2] = 1 # Day is absent
     return tuple(ltv)
 
+def _split_datetime(text):
+    '''Splits a dateTime in the canonical form vCenter sends,
+    YYYY-MM-DDThh:mm:ss[.fff][Z|(+|-)hh:mm], into a (year, month, day, hour,
+    minute, second) tuple, the seconds string (with fraction) and the UTC
+    offset in minutes (None without time zone).  Returns None for any other
+    form.
+    '''
+    if len(text) < 19 or text[4] != '-' or text[7] != '-' or \
+       text[10] != 'T' or text[13] != ':' or text[16] != ':':
+        return None
+    if not (text[:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16] +
+            text[17:19]).isdigit():
+        return None
+
+    end = 19
+    if text[19:20] == '.':
+        end = 20
+        while text[end:end+1].isdigit():
+            end += 1
+        if end == 20:
+            return None
+
+    tz = text[end:]
+    if not tz:
+        offset = None
+    elif tz == 'Z':
+        offset = 0
+    elif len(tz) == 6 and tz[0] in '+-' and tz[3] == ':' and \
+         (tz[1:3] + tz[4:6]).isdigit():
+        offset = int(tz[1:3]) * 60 + int(tz[4:6])
+        if tz[0] == '-':
+            offset = -offset
+    else:
+        return None
+
+    fields = (int(text[:4]), int(text[5:7]), int(text[8:10]),
+              int(text[11:13]), int(text[14:16]), int(text[17:19]))
+    return fields, text[17:end], offset
+
 def _dict_to_tuple(d):
     '''Convert a dictionary to a time tuple.  Depends on key values in the
     regexp pattern!
@@ -258,6 +298,84 @@ class gDateTime(Gregorian):
     format_ms = format[:-1] + '.%(ms)03dZ'
     type = (SCHEMA.XSD3, 'dateTime')
     fix_timezone = True
+    outputs = ('tuple', 'epoch', 'datetime')
+
+    def __init__(self, pname=None, *args, **kw):
+        '''output -- keyword only, what parsing returns: 'tuple' (local time
+        tuple, milliseconds in the 7th field), 'epoch' (float seconds since
+        the epoch) or 'datetime' (naive local datetime with microseconds).
+        '''
+        output = kw.pop('output', 'tuple')
+        if output not in self.outputs:
+            raise ValueError('output must be one of %s, not %r' %
+                             (', '.join(self.outputs), output))
+        Gregorian.__init__(self, pname, *args, **kw)
+        self.output = output
+
+    def text_to_data(self, text, elt, ps):
+        '''convert text into typecode specific data.  The canonical form is
+        split without the regular expression, others go through Gregorian
+        (and so do the tuples of years Gregorian doesn't fix the time zone
+        of, to get the same tuples).
+        '''
+        if text is None:
+            return None
+
+        parts = _split_datetime(text)
+        if parts is None or not (MINYEAR < parts[0][0] < MAXYEAR or
+                                 self.output != 'tuple' and parts[0][0] > 0):
+            retval = Gregorian.text_to_data(self, text, elt, ps)
+            if self.output == 'tuple':
+                return retval
+            try:
+                fields = tuple(retval[:6])
+                seconds = '%d.%03d' % (retval[5], retval[6])
+                return self._convert(fields, seconds, None, fields)
+            except (ValueError, OverflowError, TypeError):
+                raise EvaluateException('Bad Gregorian: %s' %text,
+                                        ps.Backtrace(elt))
+
+        fields, seconds, offset = parts
+        try:
+            if offset is None or not self.fix_timezone:
+                return self._convert(fields, seconds, None, fields)
+            epoch = _timegm(fields) - offset * 60
+            if self.output == 'epoch':
+                return self._convert(fields, seconds, epoch, None)
+            return self._convert(fields, seconds, epoch,
+                                 _localtime(epoch)[:6])
+        except (ValueError, OverflowError):
+            raise EvaluateException('Bad Gregorian: %s' %text,
+                                    ps.Backtrace(elt))
+
+    def _convert(self, fields, seconds, epoch, local):
+        '''Builds the output from the parsed fields, the UTC epoch (None if
+        unknown) and the local time fields.
+        '''
+        fraction = _modf(float(seconds))[0]
+        if self.output == 'epoch':
+            if epoch is None:
+                epoch = _mktime(local + (0, 0, -1))
+            return epoch + fraction
+        if self.output == 'datetime':
+            return _datetime(*(local + (min(int(round(fraction * 1000000)),
+                                            999999),)))
+
+        retval = local + (int(round(fraction * 1000)), 0, 0)
+        if self.pyclass is not None:
+            return self.pyclass(retval)
+        return retval
+
+    def get_formatted_content(self, pyobj):
+        if isinstance(pyobj, _datetime):
+            if pyobj.tzinfo is not None:
+                pyobj = pyobj.astimezone(_localtimezone())
+            pyobj = pyobj.timetuple()[:6] + (pyobj.microsecond // 1000, 0, 0)
+        elif self.fix_timezone and (isinstance(pyobj, _floattypes) or
+                                    isinstance(pyobj, _inttypes)):
+            fraction = _modf(pyobj)[0]
+            pyobj = _localtime(pyobj)[:6] + (int(fraction * 1000), 0, 0)
+        return Gregorian.get_formatted_content(self, pyobj)
 
 class gDate(Gregorian):
     '''A date.
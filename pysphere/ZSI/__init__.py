@@ -221,6 +221,7 @@ _find_xsi_attr = lambda E, attr: \
                 or E.getAttributeNS(_SCHEMA.XSI1, attr) \
                 or E.getAttributeNS(_SCHEMA.XSI2, attr)
 _find_type = lambda E: _find_xsi_attr(E, "type")
+_find_nil = lambda E: _find_xsi_attr(E, "null") or _find_xsi_attr(E, "nil")
 
 _find_xmlns_prefix = lambda E, attr: E.getAttributeNS(_XMLNS.BASE, attr)
 _find_default_namespace = lambda E: E.getAttributeNS(_XMLNS.BASE, 'xmlns')
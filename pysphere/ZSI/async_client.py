@@ -0,0 +1,548 @@
+#! /usr/bin/env python
+# $Header$
+'''Non-blocking SOAP client.
+
+An AsyncBinding shares serialization, cookies and headers with a regular
+Binding, but issues the HTTP requests over non-blocking sockets driven by
+an asyncore based EventLoop, so many calls can be in flight from a single
+thread.
+'''
+
+import asyncore, errno, heapq, httplib, socket, sys, time, urlparse
+from cStringIO import StringIO
+
+try:
+    import ssl
+except ImportError:
+    ssl = None
+
+from pysphere.ZSI import ParsedSoap, ZSIException, FaultException, \
+    FaultFromFaultMessage, _get_postvalue_from_absoluteURI, UNICODE_ENCODING
+from pysphere.ZSI.auth import AUTH
+from pysphere.ZSI.client import _gzip, _Decompressor
+from pysphere.ZSI.wstools.logging import getLogger as _GetLogger
+import base64
+_b64_encode = base64.encodestring
+
+_WOULDBLOCK = (errno.EWOULDBLOCK, errno.EAGAIN, errno.EINPROGRESS)
+
+
+class AsyncTimeout(ZSIException):
+    '''An operation did not complete in the given time.
+    '''
+
+
+class AsyncResult:
+    '''Placeholder for the outcome of an operation running on an EventLoop.
+    Callbacks are invoked from the loop once a value or an exception
+    (a sys.exc_info() triplet) has been set.
+    '''
+
+    def __init__(self, loop):
+        self.loop = loop
+        self._done = False
+        self._value = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def done(self):
+        return self._done
+
+    def failed(self):
+        return self._exc_info is not None
+
+    def set_result(self, value):
+        if self._done: return
+        self._done, self._value = True, value
+        self._fire()
+
+    def set_exception(self, exc_info=None):
+        if self._done: return
+        self._done, self._exc_info = True, exc_info or sys.exc_info()
+        self._fire()
+
+    def add_callback(self, callback):
+        '''callback(result) is called once this result is available.
+        '''
+        if self._done:
+            callback(self)
+        else:
+            self._callbacks.append(callback)
+
+    def then(self, func, errback=None):
+        '''Return a new AsyncResult with the outcome of func(value). If func
+        returns an AsyncResult the new one completes when that one does.
+        errback(exc_info) may turn a failure into a value or another error.
+        '''
+        chained = AsyncResult(self.loop)
+        def callback(result):
+            try:
+                if result._exc_info is None:
+                    value = func(result._value)
+                elif errback is not None:
+                    value = errback(result._exc_info)
+                else:
+                    chained.set_exception(result._exc_info)
+                    return
+            except Exception:
+                chained.set_exception(sys.exc_info())
+                return
+            if isinstance(value, AsyncResult):
+                value.add_callback(chained._copy)
+            else:
+                chained.set_result(value)
+        self.add_callback(callback)
+        return chained
+
+    def result(self, timeout=None):
+        '''Run the loop until the result is available and return it, the
+        exception is raised if the operation failed.
+        '''
+        if not self._done:
+            self.loop.run_until(self.done, timeout)
+        if not self._done:
+            raise AsyncTimeout('Timed out waiting for result')
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._value
+
+    def _copy(self, other):
+        if other._exc_info is not None:
+            self.set_exception(other._exc_info)
+        else:
+            self.set_result(other._value)
+
+    def _fire(self):
+        callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+def gather(loop, results):
+    '''Return an AsyncResult with the list of values of results, in order.
+    Fails with the first failure found once all of them are done.
+    '''
+    results = list(results)
+    gathered = AsyncResult(loop)
+    pending = [len(results)]
+    def callback(result):
+        pending[0] -= 1
+        if pending[0]: return
+        for r in results:
+            if r.failed():
+                gathered.set_exception(r._exc_info)
+                return
+        gathered.set_result([r._value for r in results])
+    if not results:
+        gathered.set_result([])
+    for r in results:
+        r.add_callback(callback)
+    return gathered
+
+
+class EventLoop:
+    '''asyncore socket map plus a heap of timed calls.
+    '''
+
+    def __init__(self):
+        self.map = {}
+        self._timers = []
+        self._seq = 0
+        self._live = 0
+
+    def call_later(self, delay, callback, *args):
+        '''Schedule callback(*args), returns a handle for cancel_call().
+        '''
+        self._seq += 1
+        self._live += 1
+        timer = [time.time() + delay, self._seq, callback, args]
+        heapq.heappush(self._timers, timer)
+        return timer
+
+    def cancel_call(self, timer):
+        if timer[2] is not None:
+            timer[2] = None
+            self._live -= 1
+
+    def pending(self):
+        return bool(self.map or self._live)
+
+    def run_once(self, timeout=None):
+        now = time.time()
+        while self._timers and self._timers[0][0] <= now:
+            _, _, callback, args = heapq.heappop(self._timers)
+            if callback is not None:
+                self._live -= 1
+                callback(*args)
+
+        wait = timeout
+        if self._timers:
+            wait = max(0.0, self._timers[0][0] - time.time())
+            if timeout is not None:
+                wait = min(wait, timeout)
+        if self.map:
+            asyncore.loop(wait, False, self.map, 1)
+        elif wait:
+            time.sleep(wait)
+
+    def run_until(self, predicate, timeout=None):
+        '''Run until predicate() is true, nothing is left to do, or timeout
+        seconds have elapsed.
+        '''
+        deadline = timeout is not None and time.time() + timeout
+        while not predicate() and self.pending():
+            wait = None
+            if deadline:
+                wait = deadline - time.time()
+                if wait <= 0: break
+            self.run_once(wait)
+
+    def run(self, timeout=None):
+        '''Run until there are no more sockets nor timed calls.
+        '''
+        self.run_until(lambda: False, timeout)
+
+
+class _HTTPExchange(asyncore.dispatcher):
+    '''One HTTP request and its response over a non-blocking socket, the
+    result is set to a (status, reason, msg, data) tuple.
+    '''
+
+    def __init__(self, loop, addrinfo, host, use_ssl, request, result,
+                 ssl_context=None, timeout=None):
+        asyncore.dispatcher.__init__(self, map=loop.map)
+        self.result = result
+        self.host = host
+        self.use_ssl = use_ssl
+        self.ssl_context = ssl_context
+        self.out_buffer = request
+        self.in_buffer = []
+        self.want_write = False
+        self.state = 'connecting'
+        self.loop = loop
+        self.timer = None
+
+        family, socktype, proto, _, address = addrinfo
+        self.create_socket(family, socktype)
+        if timeout:
+            self.timer = loop.call_later(timeout, self._expire)
+        try:
+            self.connect(address)
+        except socket.error:
+            self._fail()
+
+    def readable(self):
+        return self.state in ('handshake', 'sending', 'receiving')
+
+    def writable(self):
+        return self.state == 'connecting' or self.state == 'sending' or \
+            (self.state == 'handshake' and self.want_write)
+
+    def handle_connect(self):
+        if not self.use_ssl:
+            self.state = 'sending'
+            return
+        if self.ssl_context is not None:
+            sock = self.ssl_context.wrap_socket(self.socket,
+                        server_hostname=self.host, do_handshake_on_connect=False)
+        else:
+            sock = ssl.wrap_socket(self.socket, do_handshake_on_connect=False)
+        self.del_channel()
+        self.set_socket(sock)
+        self.state = 'handshake'
+        self._handshake()
+
+    def handle_write(self):
+        if self.state == 'handshake':
+            self._handshake()
+        elif self.state == 'sending':
+            sent = self._io(self.socket.send, self.out_buffer[:65536])
+            if sent:
+                self.out_buffer = self.out_buffer[sent:]
+                if not self.out_buffer:
+                    self.state = 'receiving'
+
+    def handle_read(self):
+        if self.state == 'handshake':
+            self._handshake()
+            return
+        while self.state != 'done':
+            data = self._io(self.socket.recv, 65536)
+            if data is None:
+                break
+            if not data:
+                self._finish()
+                break
+            self.in_buffer.append(data)
+            if self._complete():
+                self._finish()
+
+    def handle_close(self):
+        if self.state in ('connecting', 'handshake'):
+            try:
+                raise socket.error(errno.ECONNRESET,
+                                   'Connection closed before sending request')
+            except socket.error:
+                self._fail()
+        else:
+            self._finish()
+
+    def handle_error(self):
+        self._fail()
+
+    def _io(self, func, *args):
+        try:
+            return func(*args)
+        except socket.error, e:
+            if ssl is not None and isinstance(e, ssl.SSLError) and \
+                e.args[0] in (ssl.SSL_ERROR_WANT_READ, ssl.SSL_ERROR_WANT_WRITE):
+                return None
+            if e.args[0] in _WOULDBLOCK:
+                return None
+            raise
+
+    def _handshake(self):
+        try:
+            self.socket.do_handshake()
+        except ssl.SSLError, e:
+            if e.args[0] == ssl.SSL_ERROR_WANT_READ:
+                self.want_write = False
+                return
+            if e.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                self.want_write = True
+                return
+            raise
+        self.state = 'sending'
+
+    def _split(self):
+        data = ''.join(self.in_buffer)
+        self.in_buffer = [data]
+        while True:
+            i = data.find('\r\n\r\n')
+            if i < 0:
+                return None, data
+            head, body = data[:i+2], data[i+4:]
+            # skip "100 Continue" interim responses
+            if head.split(None, 2)[1:2] == ['100']:
+                data = body
+                self.in_buffer = [data]
+                continue
+            return head, body
+
+    def _complete(self):
+        head, body = self._split()
+        if head is None:
+            return False
+        msg = httplib.HTTPMessage(StringIO(head.split('\r\n', 1)[1]))
+        length = msg.getheader('content-length')
+        if length is None or msg.getheader('transfer-encoding'):
+            return False
+        return len(body) >= int(length)
+
+    def _finish(self):
+        if self.state == 'done': return
+        self._close()
+        try:
+            head, body = self._split()
+            if head is None:
+                raise httplib.BadStatusLine(''.join(self.in_buffer)[:80])
+            status_line, headers = head.split('\r\n', 1)
+            version, status, reason = (status_line.split(None, 2) + [''])[:3]
+            msg = httplib.HTTPMessage(StringIO(headers))
+            if (msg.getheader('transfer-encoding') or '').lower() == 'chunked':
+                body = _dechunk(body)
+            else:
+                length = msg.getheader('content-length')
+                if length is not None:
+                    body = body[:int(length)]
+        except Exception:
+            self.result.set_exception(sys.exc_info())
+            return
+        self.result.set_result((int(status), reason.strip(), msg, body))
+
+    def _fail(self):
+        exc_info = sys.exc_info()
+        self._close()
+        self.result.set_exception(exc_info)
+
+    def _close(self):
+        self.state = 'done'
+        if self.timer is not None:
+            self.loop.cancel_call(self.timer)
+        self.close()
+
+    def _expire(self):
+        if self.state == 'done': return
+        try:
+            raise socket.timeout('timed out')
+        except socket.timeout:
+            self._fail()
+
+
+def _dechunk(data):
+    chunks = []
+    while data:
+        line, data = data.split('\r\n', 1)
+        size = int(line.split(';', 1)[0], 16)
+        if size == 0:
+            break
+        chunks.append(data[:size])
+        data = data[size+2:]
+    return ''.join(chunks)
+
+
+class AsyncBinding:
+    '''Issues the requests of a Binding over non-blocking sockets. Messages
+    are serialized with Binding.SerializeRequest and replies parsed with
+    ParsedSoap, cookies and user headers are shared with the binding.
+    No more than max_per_host requests are in flight to the same host, the
+    rest wait in a queue.
+    '''
+    logger = _GetLogger('ZSI.async_client.AsyncBinding')
+
+    def __init__(self, binding, loop=None, max_per_host=8):
+        self.binding = binding
+        self.loop = loop or EventLoop()
+        self.max_per_host = max_per_host
+        self._active = {}
+        self._queued = {}
+        self._addrinfo = {}
+
+    def Call(self, obj, replytype, url=None, soapaction=None, **kw):
+        '''Send obj, return an AsyncResult with the parsed reply.
+        '''
+        binding = self.binding
+        result = AsyncResult(self.loop)
+        try:
+            url = url or binding.url
+            sw = binding.SerializeRequest(url, None, obj, soapaction=soapaction,
+                                          **kw)
+            scheme, netloc = urlparse.urlparse(url)[:2]
+            if scheme not in ('http', 'https'):
+                raise RuntimeError('url must start with https/http')
+            soapdata = str(sw)
+            soapfilter = kw.get('soapfilter')
+            if soapfilter is not None:
+                soapdata = soapfilter(soapdata)
+            request = self._build_request(soapdata, sw, url, netloc, soapaction)
+        except Exception:
+            result.set_exception(sys.exc_info())
+            return result
+
+        reply = AsyncResult(self.loop)
+        reply.add_callback(lambda r: self._release(netloc))
+        self._acquire(netloc, lambda: self._start(scheme, netloc, request,
+                                                  reply))
+        return reply.then(lambda response: self._parse(response, replytype))
+
+    def _build_request(self, soapdata, sw, url, netloc, soapaction):
+        binding = self.binding
+        if binding.trace:
+            print >>binding.trace, "_" * 33, time.ctime(time.time()), "REQUEST:"
+            print >>binding.trace, soapdata
+
+        body = soapdata
+        if binding.compress_request:
+            body = _gzip(soapdata)
+        headers = [("Host", netloc),
+                   ("Content-Length", "%d" % len(body)),
+                   ("Connection", "close")]
+        if binding.compress_request:
+            headers.append(("Content-Encoding", "gzip"))
+        if binding.compression:
+            headers.append(("Accept-Encoding", "gzip, deflate"))
+        boundary = sw.getMIMEBoundary()
+        if len(boundary) == 0:
+            headers.append(("Content-Type",
+                            'text/xml; charset="%s"' % UNICODE_ENCODING))
+        else:
+            headers.append(("Content-Type",
+                            "multipart/related; boundary=\"" + boundary +
+                            "\"; start=\"" + sw.getStartCID() +
+                            '\"; type="text/xml"'))
+        for value in binding.GetCookieHeaders():
+            headers.append(('Cookie', value))
+        headers.append(("SOAPAction",
+                        '"%s"' % (soapaction or binding.soapaction)))
+        if binding.auth_style & AUTH.httpbasic:
+            val = _b64_encode(binding.auth_user + ':' + binding.auth_pass) \
+                        .replace("\012", "")
+            headers.append(('Authorization', 'Basic ' + val))
+        headers.extend(binding.user_headers)
+
+        lines = ["POST %s HTTP/1.1" % _get_postvalue_from_absoluteURI(url)]
+        lines.extend(["%s: %s" % header for header in headers])
+        return "\r\n".join(lines) + "\r\n\r\n" + body
+
+    def _acquire(self, netloc, start):
+        active = self._active.get(netloc, 0)
+        if active < self.max_per_host:
+            self._active[netloc] = active + 1
+            start()
+        else:
+            self._queued.setdefault(netloc, []).append(start)
+
+    def _release(self, netloc):
+        queued = self._queued.get(netloc)
+        if queued:
+            queued.pop(0)()
+        else:
+            self._active[netloc] -= 1
+
+    def _start(self, scheme, netloc, request, reply):
+        try:
+            default_port = scheme == 'https' and httplib.HTTPS_PORT \
+                            or httplib.HTTP_PORT
+            host, port = _split_netloc(netloc, default_port)
+            addrinfo = self._addrinfo.get(netloc)
+            if addrinfo is None:
+                addrinfo = socket.getaddrinfo(host, port, 0,
+                                              socket.SOCK_STREAM)[0]
+                self._addrinfo[netloc] = addrinfo
+            transdict = self.binding.transdict
+            _HTTPExchange(self.loop, addrinfo, host, scheme == 'https',
+                          request, reply, transdict.get('context'),
+                          transdict.get('timeout'))
+        except Exception:
+            reply.set_exception(sys.exc_info())
+
+    def _parse(self, response, replytype):
+        binding = self.binding
+        status, reason, msg, data = response
+        encoding = (msg.getheader('content-encoding') or '').lower()
+        if encoding in _Decompressor.encodings:
+            decompressor = _Decompressor(encoding)
+            data = decompressor.feed(data) + decompressor.flush()
+        if binding.trace:
+            print >>binding.trace, "_" * 33, time.ctime(time.time()), "RESPONSE:"
+            print >>binding.trace, str(status)
+            print >>binding.trace, str(reason)
+            print >>binding.trace, "-------"
+            print >>binding.trace, str(msg)
+            print >>binding.trace, data
+        binding.StoreCookies(msg)
+        if msg.type != 'text/xml':
+            raise TypeError('Response is "%s", not "text/xml"' % msg.type)
+        if len(data) == 0:
+            raise TypeError('Received empty response')
+
+        ps = ParsedSoap(data, readerclass=binding.readerclass)
+        if ps.IsAFault():
+            raise FaultException(FaultFromFaultMessage(ps))
+        return ps.Parse(getattr(replytype, 'typecode', replytype))
+
+    def __repr__(self):
+        return "<%s instance %s>" % (self.__class__.__name__, id(self))
+
+
+def _split_netloc(netloc, default_port):
+    host, port = netloc, default_port
+    if netloc.startswith('['):
+        i = netloc.find(']')
+        host = netloc[1:i]
+        if netloc[i+1:i+2] == ':':
+            port = int(netloc[i+2:])
+    elif ':' in netloc:
+        host, port = netloc.rsplit(':', 1)
+        port = int(port)
+    return host, port
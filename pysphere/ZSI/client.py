@@ -3,7 +3,7 @@
 #
 # Copyright (c) 2001 Zolera Systems.  All rights reserved.
 
-import threading
+import sys, threading
 
 from pysphere.ZSI import _seqtypes, ParsedSoap, SoapWriter, TC, ZSI_SCHEMA_URI,\
     FaultFromFaultMessage, _child_elements, _find_arraytype,\
@@ -12,11 +12,53 @@ from pysphere.ZSI import _seqtypes, ParsedSoap, SoapWriter, TC, ZSI_SCHEMA_URI,\
 from pysphere.ZSI.auth import AUTH
 from pysphere.ZSI.TC import String
 from pysphere.ZSI.TCcompound import Struct
-import base64, httplib, Cookie, time, urlparse
+import base64, httplib, Cookie, time, urlparse, zlib, re
 from pysphere.ZSI.address import Address
+from pysphere.ZSI.instrument import Exchange, operation_name
 from pysphere.ZSI.wstools.logging import getLogger as _GetLogger
 _b64_encode = base64.encodestring
 
+def _gzip(data):
+    '''Returns data compressed in gzip format.
+    '''
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+class _Decompressor:
+    '''Incremental decoder for the gzip and deflate content encodings.
+    '''
+    encodings = ('gzip', 'x-gzip', 'deflate')
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        self._head = ''
+        if encoding == 'deflate':
+            # zlib stream or raw deflate, told apart by the first two bytes
+            self._zobj = None
+        else:
+            self._zobj = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    def feed(self, data):
+        if self._zobj is None:
+            data = self._head + data
+            if len(data) < 2:
+                self._head = data
+                return ''
+            self._head = ''
+            cmf, flg = ord(data[0]), ord(data[1])
+            if cmf & 0x0f == 8 and (cmf << 8 | flg) % 31 == 0:
+                self._zobj = zlib.decompressobj()
+            else:
+                # some servers send a raw deflate stream, no zlib header
+                self._zobj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._zobj.decompress(data)
+
+    def flush(self):
+        if self._zobj is None:
+            self._zobj = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self._zobj.decompress(self._head) + self._zobj.flush()
+        return self._zobj.flush()
+
 class _AuthHeader:
     """<BasicAuth xmlns="ZSI_SCHEMA_URI">
            <Name>%s</Name><Password>%s</Password>
@@ -93,10 +135,13 @@ class _Binding:
     defaultHttpTransport = httplib.HTTPConnection
     defaultHttpsTransport = httplib.HTTPSConnection
     logger = _GetLogger('ZSI.client.Binding')
+    readChunkSize = 65536
 
     def __init__(self, nsdict=None, transport=None, url=None, tracefile=None,
                  readerclass=None, writerclass=None, soapaction='',
-                 wsAddressURI=None, sig_handler=None, transdict=None, **kw):
+                 wsAddressURI=None, sig_handler=None, transdict=None,
+                 compression=False, compress_request=False, instrument=None,
+                 **kw):
         '''Initialize.
         Keyword arguments include:
             transport -- default use HTTPConnection.
@@ -113,6 +158,12 @@ class _Binding:
             it's not used.
             sig_handler -- XML Signature handler, must sign and verify.
             endPointReference -- optional Endpoint Reference.
+            compression -- ask for gzip/deflate compressed replies, they are
+            decompressed while they are read.
+            compress_request -- send request bodies gzip compressed, the
+            server must support it.
+            instrument -- object whose record method is given the timings
+            of every exchange, see ZSI.instrument.
         '''
         #self.data = None
         #self.ps = None
@@ -127,6 +178,9 @@ class _Binding:
         self.soapaction = soapaction
         self.wsAddressURI = wsAddressURI
         self.sig_handler = sig_handler
+        self.compression = compression
+        self.compress_request = compress_request
+        self.instrument = instrument
         self.address = None
         self.endPointReference = kw.get('endPointReference', None)
         self.cookies = Cookie.SimpleCookie()
@@ -170,9 +224,10 @@ class _Binding:
         self.user_headers.append((header, value))
         return self
 
-    def __addcookies(self):
-        '''Add cookies from self.cookies to request in self.local.h
+    def GetCookieHeaders(self):
+        '''Return the values of the Cookie headers for self.cookies
         '''
+        headers = []
         for cname, morsel in self.cookies.iteritems():
             attrs = []
             value = morsel.get('version', '')
@@ -185,7 +240,26 @@ class _Binding:
             value = morsel.get('domain')
             if value:
                 attrs.append('$Domain=%s' % value)
-            self.local.h.putheader('Cookie', "; ".join(attrs))
+            headers.append("; ".join(attrs))
+        return headers
+
+    def StoreCookies(self, msg):
+        '''Load the Set-Cookie headers of a response message into self.cookies
+        '''
+        saved = None
+        for d in msg.getallmatchingheaders('set-cookie'):
+            if d[0] in [ ' ', '\t' ]:
+                saved += d.strip()
+            else:
+                if saved: self.cookies.load(saved)
+                saved = d.strip()
+        if saved: self.cookies.load(saved)
+
+    def __addcookies(self):
+        '''Add cookies from self.cookies to request in self.local.h
+        '''
+        for value in self.GetCookieHeaders():
+            self.local.h.putheader('Cookie', value)
 
     def RPC(self, url, opname, obj, replytype=None, **kw):
         '''Send a request, return the reply.  See Send() and Recieve()
@@ -219,7 +293,82 @@ class _Binding:
             soapheaders -- list of pyobj, typically w/typecode attribute.
                 serialized in the SOAP:Header.
             requesttypecode --
+            soapfilter -- callable taking the serialized message and
+                returning the data actually sent.
+            replyparser -- callable taking the raw reply and the reply
+                typecode, returning the parsed reply or None to parse it as
+                usual (see ZSI.parallel).
+            soapdata -- the message already serialized, e.g. filled in from
+                a RequestTemplate, obj is not serialized again.
 
+        '''
+        url = url or self.url
+        exchange = None
+        if self.instrument is not None:
+            exchange = Exchange(operation_name(opname, obj, soapaction),
+                                soapaction or self.soapaction)
+        self.local.exchange = exchange
+        if exchange is None:
+            return self.__send(url, opname, obj, nsdict, soapaction, wsaction,
+                               endPointReference, soapheaders, exchange, **kw)
+        try:
+            self.__send(url, opname, obj, nsdict, soapaction, wsaction,
+                        endPointReference, soapheaders, exchange, **kw)
+        except Exception, e:
+            exc_info = sys.exc_info()
+            # the time since the last lap goes to the phase that failed
+            for phase in ('serialize', 'connect', 'send'):
+                if phase not in exchange.phases:
+                    break
+            self.__record(exchange, e.__class__.__name__, phase)
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+    def __send(self, url, opname, obj, nsdict, soapaction, wsaction,
+               endPointReference, soapheaders, exchange, **kw):
+        soapdata = kw.pop('soapdata', None)
+        if soapdata is None:
+            sw = self.SerializeRequest(url, opname, obj, nsdict=nsdict,
+                     soapaction=soapaction, wsaction=wsaction,
+                     endPointReference=endPointReference,
+                     soapheaders=soapheaders, **kw)
+            soapdata = str(sw)
+            boundary, startCID = sw.getMIMEBoundary(), sw.getStartCID()
+        else:
+            boundary, startCID = '', None
+
+        scheme,netloc,_,_,_,_ = urlparse.urlparse(url)
+        transport = self.transport
+        if transport is None and url is not None:
+            if scheme == 'https':
+                transport = self.defaultHttpsTransport
+            elif scheme == 'http':
+                transport = self.defaultHttpTransport
+            else:
+                raise RuntimeError('must specify transport or url startswith https/http')
+
+        # Send the request.
+        if not issubclass(transport, httplib.HTTPConnection):
+            raise TypeError('transport must be a HTTPConnection')
+
+        soapfilter = kw.get('soapfilter')
+        if soapfilter is not None:
+            soapdata = soapfilter(soapdata)
+        if exchange is not None:
+            exchange.lap('serialize')
+        self.local.h = transport(netloc, None, **self.transdict)
+        self.local.h.connect()
+        if exchange is not None:
+            exchange.lap('connect')
+        self.local.boundary = boundary
+        self.local.startCID = startCID
+        self.local.replyparser = kw.get('replyparser')
+        self.SendSOAPData(soapdata, url, soapaction, **kw)
+
+    def SerializeRequest(self, url, opname, obj, nsdict={}, soapaction=None,
+                         wsaction=None, endPointReference=None, soapheaders=(),
+                         **kw):
+        '''Serialize a message the way Send() does, without sending it.
+        Returns the SoapWriter, see Send() docstring for the arguments.
         '''
         url = url or self.url
         endPointReference = endPointReference or self.endPointReference
@@ -276,37 +425,28 @@ class _Binding:
         if self.sig_handler is not None:
             self.sig_handler.sign(sw)
 
-        scheme,netloc,_,_,_,_ = urlparse.urlparse(url)
-        transport = self.transport
-        if transport is None and url is not None:
-            if scheme == 'https':
-                transport = self.defaultHttpsTransport
-            elif scheme == 'http':
-                transport = self.defaultHttpTransport
-            else:
-                raise RuntimeError('must specify transport or url startswith https/http')
-
-        # Send the request.
-        if not issubclass(transport, httplib.HTTPConnection):
-            raise TypeError('transport must be a HTTPConnection')
-
-        soapdata = str(sw)
-        self.local.h = transport(netloc, None, **self.transdict)
-        self.local.h.connect()
-        self.local.boundary = sw.getMIMEBoundary()
-        self.local.startCID = sw.getStartCID()
-        self.SendSOAPData(soapdata, url, soapaction, **kw)
+        return sw
 
     def SendSOAPData(self, soapdata, url, soapaction, headers={}, **kw):
+        exchange = getattr(self.local, 'exchange', None)
         # Tracing?
         if self.trace:
             print >>self.trace, "_" * 33, time.ctime(time.time()), "REQUEST:"
             print >>self.trace, soapdata
+            if exchange is not None:
+                exchange.lap('trace')
 
         url = url or self.url
         request_uri = _get_postvalue_from_absoluteURI(url)
+        body = soapdata
+        if self.compress_request:
+            body = _gzip(soapdata)
         self.local.h.putrequest("POST", request_uri)
-        self.local.h.putheader("Content-Length", "%d" % len(soapdata))
+        self.local.h.putheader("Content-Length", "%d" % len(body))
+        if self.compress_request:
+            self.local.h.putheader("Content-Encoding", "gzip")
+        if self.compression:
+            self.local.h.putheader("Accept-Encoding", "gzip, deflate")
         if len(self.local.boundary) == 0:
             #no attachment
             self.local.h.putheader("Content-Type", 'text/xml; charset="%s"' %UNICODE_ENCODING)
@@ -334,7 +474,10 @@ class _Binding:
         for header,value in self.user_headers:
             self.local.h.putheader(header, value)
         self.local.h.endheaders()
-        self.local.h.send(soapdata)
+        self.local.h.send(body)
+        if exchange is not None:
+            exchange.lap('send')
+            exchange.request_bytes += len(body)
 
         # Clear prior receive state.
         self.local.data, self.local.ps = None, None
@@ -378,10 +521,16 @@ class _Binding:
         '''
         if self.local.data: return self.local.data
         trace = self.trace
+        exchange = getattr(self.local, 'exchange', None)
         while 1:
             response = self.local.h.getresponse()
+            if exchange is not None:
+                exchange.lap('wait')
             reply_code, reply_msg, self.local.reply_headers, self.local.data = \
-                response.status, response.reason, response.msg, response.read()
+                response.status, response.reason, response.msg, \
+                self.ReadResponse(response)
+            if exchange is not None:
+                exchange.lap('read')
             if trace:
                 print >>trace, "_" * 33, time.ctime(time.time()), "RESPONSE:"
                 for i in (reply_code, reply_msg,):
@@ -389,14 +538,9 @@ class _Binding:
                 print >>trace, "-------"
                 print >>trace, str(self.local.reply_headers)
                 print >>trace, self.local.data
-            saved = None
-            for d in response.msg.getallmatchingheaders('set-cookie'):
-                if d[0] in [ ' ', '\t' ]:
-                    saved += d.strip()
-                else:
-                    if saved: self.cookies.load(saved)
-                    saved = d.strip()
-            if saved: self.cookies.load(saved)
+                if exchange is not None:
+                    exchange.lap('trace')
+            self.StoreCookies(response.msg)
             if response.status == 401:
                 if not callable(self.http_callbacks.get(response.status,None)):
                     raise RuntimeError('HTTP Digest Authorization Failed')
@@ -410,6 +554,28 @@ class _Binding:
             self.local.h._HTTPConnection__response = None
         return self.local.data
 
+    def ReadResponse(self, response):
+        '''Read the body of an HTTP response, decompressing it as it's
+        read if the server used a gzip or deflate content encoding.
+        '''
+        exchange = getattr(self.local, 'exchange', None)
+        encoding = (response.getheader('content-encoding') or '').lower()
+        if encoding not in _Decompressor.encodings:
+            data = response.read()
+            if exchange is not None:
+                exchange.response_bytes += len(data)
+            return data
+        decompressor = _Decompressor(encoding)
+        chunks = []
+        while 1:
+            chunk = response.read(self.readChunkSize)
+            if not chunk: break
+            if exchange is not None:
+                exchange.response_bytes += len(chunk)
+            chunks.append(decompressor.feed(chunk))
+        chunks.append(decompressor.flush())
+        return ''.join(chunks)
+
     def IsSOAP(self):
         if self.local.ps: return 1
         self.ReceiveRaw()
@@ -458,15 +624,48 @@ class _Binding:
             wsaction -- If using WS-Address, must specify Action value we expect to
                 receive.
         '''
-        self.ReceiveSOAP(**kw)
-        if self.local.ps.IsAFault():
-            msg = FaultFromFaultMessage(self.local.ps)
-            raise FaultException(msg)
+        exchange = getattr(self.local, 'exchange', None)
+        if exchange is None:
+            return self.__receive(replytype, **kw)
+        try:
+            reply = self.__receive(replytype, **kw)
+        except Exception, e:
+            exc_info = sys.exc_info()
+            if isinstance(e, FaultException):
+                self.__record(exchange, 'fault')
+            else:
+                self.__record(exchange, e.__class__.__name__)
+            raise exc_info[0], exc_info[1], exc_info[2]
+        self.__record(exchange, None)
+        return reply
+
+    def __record(self, exchange, error, phase='parse'):
+        self.local.exchange = None
+        exchange.finish(error, phase)
+        try:
+            self.instrument.record(exchange)
+        except Exception, e:
+            self.logger.warning('instrument failed to record %s: %s',
+                                exchange.operation, e)
 
+    def __receive(self, replytype, **kw):
         tc = replytype
         if hasattr(replytype, 'typecode'):
             tc = replytype.typecode
 
+        replyparser = getattr(self.local, 'replyparser', None)
+        if replyparser is not None and self.sig_handler is None \
+            and self.address is None:
+            self.local.replyparser = None
+            reply = replyparser(self.ReceiveRaw(), tc)
+            if reply is not None:
+                return reply
+
+        self.ReceiveSOAP(**kw)
+        if self.local.ps.IsAFault():
+            msg = FaultFromFaultMessage(self.local.ps)
+            raise FaultException(msg)
+
         reply = self.local.ps.Parse(tc)
         if self.address is not None:
             self.address.checkResponse(self.local.ps, kw.get('wsaction'))
@@ -476,6 +675,80 @@ class _Binding:
         return "<%s instance %s>" % (self.__class__.__name__, _get_idstr(self))
 
 
+_PLACEHOLDER = '__zsi_placeholder_%s__'
+_PLACEHOLDER_RE = re.compile(r'__zsi_placeholder_([a-zA-Z0-9]+)__')
+# the escaping of c14n (and StreamElementProxy) for text and attributes
+_TEXT_ESCAPES = (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;'),
+                 ('\015', '&#xD;'))
+_ATTR_ESCAPES = (('&', '&amp;'), ('<', '&lt;'), ('"', '&quot;'),
+                 ('\011', '&#x9;'), ('\012', '&#xA;'), ('\015', '&#xD;'))
+
+def _in_attribute(prefix):
+    '''Tells if the end of a serialized message prefix is in an attribute
+    value: '<' is always escaped in text and values, and '"' in values.
+    '''
+    segments = prefix[prefix.rfind('<'):].split('"')
+    return len(segments) % 2 == 0 and '>' not in ''.join(segments[::2])
+
+class RequestTemplate:
+    '''A request serialized once by a binding, with placeholders for the
+    string values that change from one call to the next (MOR values, names,
+    tokens). fill returns the message with the values escaped in place of
+    the placeholders, to be given to Send as soapdata along with the request:
+
+        request.set_element__this(RequestTemplate.placeholder('this'))
+        template = RequestTemplate(binding, request)
+        proxy.CancelTask(template.request, soapdata=template.fill(this=mor))
+
+    Values that typecodes don't take as strings (numbers, booleans, dates)
+    can't be placeholders, a template is made for each value instead. Not for
+    bindings that sign their requests or add WS-Addressing headers, which
+    change with every message.
+    '''
+
+    def placeholder(name):
+        '''The string value standing for name (letters and digits) in the
+        request given to the template.
+        '''
+        if not name.isalnum():
+            raise ValueError('placeholder names are letters and digits: %r'
+                             % name)
+        return _PLACEHOLDER % name
+    placeholder = staticmethod(placeholder)
+
+    def __init__(self, binding, obj, **kw):
+        if binding.sig_handler is not None or \
+            binding.wsAddressURI is not None:
+            raise TypeError('requests of %s change with every message'
+                            % binding)
+        self.request = obj
+        soapdata = str(binding.SerializeRequest(None, None, obj, **kw))
+        parts = _PLACEHOLDER_RE.split(soapdata)
+        self.names = frozenset(parts[1::2])
+        self._parts = parts
+        self._escapes = [_in_attribute(soapdata[:m.start()]) and
+                         _ATTR_ESCAPES or _TEXT_ESCAPES
+                         for m in _PLACEHOLDER_RE.finditer(soapdata)]
+
+    def fill(self, **values):
+        '''Returns the serialized request with the values given for every
+        placeholder name, escaped like the writer escapes XML text and
+        attributes.
+        '''
+        parts = self._parts[:]
+        for i in xrange(1, len(parts), 2):
+            value = values[parts[i]]
+            if isinstance(value, unicode):
+                value = value.encode(UNICODE_ENCODING)
+            else:
+                value = str(value)
+            for char, entity in self._escapes[i // 2]:
+                if char in value:
+                    value = value.replace(char, entity)
+            parts[i] = value
+        return ''.join(parts)
+
+
 class Binding(_Binding):
     '''Object that represents a binding (connection) to a SOAP server.
     Can be used in the "name overloading" style.
@@ -537,11 +810,14 @@ class Binding(_Binding):
             wsaction -- If using WS-Address, must specify Action value we expect to
                 receive.
         '''
+        if self.typesmodule is None:
+            return _Binding.Receive(self, replytype, **kw)
+
         self.ReceiveSOAP(**kw)
         ps = self.local.ps
         tp = _find_type(ps.body_root)
         isarray = ((isinstance(tp, _seqtypes) and tp[1] == 'Array') or _find_arraytype(ps.body_root))
-        if self.typesmodule is None or isarray:
+        if isarray:
             return _Binding.Receive(self, replytype, **kw)
 
         if ps.IsAFault():
@@ -41,6 +41,10 @@ def SetUpLazyEvaluation(option, opt, value, parser, *args, **kwargs):
     from pysphere.ZSI.generate.containers import TypecodeContainerBase
     TypecodeContainerBase.lazy = True
 
+def SetUpSpecializedParsers(option, opt, value, parser, *args, **kwargs):
+    from pysphere.ZSI.generate.containers import TypecodeContainerBase
+    TypecodeContainerBase.specialized = True
+
 
 
 def wsdl2py(args=None):
@@ -87,12 +91,24 @@ def wsdl2py(args=None):
                       'metaclass':'pyclass_type'},
                   help="add convenience functions for complexTypes, including Getters, Setters, factory methods, and properties (via metaclass). *** DONT USE WITH --simple-naming ***")
 
+    op.add_option("-S", "--slots",
+                  action="callback", callback=SetPyclassMetaclass,
+                  callback_kwargs={'module':'pysphere.ZSI.generate.pyclass',
+                      'metaclass':'pyclass_slots_type'},
+                  help="same as --complexType, and the complexType pyclasses get __slots__ (no instance __dict__). *** DONT USE WITH --simple-naming ***")
+
     # Lazy Evaluation of Typecodes (done at serialization/parsing when needed).
     op.add_option("-l", "--lazy",
                   action="callback", callback=SetUpLazyEvaluation,
                   callback_kwargs={},
                   help="EXPERIMENTAL: recursion error solution, lazy evalution of typecodes")
 
+    # Specialized parsers for complexTypes (field lookup tables).
+    op.add_option("-z", "--specialized",
+                  action="callback", callback=SetUpSpecializedParsers,
+                  callback_kwargs={},
+                  help="complexTypes are parsed with field lookup tables and inline simple content conversion, falling back to the generic parser when needed")
+
     op.add_option("-o", "--output-dir",
                   action="store", dest="output_dir", default=".", type="string",
                   help="save files in directory")
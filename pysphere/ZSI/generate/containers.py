@@ -1163,11 +1163,13 @@ class TypecodeContainerBase(TypesContainerBase):
         mixed_content_aname -- text content will be placed in this attribute.
         attributes_aname -- attributes will be placed in this attribute.
         metaclass -- set this attribute to specify a pyclass __metaclass__
+        specialized -- complexTypes use the specialized parser
     '''
     mixed_content_aname = 'text'
     attributes_aname = 'attrs'
     metaclass = None
     lazy = False
+    specialized = False
     logger = _GetLogger("TypecodeContainerBase")
 
     def __init__(self, do_extended=False, extPyClasses=None):
@@ -1364,6 +1366,8 @@ class TypecodeContainerBase(TypesContainerBase):
     def getExtraFlags(self):
         if self.mixed:
             self.extraFlags += 'mixed=True, mixed_aname="%s", ' %self.getMixedTextAName()
+        if TypecodeContainerBase.specialized:
+            self.extraFlags += 'specialized=True, '
 
         return self.extraFlags
 
@@ -2167,6 +2171,8 @@ class ElementLocalComplexTypeContainer(TypecodeContainerBase, AttributeMixIn):
                        ofwhat=self.getTypecodeList(),
                        atypecode=self.attribute_typecode,
                        pyclass=self.getPyClass(),
+                       flags=TypecodeContainerBase.specialized and
+                             'specialized=True,' or '',
                        ))
         except Exception, ex:
             args = ['Failure processing an element w/local complexType: %s' %(
@@ -2194,7 +2200,7 @@ class ElementLocalComplexTypeContainer(TypecodeContainerBase, AttributeMixIn):
             '%(ID3)skw["pname"] = %(pname)s',
             '%(ID3)skw["aname"] = "%(aname)s"',
             '%(ID3)s%(atypecode)s = {}',
-            '%(ID3)spysphere.ZSI.TCcompound.ComplexType.__init__(self,None,TClist,inorder=0,**kw)',
+            '%(ID3)spysphere.ZSI.TCcompound.ComplexType.__init__(self,None,TClist,inorder=0,%(flags)s**kw)',
             ]
         for l in self.attrComponents: element.append('%(ID3)s'+str(l))
         element += self.getPyClassDefinition()
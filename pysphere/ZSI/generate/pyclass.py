@@ -3,7 +3,7 @@
 # See LBNLCopyright for copyright notice!
 ###########################################################################
 
-import pydoc, sys
+import os, pydoc, sys
 from pysphere.ZSI import TC
 
 # If function.__name__ is read-only, fail
@@ -54,6 +54,13 @@ class pyclass_type(type):
     and setting the elements specified in the ofwhat list, and factory methods
     for constructing the elements.
 
+    If slots is True, the pyclasses of complexTypes get __slots__ for their
+    element, attribute and text attributes so instances carry no __dict__
+    (which also means no other attribute can be set on them).  Either
+    generate the code with wsdl2py --slots (pyclass_slots_type) or set
+    ZSI_PYCLASS_SLOTS=1 in the environment, the pyclasses are made when
+    the generated types module is imported.
+
     Known Limitations:
         1)Uses XML Schema element names directly to create method names,
            using characters in this set will cause Syntax Errors:
@@ -61,6 +68,8 @@ class pyclass_type(type):
               (NCNAME)-(letter U digit U "_")
 
     """
+    slots = bool(int(os.environ.get('ZSI_PYCLASS_SLOTS', 0)))
+
     def __new__(cls, classname, bases, classdict):
         """
         """
@@ -125,6 +134,9 @@ class pyclass_type(type):
                         %(what.nspname,what.pname,what.minOccurs,what.maxOccurs,what.nillable)
                         )
 
+            if cls.slots and '__slots__' not in classdict:
+                classdict['__slots__'] = cls.__get_slots(typecode)
+
         #
         # mutable type <complexType> complexContent | modelGroup
         # or immutable type <complexType> simpleContent (float, str, etc)
@@ -147,6 +159,19 @@ class pyclass_type(type):
 
         return type.__new__(cls,classname,bases,classdict)
 
+    def __get_slots(typecode):
+        names = [typecode.attrs_aname]
+        if typecode.mixed:
+            names.append(typecode.mixed_aname)
+        for what in typecode.ofwhat:
+            aname = getattr(what, 'aname', None)
+            if aname is None and callable(what):
+                aname = what().aname
+            if aname is not None and aname not in names:
+                names.append(aname)
+        return tuple(names)
+    __get_slots = staticmethod(__get_slots)
+
     def __create_functions_from_what(what):
         if not callable(what):
             def get(self):
@@ -280,4 +305,7 @@ class pyclass_type(type):
         staticmethod(__create_text_functions_from_what)
 
 
-
+class pyclass_slots_type(pyclass_type):
+    """pyclass_type giving the pyclasses of complexTypes __slots__.
+    """
+    slots = True
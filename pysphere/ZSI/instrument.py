@@ -0,0 +1,302 @@
+#! /usr/bin/env python
+# $Header$
+'''Instrumentation of the SOAP exchanges of a binding.
+
+A binding given an instrument times each exchange in phases and passes the
+Exchange to instrument.record once the reply is parsed, or once the request
+or the reply failed:
+
+    serialize -- building the message, soapfilter included
+    connect -- opening the connection
+    send -- request line, headers and body
+    wait -- until the status and headers of the reply arrive
+    read -- reading (and decompressing) the reply body
+    parse -- ParsedSoap and the typecode parse, or the replyparser
+    trace -- writing to the tracefile, if there is one
+
+Any object with a record(exchange) method is an instrument. Histograms keeps
+latency and size histograms per operation, which its json and prometheus
+methods dump as JSON or in the Prometheus text format.
+
+Without an instrument the binding doesn't take any time.
+'''
+
+import math, threading, time
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+PHASES = ('serialize', 'connect', 'send', 'wait', 'read', 'parse', 'trace')
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def operation_name(opname, obj, soapaction):
+    '''The name of the operation sent: opname, else the local name of the
+    request element, else the soapaction.
+    '''
+    if opname:
+        return opname
+    pname = getattr(getattr(obj, 'typecode', None), 'pname', None)
+    if isinstance(pname, tuple):
+        pname = pname[-1]
+    return pname or soapaction or 'unknown'
+
+
+class Exchange:
+    '''Timings of a request and its reply.
+        operation -- see operation_name
+        soapaction -- value of the SOAPAction header
+        phases -- dictionary of seconds spent in each phase
+        total -- seconds from the start of Send to the end of the parse
+        request_bytes, response_bytes -- sizes on the wire, compressed
+            bodies included
+        error -- None, 'fault' for SOAP faults, else the exception class name
+    '''
+
+    def __init__(self, operation, soapaction):
+        self.operation = operation
+        self.soapaction = soapaction
+        self.phases = {}
+        self.total = 0.0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.error = None
+        self._start = self._last = time.time()
+
+    def lap(self, phase):
+        '''Adds the time elapsed since the previous lap to phase.
+        '''
+        now = time.time()
+        self.phases[phase] = self.phases.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def finish(self, error=None, phase='parse'):
+        '''Ends the exchange, the time since the last lap going to phase.
+        '''
+        self.lap(phase)
+        self.total = self._last - self._start
+        self.error = error
+
+
+class Histogram:
+    '''Counts of non negative integers in log-linear buckets, like
+    HdrHistogram: values below 2**precision are counted exactly, larger ones
+    with a relative error below 2**-precision. Recording is a dictionary
+    update, whatever the range of values.
+    '''
+
+    def __init__(self, precision=7):
+        self.precision = precision
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value, count=1):
+        value = int(value)
+        if value < 0:
+            raise ValueError('negative value %d' % value)
+        shift = math.frexp(value)[1] - self.precision
+        if shift > 0:
+            bucket = value >> shift << shift
+        else:
+            bucket = value
+        self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def add(self, other):
+        '''Adds the counts of other, of the same precision.
+        '''
+        if other.precision != self.precision:
+            raise ValueError('histograms of different precision')
+        if not other.count:
+            return
+        for bucket, count in other.counts.iteritems():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if self.min is None or other.min < self.min:
+            self.min = other.min
+        if self.max is None or other.max > self.max:
+            self.max = other.max
+
+    def highest_equivalent(self, value):
+        '''The largest value counted in the same bucket as value.
+        '''
+        shift = math.frexp(value)[1] - self.precision
+        if shift > 0:
+            return (value >> shift << shift) + (1 << shift) - 1
+        return value
+
+    def quantile(self, q):
+        '''The value below or at which a fraction q of the values are,
+        None if there aren't any.
+        '''
+        if not self.count:
+            return None
+        rank = max(int(math.ceil(q * self.count)), 1)
+        seen = 0
+        for value in sorted(self.counts):
+            seen += self.counts[value]
+            if seen >= rank:
+                return min(self.highest_equivalent(value), self.max)
+        return self.max
+
+    def mean(self):
+        if not self.count:
+            return None
+        return float(self.total) / self.count
+
+
+class Histograms:
+    '''Instrument keeping per operation a Histogram of the microseconds
+    spent in each phase and in the whole exchange, one of the request and
+    reply sizes, and the number of exchanges that failed.
+    '''
+
+    def __init__(self, precision=7):
+        self.precision = precision
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._lock.acquire()
+        try:
+            self._operations = {}
+        finally:
+            self._lock.release()
+
+    def record(self, exchange):
+        self._lock.acquire()
+        try:
+            stats = self._operations.get(exchange.operation)
+            if stats is None:
+                stats = self._operations[exchange.operation] = \
+                    {'phases':{}, 'errors':{}}
+                for name in ('total', 'request_bytes', 'response_bytes'):
+                    stats[name] = Histogram(self.precision)
+            phases = stats['phases']
+            for phase, seconds in exchange.phases.iteritems():
+                histogram = phases.get(phase)
+                if histogram is None:
+                    histogram = phases[phase] = Histogram(self.precision)
+                histogram.record(max(seconds, 0) * 1e6)
+            stats['total'].record(max(exchange.total, 0) * 1e6)
+            stats['request_bytes'].record(exchange.request_bytes)
+            stats['response_bytes'].record(exchange.response_bytes)
+            if exchange.error is not None:
+                stats['errors'][exchange.error] = \
+                    stats['errors'].get(exchange.error, 0) + 1
+        finally:
+            self._lock.release()
+
+    def snapshot(self):
+        '''A dictionary of operation names to the summaries of their
+        histograms, times in seconds.
+        '''
+        def summary(histogram, unit):
+            data = {'count':histogram.count}
+            if histogram.count:
+                data['sum'] = histogram.total / unit
+                data['min'] = histogram.min / unit
+                data['max'] = histogram.max / unit
+                data['mean'] = histogram.mean() / unit
+                for q in QUANTILES:
+                    data['p%s' % str(q * 100).rstrip('0').rstrip('.')] = \
+                        histogram.quantile(q) / unit
+            return data
+
+        self._lock.acquire()
+        try:
+            data = {}
+            for operation, stats in self._operations.iteritems():
+                phases = {}
+                for phase, histogram in stats['phases'].iteritems():
+                    phases[phase] = summary(histogram, 1e6)
+                data[operation] = {
+                    'phases':phases,
+                    'total':summary(stats['total'], 1e6),
+                    'request_bytes':summary(stats['request_bytes'], 1),
+                    'response_bytes':summary(stats['response_bytes'], 1),
+                    'errors':dict(stats['errors'])}
+            return data
+        finally:
+            self._lock.release()
+
+    def json(self, **kw):
+        '''The snapshot as a JSON string, kw are given to json.dumps.
+        '''
+        return json.dumps(self.snapshot(), **kw)
+
+    def prometheus(self, prefix='zsi_soap'):
+        '''The histograms as Prometheus summaries, in the text exposition
+        format.
+        '''
+        lines = []
+        def metric(name, help, type, samples):
+            lines.append('# HELP %s_%s %s' % (prefix, name, help))
+            lines.append('# TYPE %s_%s %s' % (prefix, name, type))
+            for suffix, labels, value in samples:
+                lines.append('%s_%s%s{%s} %s' % (prefix, name, suffix,
+                    ','.join(['%s="%s"' % (k, _escape_label(v))
+                              for k, v in labels]), _number(value)))
+
+        def summary_samples(histogram, labels, unit):
+            samples = []
+            if histogram.count:
+                for q in QUANTILES:
+                    samples.append(('', labels + [('quantile', q)],
+                                    histogram.quantile(q) / unit))
+            samples.append(('_sum', labels, histogram.total / unit))
+            samples.append(('_count', labels, histogram.count))
+            return samples
+
+        self._lock.acquire()
+        try:
+            operations = sorted(self._operations.items())
+            phases, totals, requests, responses, errors = [], [], [], [], []
+            for operation, stats in operations:
+                labels = [('operation', operation)]
+                for phase in PHASES:
+                    if phase in stats['phases']:
+                        phases.extend(summary_samples(stats['phases'][phase],
+                                      labels + [('phase', phase)], 1e6))
+                totals.extend(summary_samples(stats['total'], labels, 1e6))
+                requests.extend(summary_samples(stats['request_bytes'],
+                                                labels, 1))
+                responses.extend(summary_samples(stats['response_bytes'],
+                                                 labels, 1))
+                for error, count in sorted(stats['errors'].items()):
+                    errors.append(('', labels + [('error', error)], count))
+        finally:
+            self._lock.release()
+
+        metric('phase_seconds', 'Time spent in each phase of the SOAP '
+               'exchanges.', 'summary', phases)
+        metric('seconds', 'Time of the whole SOAP exchanges.', 'summary',
+               totals)
+        metric('request_bytes', 'Size of the requests sent.', 'summary',
+               requests)
+        metric('response_bytes', 'Size of the replies read.', 'summary',
+               responses)
+        metric('errors_total', 'SOAP exchanges failed with a fault or an '
+               'exception.', 'counter', errors)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"'
+                                                   ).replace('\n', '\\n')
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
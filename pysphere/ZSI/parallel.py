@@ -0,0 +1,315 @@
+#! /usr/bin/env python
+# $Header$
+'''Parallel parsing of big replies.
+
+Replies made mostly of a long sequence of sibling elements, like the
+returnval/objects of RetrievePropertiesEx, are split between those elements
+without building a DOM. The pieces are parsed by a pool of worker processes
+which have the types modules imported, the parsed elements come back as
+picklable records and are put in order into the reply parsed from the rest
+of the message. A ParallelParser is given to Binding.Send as replyparser:
+
+    parser = ParallelParser(modules=['VimService_services'])
+    proxy.RetrievePropertiesEx(request,
+                               replyparser=parser.items('returnval', 'objects'))
+
+Replies with fewer elements than min_items, or that can't be split, are
+parsed as usual. So are those the workers fail to parse, the regular parse
+reports the error.
+'''
+
+import re, threading, gc
+from cPickle import dumps, loads, HIGHEST_PROTOCOL
+
+try:
+    import multiprocessing
+except ImportError:
+    #python 2.5
+    multiprocessing = None
+
+from pysphere.ZSI.parse import ParsedSoap
+from pysphere.ZSI.schema import GED, GTD, TypeDefinition, ElementDeclaration
+from pysphere.ZSI.wstools.logging import getLogger as _GetLogger
+
+
+_TAG_RE = re.compile(r'<(/?)([^\s/>!?]+)((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>'
+                     r'|<(!)|<\?.*?\?>', re.S)
+_end_tags = {}
+
+def _element_end(data, qname, pos):
+    '''Offset right after the end tag of the qname element whose start tag
+    ends at pos, or None.
+    '''
+    tag = _end_tags.get(qname)
+    if tag is None:
+        tag = _end_tags.setdefault(qname,
+                            re.compile(r'<(/?)%s(?=[\s/>])' % re.escape(qname)))
+    level = 1
+    while level:
+        match = tag.search(data, pos)
+        if match is None:
+            return None
+        pos = data.find('>', match.end()) + 1
+        if not pos:
+            return None
+        if match.group(1):
+            level -= 1
+        elif data[pos - 2] != '/':
+            level += 1
+    return pos
+
+def _split(data, path):
+    '''Returns the (start, end) offsets of the elements found at path (local
+    names) below the SOAP body root, or None if they can't be told apart
+    without a parser (comments, CDATA sections, several parents).
+    '''
+    parents = ['Envelope', 'Body', None] + list(path[:-1])
+    depth = len(parents)
+    names, starts, items = [], [], []
+    parent = None
+    pos = 0
+    search = _TAG_RE.search
+    while 1:
+        match = search(data, pos)
+        if match is None:
+            break
+        pos = match.end()
+        if match.group(4):
+            return None
+        qname = match.group(2)
+        if qname is None:
+            continue
+        if match.group(1):
+            if not names:
+                return None
+            names.pop()
+            starts.pop()
+            continue
+        name = qname.split(':')[-1]
+        empty = match.group(3).endswith('/')
+        if len(names) == depth and name == path[-1] and \
+            names[1] == parents[1] and names[3:] == parents[3:]:
+            if parent is None:
+                parent = starts[-1]
+            elif parent != starts[-1]:
+                return None
+            if not empty:
+                pos = _element_end(data, qname, pos)
+                if pos is None:
+                    return None
+            items.append((match.start(), pos))
+            continue
+        if not empty:
+            names.append(name)
+            starts.append(match.start())
+    return items
+
+
+def _items(reply, path):
+    '''The list of elements found at path below the parsed reply.
+    '''
+    value = reply
+    for name in path:
+        if isinstance(value, list) or not hasattr(value, 'typecode'):
+            raise ValueError('no single element holds "%s"' % name)
+        for what in value.typecode.ofwhat:
+            if callable(what): what = what()
+            if what.pname == name:
+                value = getattr(value, what.aname)
+                break
+        else:
+            raise ValueError('no element "%s" in %s' % (name, value.typecode))
+    if not isinstance(value, list):
+        raise ValueError('"%s" is not a sequence' % path[-1])
+    return value
+
+
+# Records are plain tuples, which unpickle much faster than instances. A
+# pyclass instance is a (key, base, state) tuple, key identifies its typecode,
+# base is the value of immutable types (None for complexTypes) and state holds
+# the instance attributes. Tuples in the data are wrapped in a 1-tuple.
+
+def _dump(value):
+    '''Replaces the pyclass instances in value with records.
+    '''
+    if isinstance(value, list):
+        return [_dump(v) for v in value]
+    if isinstance(value, tuple):
+        return (value,)
+    typecode = getattr(value, 'typecode', None)
+    if typecode is None or type(value) is not getattr(typecode, 'pyclass', None):
+        return value
+    if isinstance(typecode, TypeDefinition):
+        key = (typecode.type, (typecode.nspname, typecode.pname))
+    elif isinstance(typecode, ElementDeclaration):
+        key = (None, (typecode.nspname, typecode.pname))
+    else:
+        raise TypeError('no global typecode for %s' % typecode)
+
+    base = None
+    for cls in type(value).__mro__:
+        if cls.__module__ == '__builtin__':
+            if cls is not object:
+                base = cls(value)
+            break
+    state = {}
+    for name, v in getattr(value, '__dict__', {}).iteritems():
+        state[name] = _dump(v)
+    for cls in type(value).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            v = getattr(value, name, _dump)
+            if v is not _dump:
+                state[name] = _dump(v)
+    return (key, base, state)
+
+_pyclasses = {}
+
+def _pyclass(key):
+    pyclass = _pyclasses.get(key)
+    if pyclass is None:
+        type_, pname = key
+        if type_ is None:
+            typecode = GED(*pname)
+        else:
+            typecode = GTD(*type_)(pname)
+        pyclass = _pyclasses.setdefault(key, typecode.pyclass)
+    return pyclass
+
+def _load(value):
+    '''Rebuilds the pyclass instances of the records in value.
+    '''
+    if isinstance(value, list):
+        return [_load(v) for v in value]
+    if not isinstance(value, tuple):
+        return value
+    if len(value) == 1:
+        return value[0]
+    key, base, state = value
+    pyclass = _pyclass(key)
+    if base is None:
+        pyobj = pyclass.__new__(pyclass)
+    else:
+        pyobj = pyclass.__new__(pyclass, base)
+    for name, v in state.iteritems():
+        setattr(pyobj, name, _load(v))
+    return pyobj
+
+
+def _init_worker(modules):
+    for name in modules:
+        __import__(name)
+
+def _parse_items(key, path, data):
+    try:
+        reply = ParsedSoap(data).Parse(GED(*key))
+        return dumps(_dump(_items(reply, path)), HIGHEST_PROTOCOL)
+    except Exception, e:
+        # parse errors may not be unpickled, which hangs the pool
+        raise ValueError('%s: %s' % (e.__class__.__name__, e))
+
+
+class ParallelParser:
+    '''Parses the long sequences of big replies in a pool of worker
+    processes, started when first needed.
+        modules -- names of the modules holding the typecodes, imported by
+            each worker.
+        processes -- number of workers, by default the number of CPUs.
+        chunk_size -- elements parsed per task, by default the sequence is
+            cut in 4 tasks per worker.
+        min_items -- shorter sequences are parsed as usual.
+    '''
+    logger = _GetLogger('ZSI.parallel.ParallelParser')
+
+    def __init__(self, modules=(), processes=None, chunk_size=None,
+                 min_items=1000):
+        self.modules = tuple(modules)
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.min_items = min_items
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def items(self, *path):
+        '''Returns a replyparser for Binding.Send that parses in parallel the
+        elements at path (local names) below the SOAP body root.
+        '''
+        def replyparser(data, typecode):
+            return self.parse(data, typecode, path)
+        return replyparser
+
+    def parse(self, data, typecode, path):
+        '''Parses the reply data with the global element declaration typecode,
+        the elements at path below the body root are parsed by the workers.
+        Returns None if the reply must be parsed as usual instead.
+        '''
+        if multiprocessing is None or \
+            GED(typecode.nspname, typecode.pname) is not typecode:
+            return None
+        items = _split(data, path)
+        if not items or len(items) < max(self.min_items, 2):
+            return None
+
+        pool, processes = self._get_pool()
+        if pool is None:
+            return None
+        size = self.chunk_size or max(len(items) / (4 * processes), 1)
+        key = (typecode.nspname, typecode.pname)
+        head, tail = data[:items[0][0]], data[items[-1][1]:]
+        results = []
+        for i in xrange(1, len(items), size):
+            chunk = items[i:i + size]
+            results.append(pool.apply_async(_parse_items, (key, path,
+                head + data[chunk[0][0]:chunk[-1][1]] + tail)))
+        # the first element is parsed here, along with the rest of the reply
+        try:
+            reply = ParsedSoap(head + data[items[0][0]:items[0][1]] + tail
+                               ).Parse(typecode)
+            merged = _items(reply, path)
+            for result in results:
+                data = result.get()
+                # the collector would go through the whole heap many times
+                enabled = gc.isenabled()
+                gc.disable()
+                try:
+                    merged.extend(_load(loads(data)))
+                finally:
+                    if enabled: gc.enable()
+        except Exception, e:
+            self.logger.debug('parallel parse failed, parsing as usual: %s', e)
+            return None
+        return reply
+
+    def _get_pool(self):
+        self._lock.acquire()
+        try:
+            if self._pool is None:
+                processes = self.processes
+                if not processes:
+                    try:
+                        processes = multiprocessing.cpu_count()
+                    except NotImplementedError:
+                        processes = 2
+                try:
+                    pool = multiprocessing.Pool(processes, _init_worker,
+                                                (self.modules,))
+                except (ImportError, OSError, NotImplementedError), e:
+                    # no working semaphores on this platform, replies are
+                    # parsed as usual
+                    self.logger.debug('no worker pool: %s', e)
+                    pool = None
+                self._pool = (pool, processes)
+            return self._pool
+        finally:
+            self._lock.release()
+
+    def close(self):
+        '''Stops the worker processes.
+        '''
+        self._lock.acquire()
+        try:
+            pool, self._pool = self._pool, None
+        finally:
+            self._lock.release()
+        if pool is not None and pool[0] is not None:
+            pool[0].terminate()
+            pool[0].join()
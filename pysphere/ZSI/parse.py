@@ -3,19 +3,55 @@
 '''SOAP messaging parsing.
 '''
 
-from xml.dom import expatbuilder
+from xml.dom import expatbuilder, EMPTY_NAMESPACE
 from pysphere.ZSI import _children, _attrs, _child_elements, _stringtypes, \
         _backtrace, EvaluateException, ParseException, _valid_encoding, \
-        _Node, _find_attr, _resolve_prefix
+        _Node, _resolve_prefix
 from pysphere.ZSI.TC import AnyElement
 
-from pysphere.ZSI.wstools.Namespaces import SOAP, XMLNS
+from pysphere.ZSI.wstools.Namespaces import SOAP, SCHEMA, XMLNS
 from pysphere.ZSI.wstools.Utility import SplitQName
 
 _find_actor = lambda E: E.getAttributeNS(SOAP.ENV, "actor") or None
 _find_mu = lambda E: E.getAttributeNS(SOAP.ENV, "mustUnderstand")
 _find_root = lambda E: E.getAttributeNS(SOAP.ENC, "root")
-_find_id = lambda E: _find_attr(E, 'id')
+
+class _NSdict(dict):
+    '''Read-only namespace dictionary, shared by the elements of a scope.
+    '''
+    def _readonly(self, *args, **kw):
+        raise TypeError('namespace dictionaries are shared, use copy()')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = \
+        update = _readonly
+
+class _ElementAttrs(object):
+    '''The attributes the typecodes check on every element, read in a
+    single pass over the element's attributes. Missing values are the ones
+    of the _find_* helpers ('' or None).
+    '''
+    __slots__ = ('type', 'nil', 'href', 'id', 'arraytype')
+
+    def __init__(self, elt=None):
+        if elt is None:
+            self.type = self.nil = self.arraytype = ''
+            self.href = self.id = None
+            return
+        values = {}
+        for a in _attrs(elt):
+            values[(a.namespaceURI, a.localName)] = a.value
+        get = values.get
+        self.type = get((SCHEMA.XSI3, 'type')) or get((SCHEMA.XSI1, 'type')) \
+                    or get((SCHEMA.XSI2, 'type')) or ''
+        self.nil = get((SCHEMA.XSI3, 'null')) or get((SCHEMA.XSI1, 'null')) \
+                   or get((SCHEMA.XSI2, 'null')) or get((SCHEMA.XSI3, 'nil')) \
+                   or get((SCHEMA.XSI1, 'nil')) or get((SCHEMA.XSI2, 'nil')) \
+                   or ''
+        self.href = get((EMPTY_NAMESPACE, 'href')) or None
+        self.id = get((EMPTY_NAMESPACE, 'id')) or None
+        self.arraytype = get((SOAP.ENC, 'arrayType')) or ''
+
+_no_attrs = _ElementAttrs()
 
 class DefaultReader:
     """ExpatReaderClass"""
@@ -28,7 +64,9 @@ class ParsedSoap:
         Instance data:
             reader -- the DOM reader
             dom -- the DOM object
-            ns_cache -- dictionary (by id(node)) of namespace dictionaries
+            ns_cache -- dictionary (by id(node)) of shared namespace dictionaries
+            attrs_cache -- dictionary (by id(node)) of (node, attributes),
+                emptied with the DOM
             id_cache -- dictionary (by XML ID attr) of elements
             envelope -- the node holding the SOAP Envelope
             header -- the node holding the SOAP Header (or None)
@@ -68,12 +106,13 @@ class ParsedSoap:
             raise
 
         self.ns_cache = {
-            id(self.dom): {
+            id(self.dom): _NSdict({
                 'xml': XMLNS.XML,
                 'xmlns': XMLNS.BASE,
                 '': ''
-            }
+            })
         }
+        self.attrs_cache = {}
         self.trailers, self.resolver, self.id_cache = trailers, resolver, {}
 
         # Exactly one child element
@@ -193,6 +232,7 @@ class ParsedSoap:
 
     def __del__(self):
         try:
+            self.attrs_cache.clear()
             if not self.keepdom:
                 self.reader.releaseNode(self.dom)
         except:
@@ -255,7 +295,7 @@ class ParsedSoap:
         while _list:
             e = _list.pop()
             if e.nodeType == _Node.ELEMENT_NODE:
-                nodeid = _find_id(e)
+                nodeid = self.GetElementAttrs(e).id
                 if nodeid:
                     self.id_cache[nodeid] = e
                     if nodeid == frag: return e
@@ -287,20 +327,49 @@ class ParsedSoap:
 
     def GetElementNSdict(self, elt):
         '''Get a dictionary of all the namespace attributes for the indicated
-        element.  The dictionaries are cached, and we recurse up the tree
-        as necessary.
+        element.  The dictionaries are cached and shared by all the elements
+        of a namespace scope, a new one is only made by the elements declaring
+        namespaces.  They are read-only, copy them to make changes.
         '''
         d = self.ns_cache.get(id(elt))
-        if not d:
-            if elt != self.dom: d = self.GetElementNSdict(elt.parentNode)
+        if d is not None:
+            return d
+
+        # walk up to the closest element seen before, then down again
+        scope = []
+        while d is None:
+            scope.append(elt)
+            elt = elt.parentNode
+            d = self.ns_cache.get(id(elt))
+        while scope:
+            elt = scope.pop()
+            declared = None
             for a in _attrs(elt):
                 if a.namespaceURI == XMLNS.BASE:
+                    if declared is None:
+                        declared = dict(d)
                     if a.localName == "xmlns":
-                        d[''] = a.nodeValue
+                        declared[''] = a.nodeValue
                     else:
-                        d[a.localName] = a.nodeValue
+                        declared[a.localName] = a.nodeValue
+            if declared is not None:
+                d = _NSdict(declared)
             self.ns_cache[id(elt)] = d
-        return d.copy()
+        return d
+
+    def GetElementAttrs(self, elt):
+        '''Get the xsi:type, xsi:nil, href, id and SOAP-ENC:arrayType values
+        of the indicated element. They are read the first time and cached,
+        elements without attributes all share the same empty values.  The
+        cache keeps the elements, so an id can't be reused by an element of
+        another document while it's cached.
+        '''
+        if not elt.hasAttributes():
+            return _no_attrs
+        entry = self.attrs_cache.get(id(elt))
+        if entry is None or entry[0] is not elt:
+            entry = self.attrs_cache[id(elt)] = (elt, _ElementAttrs(elt))
+        return entry[1]
 
     def GetDomAndReader(self):
         '''Returns a tuple containing the dom and reader objects. (dom, reader)
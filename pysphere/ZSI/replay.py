@@ -0,0 +1,240 @@
+#! /usr/bin/env python
+# $Header$
+'''Record and replay HTTP transports.
+
+The recording transports are regular HTTP(S) connections which also store
+every request body and the raw reply in a Recording. The replay transport
+doesn't open any socket, it answers each request with the recorded reply of
+the same request body (or else, of the same SOAP operation) in the order they
+were recorded. Both are given to a Binding through transport/transdict:
+
+    recording = Recording()
+    Binding(url=url, transport=RecordingHTTPSConnection,
+            transdict={'recording':recording})
+    ...
+    recording.save('session.json')
+
+    Binding(url=url, transport=ReplayHTTPConnection,
+            transdict={'recording':Recording.load('session.json')})
+'''
+
+import base64, httplib, re, threading
+from cStringIO import StringIO
+
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+from pysphere.ZSI import ZSIException
+
+
+class ReplayError(ZSIException):
+    '''The recording has no reply for a request.
+    '''
+
+
+_PASSWORD_RE = re.compile(r'(<((?:[\w.-]+:)?password)\b[^>]*>)[^<]*(</\2>)')
+_OPERATION_RE = re.compile(r'<(?:[\w.-]+:)?Body\b[^>]*>\s*<(?:[\w.-]+:)?([\w.-]+)')
+
+def _operation(body):
+    match = _OPERATION_RE.search(body)
+    return match and match.group(1) or None
+
+
+class Recording:
+    '''A list of HTTP exchanges, each one a dict with the request body and
+    the status, reason, headers and raw (possibly compressed) body of the
+    reply. Unless redact is False, the password elements of the requests
+    are not recorded (those requests are then replayed by operation).
+    '''
+
+    def __init__(self, exchanges=None, redact=True):
+        self.exchanges = exchanges or []
+        self.redact = redact
+        self._lock = threading.Lock()
+        self.rewind()
+
+    def add(self, request, status, reason, headers, body):
+        if self.redact:
+            request = _PASSWORD_RE.sub(r'\1***\3', request)
+        self._lock.acquire()
+        try:
+            self.exchanges.append({'request':request, 'status':status,
+                                   'reason':reason, 'headers':headers,
+                                   'body':body})
+        finally:
+            self._lock.release()
+
+    def rewind(self):
+        '''Makes every recorded reply available again for replay.
+        '''
+        self._lock.acquire()
+        try:
+            self._pending = range(len(self.exchanges))
+        finally:
+            self._lock.release()
+
+    def next_reply(self, request):
+        '''Returns the first unused exchange recorded for the same request
+        body, or else for the same SOAP operation.
+        '''
+        operation = _operation(request)
+        self._lock.acquire()
+        try:
+            found = None
+            for i in self._pending:
+                exchange = self.exchanges[i]
+                if exchange['request'] == request:
+                    found = i
+                    break
+                if found is None and operation and \
+                    _operation(exchange['request']) == operation:
+                    found = i
+            if found is None:
+                raise ReplayError('No recorded reply for %s request'
+                                  % (operation or 'an unknown'))
+            self._pending.remove(found)
+            return self.exchanges[found]
+        finally:
+            self._lock.release()
+
+    def save(self, path):
+        exchanges = []
+        for exchange in self.exchanges:
+            exchange = dict(exchange)
+            try:
+                exchange['body'].decode('utf-8')
+            except UnicodeDecodeError:
+                exchange['body'] = base64.b64encode(exchange['body'])
+                exchange['base64'] = True
+            exchanges.append(exchange)
+        f = open(path, 'w')
+        try:
+            json.dump(exchanges, f, indent=1)
+        finally:
+            f.close()
+
+    def load(cls, path):
+        f = open(path)
+        try:
+            exchanges = json.load(f)
+        finally:
+            f.close()
+        for exchange in exchanges:
+            for key in ('request', 'reason', 'body'):
+                exchange[key] = exchange[key].encode('utf-8')
+            if exchange.pop('base64', False):
+                exchange['body'] = base64.b64decode(exchange['body'])
+            exchange['headers'] = [(str(k), str(v))
+                                   for k, v in exchange['headers']]
+        return cls(exchanges)
+    load = classmethod(load)
+
+
+class _FakeSocket:
+    def __init__(self, data):
+        self._data = data
+
+    def makefile(self, *args, **kw):
+        return StringIO(self._data)
+
+    def close(self):
+        pass
+
+
+def _make_response(exchange, method):
+    '''Builds an httplib.HTTPResponse reading a recorded reply.
+    '''
+    lines = ['HTTP/1.1 %d %s' % (exchange['status'], exchange['reason'])]
+    for header, value in exchange['headers']:
+        if header.lower() not in ('content-length', 'transfer-encoding',
+                                  'connection'):
+            lines.append('%s: %s' % (header, value))
+    lines.append('Content-Length: %d' % len(exchange['body']))
+    lines.append('Connection: close')
+    data = '\r\n'.join(lines) + '\r\n\r\n' + exchange['body']
+    response = httplib.HTTPResponse(_FakeSocket(data), method=method)
+    response.begin()
+    return response
+
+
+class _RecordingMixin:
+    '''Keeps the request body and records it along with the reply.
+    '''
+
+    def send(self, data):
+        self._request_body = getattr(self, '_request_body', '') + data
+        self._base.send(self, data)
+
+    def putrequest(self, method, url, *args, **kw):
+        self._method = method
+        self._base.putrequest(self, method, url, *args, **kw)
+
+    def endheaders(self, *args):
+        # httplib sends the headers through send() as well
+        self._base.endheaders(self, *args)
+        self._request_body = ''
+
+    def getresponse(self, *args, **kw):
+        response = self._base.getresponse(self, *args, **kw)
+        exchange = {'request':self._request_body, 'status':response.status,
+                    'reason':response.reason, 'headers':response.getheaders(),
+                    'body':response.read()}
+        self.recording.add(**exchange)
+        return _make_response(exchange, self._method)
+
+
+class RecordingHTTPConnection(_RecordingMixin, httplib.HTTPConnection):
+    '''HTTPConnection storing the exchanges in transdict['recording'].
+    '''
+    _base = httplib.HTTPConnection
+
+    def __init__(self, host, port=None, recording=None, **kw):
+        httplib.HTTPConnection.__init__(self, host, port, **kw)
+        self.recording = recording
+
+
+class RecordingHTTPSConnection(_RecordingMixin, httplib.HTTPSConnection):
+    '''HTTPSConnection storing the exchanges in transdict['recording'].
+    '''
+    _base = httplib.HTTPSConnection
+
+    def __init__(self, host, port=None, recording=None, **kw):
+        httplib.HTTPSConnection.__init__(self, host, port, **kw)
+        self.recording = recording
+
+
+class ReplayHTTPConnection(httplib.HTTPConnection):
+    '''Connection answering the requests with the replies recorded in
+    transdict['recording'], no network access is made.
+    '''
+
+    def __init__(self, host, port=None, recording=None, **kw):
+        httplib.HTTPConnection.__init__(self, host, port)
+        self.recording = recording
+        self._method = None
+        self._request_body = ''
+
+    def connect(self):
+        pass
+
+    def putrequest(self, method, url, *args, **kw):
+        self._method = method
+        self._request_body = ''
+
+    def putheader(self, header, *values):
+        pass
+
+    def endheaders(self, *args):
+        pass
+
+    def send(self, data):
+        self._request_body += data
+
+    def getresponse(self, *args, **kw):
+        exchange = self.recording.next_reply(self._request_body)
+        return _make_response(exchange, self._method)
+
+    def close(self):
+        pass
@@ -3,7 +3,7 @@
 """XML Schema support
 """
 
-from pysphere.ZSI import _find_type, _get_element_nsuri_name, EvaluateException
+from pysphere.ZSI import _get_element_nsuri_name, EvaluateException
 from pysphere.ZSI.wstools.Utility import SplitQName
 
 
@@ -255,37 +255,52 @@ class TypeDefinition:
     """
     __metaclass__ = SchemaInstanceType
 
+    # (type, xsi:type, element name) -> substitute typecode
+    _substitutes = {}
+
     def getSubstituteType(self, elt, ps):
         """if xsi:type does not match the instance type attr,
         check to see if it is a derived type substitution.
 
         DONT Return the element's type.
 
+        The substitute typecodes are cached, the registry lookups and the
+        derivation check are only done the first time a pair of types is
+        seen for an element name.
+
         Parameters:
             elt -- the DOM element being parsed
             ps -- the ParsedSoap object.
         """
+        prefix,typeName = SplitQName(ps.GetElementAttrs(elt).type)
+        uri = ps.GetElementNSdict(elt).get(prefix)
+        key = (self.type, (uri, typeName), (self.nspname, self.pname))
+        typecode = TypeDefinition._substitutes.get(key)
+        if typecode is not None:
+            return typecode
+
         pyclass = SchemaInstanceType.getTypeDefinition(*self.type)
         if pyclass is None:
             raise EvaluateException(
                     'No Type registed for xsi:type=(%s, %s)' %
                     (self.type[0], self.type[1]), ps.Backtrace(elt))
 
-        typeName = _find_type(elt)
-        prefix,typeName = SplitQName(typeName)
-        uri = ps.GetElementNSdict(elt).get(prefix)
         subclass = SchemaInstanceType.getTypeDefinition(uri, typeName)
         if subclass is None:
             raise EvaluateException(
                     'No registered xsi:type=(%s, %s), substitute for xsi:type=(%s, %s)' %
                     (uri, typeName, self.type[0], self.type[1]), ps.Backtrace(elt))
 
-        if not issubclass(subclass, pyclass) and subclass(None) and not issubclass(subclass, pyclass):
+        # generated typecodes of derived types insert their base in
+        # __bases__ when first instantiated
+        if not issubclass(subclass, pyclass) and subclass(None) and \
+           not issubclass(subclass, pyclass):
             raise TypeError(
                     'Substitute Type (%s, %s) is not derived from %s' %
-                    (self.type[0], self.type[1], pyclass), ps.Backtrace(elt))
+                    (uri, typeName, pyclass), ps.Backtrace(elt))
 
-        return subclass((self.nspname, self.pname))
+        typecode = subclass((self.nspname, self.pname))
+        return TypeDefinition._substitutes.setdefault(key, typecode)
 
 
 
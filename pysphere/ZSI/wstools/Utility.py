@@ -1108,6 +1108,256 @@ class ElementProxy(Base, MessageInterface):
         return not self.node
 
 
+def _utf8(s):
+    if isinstance(s, unicode):
+        return s.encode('utf-8')
+    return s
+
+
+class _StreamNode(object):
+    '''Lightweight node of the tree built by StreamElementProxy, it has the
+    few DOM attributes used by the serializers and Backtrace.
+    '''
+    __slots__ = ('nodeType', 'nodeName', 'namespaceURI', 'localName',
+                 'parentNode', 'childNodes', 'attributes', 'data')
+
+    def __init__(self, nodeType, nodeName=None, namespaceURI=None,
+                 localName=None, data=None):
+        self.nodeType = nodeType
+        self.nodeName = nodeName
+        self.namespaceURI = namespaceURI
+        self.localName = localName
+        self.parentNode = None
+        self.childNodes = []
+        #qualified name -> [namespaceURI, localName, value], like the
+        #attributes of a minidom element they are looked up in dict order
+        self.attributes = {}
+        self.data = data
+
+    def findAttribute(self, namespaceURI, localName):
+        for attr in self.attributes.itervalues():
+            if attr[0] == namespaceURI and attr[1] == localName:
+                return attr
+        return None
+
+    def appendChild(self, node):
+        node.parentNode = self
+        self.childNodes.append(node)
+        return node
+
+    def setAttributeNode(self, attr):
+        self.attributes[_utf8(attr.name)] = [attr.namespaceURI,
+                                             attr.localName, attr.value]
+
+    def importNode(self, node, deep=0):
+        '''Returns a copy of the DOM node as a _StreamNode, so DOM content
+        (TC.XML) can be appended to the tree.  Comments are dropped like
+        Canonicalize does by default.
+        '''
+        if node.nodeType in (Node.TEXT_NODE, Node.CDATA_SECTION_NODE):
+            return _StreamNode(Node.TEXT_NODE, '#text', data=node.data)
+        if node.nodeType != Node.ELEMENT_NODE:
+            raise DOMException('Illegal node type for importNode')
+        clone = _StreamNode(Node.ELEMENT_NODE, _utf8(node.nodeName),
+                            node.namespaceURI, node.localName)
+        for attr in node.attributes.values():
+            clone.setAttributeNode(attr)
+        if deep:
+            for child in node.childNodes:
+                if child.nodeType != Node.COMMENT_NODE:
+                    clone.appendChild(self.importNode(child, deep))
+        return clone
+
+
+class StreamElementProxy(ElementProxy):
+    '''ElementProxy that keeps a lightweight tree instead of a minidom
+    document and writes it straight into a buffer, with the same output
+    Canonicalize gives for the equivalent DOM (inclusive c14n: sorted
+    attributes, namespace declarations rendered once).  Meant to be used
+    as the writerclass of a Binding when serialization time matters, it
+    only implements the part of ElementProxy used to serialize messages.
+    '''
+    logger = logging.getLogger('%s-StreamElementProxy' %__name__)
+
+    def __init__(self, sw, message=None):
+        '''Initialize.
+           sw -- SoapWriter
+           message -- _StreamNode this proxy is bound to
+        '''
+        self._indx = 0
+        MessageInterface.__init__(self, sw)
+        self.node = message
+
+    #############################################
+    # Tree primitives overriding the DOM ones
+    #############################################
+    def _getOwnerDocument(self):
+        node = self.node
+        while node.parentNode is not None:
+            node = node.parentNode
+        return node
+
+    def _getUniquePrefix(self):
+        while 1:
+            self._indx += 1
+            prefix = 'ns%d' %self._indx
+            if self._lookupNamespaceURI(self.node, prefix) is None:
+                break
+        return prefix
+
+    def _lookupNamespaceURI(self, node, prefix):
+        '''Returns the namespace declared for prefix in node or its
+        ancestors, None if there isn't any.
+        '''
+        while node is not None and node.nodeType == Node.ELEMENT_NODE:
+            attr = node.findAttribute(XMLNS.BASE, prefix)
+            if attr is not None:
+                return attr[2]
+            node = node.parentNode
+        return None
+
+    def _getPrefix(self, node, nsuri):
+        if node.nodeType == Node.ELEMENT_NODE:
+            default = self._lookupNamespaceURI(node, 'xmlns')
+            if default is not None and nsuri == default:
+                return None
+        if nsuri == XMLNS.XML:
+            return self._xml_prefix
+        while node is not None and node.nodeType == Node.ELEMENT_NODE:
+            for attr in node.attributes.itervalues():
+                if attr[0] == XMLNS.BASE and attr[2] == nsuri:
+                    return attr[1]
+            node = node.parentNode
+        raise NamespaceError('namespaceURI "%s" is not defined' % nsuri)
+
+    def _appendChild(self, node):
+        if node is None:
+            raise TypeError('node is None')
+        node.parentNode = self.node
+        self.node.childNodes.append(node)
+
+    def _setAttributeNS(self, namespaceURI, qualifiedName, value):
+        localName = qualifiedName.split(':')[-1]
+        attr = self.node.findAttribute(namespaceURI, localName)
+        if attr is None:
+            self.node.attributes[qualifiedName] = [namespaceURI, localName,
+                                                   value]
+        else:
+            attr[2] = value
+
+    def createDocument(self, namespaceURI, localName, doctype=None):
+        '''If specified must be a SOAP envelope, else may contruct an empty document.
+        '''
+        prefix = self._soap_env_prefix
+
+        if namespaceURI == self.reserved_ns[prefix]:
+            qualifiedName = '%s:%s' %(prefix,localName)
+        elif namespaceURI is localName is None:
+            self.node = _StreamNode(Node.DOCUMENT_NODE, '#document')
+            return
+        else:
+            raise KeyError('only support creation of document in %s' %self.reserved_ns[prefix])
+
+        document = _StreamNode(Node.DOCUMENT_NODE, '#document')
+        self.node = _StreamNode(Node.ELEMENT_NODE, qualifiedName,
+                                namespaceURI, localName)
+        self.node.parentNode = document
+        document.childNodes.append(self.node)
+
+        #set up reserved namespace attributes
+        for prefix,nsuri in self.reserved_ns.iteritems():
+            self._setAttributeNS(namespaceURI=self._xmlns_nsuri,
+                qualifiedName='%s:%s' %(self._xmlns_prefix,prefix),
+                value=nsuri)
+
+    def createElementNS(self, namespace, qname):
+        return StreamElementProxy(self.sw,
+                                  _StreamNode(Node.ELEMENT_NODE, qname,
+                                              namespace, qname.split(':')[-1]))
+
+    def createTextNode(self, pyobj):
+        return StreamElementProxy(self.sw,
+                                  _StreamNode(Node.TEXT_NODE, '#text',
+                                              data=pyobj))
+
+    def findNamespaceURI(self, qualifiedName):
+        return self.resolvePrefix(SplitQName(qualifiedName)[0])
+
+    def resolvePrefix(self, prefix):
+        namespaceURI = self._lookupNamespaceURI(self.node, prefix)
+        if namespaceURI is None:
+            raise DOMException('Value for prefix %s not found.' % prefix)
+        return namespaceURI
+
+    def getDocument(self):
+        '''Returns the document node of the tree, its importNode copies
+        DOM nodes into _StreamNodes.
+        '''
+        return self._getOwnerDocument()
+
+    #############################################
+    # Output
+    #############################################
+    def canonicalize(self):
+        out = []
+        node = self.node
+        if node.nodeType == Node.DOCUMENT_NODE:
+            for child in node.childNodes:
+                self._write(child, out.append, {'xml':''})
+        else:
+            self._write(node, out.append, {'xml':''})
+        return ''.join(out)
+
+    def _write(self, node, write, rendered):
+        if node.nodeType == Node.TEXT_NODE:
+            s = node.data
+            if isinstance(s, unicode):
+                s = s.encode('utf-8')
+            if s:
+                write(s.replace("&", "&amp;").replace("<", "&lt;"
+                       ).replace(">", "&gt;").replace("\015", "&#xD;"))
+            return
+
+        write('<')
+        write(node.nodeName)
+        namespaces = []
+        attrs = []
+        for qname, attr in node.attributes.iteritems():
+            if attr[0] == XMLNS.BASE:
+                value = attr[2]
+                if qname == 'xmlns' and value in (XMLNS.BASE, '') \
+                and rendered.get('xmlns') in (XMLNS.BASE, '', None):
+                    continue
+                if qname == 'xmlns:xml' and value == XMLNS.XML:
+                    continue
+                if qname not in rendered or rendered[qname] != value:
+                    namespaces.append((qname != 'xmlns', qname, value))
+            else:
+                attrs.append((attr[0], attr[1], qname, attr[2]))
+        if namespaces:
+            namespaces.sort()
+            rendered = rendered.copy()
+            for _, qname, value in namespaces:
+                self._write_attr(write, qname, value)
+                rendered[qname] = value
+        if attrs:
+            attrs.sort()
+            for _, _, qname, value in attrs:
+                self._write_attr(write, qname, value)
+        write('>')
+        for child in node.childNodes:
+            self._write(child, write, rendered)
+        write('</%s>' % node.nodeName)
+
+    def _write_attr(self, write, name, value):
+        if isinstance(value, unicode):
+            value = value.encode('utf-8')
+        #same escaping as c14n
+        write(' %s="%s"' %(name, value.replace("&", "&amp;"
+               ).replace("<", "&lt;").replace('"', '&quot;'
+               ).replace('\011', '&#x9;').replace('\012', '&#xA;'
+               ).replace('\015', '&#xD;')))
+
 
 class Collection(UserDict):
     """Helper class for maintaining ordered named collections."""
@@ -281,9 +281,9 @@ class _implementation:
         s = value.replace("&", "&amp;")
         s = s.replace("<", "&lt;")
         s = s.replace('"', '&quot;')
-        s = s.replace('\011', '&#x9')
-        s = s.replace('\012', '&#xA')
-        s = s.replace('\015', '&#xD')
+        s = s.replace('\011', '&#x9;')
+        s = s.replace('\012', '&#xA;')
+        s = s.replace('\015', '&#xD;')
         W(s)
         W('"')
 
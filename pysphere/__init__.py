@@ -164,7 +164,8 @@
 #
 #--
 __all__ = ['VIServer', 'VIException', 'VIApiException', 'VITaskException', 'VITask',
-           'FaultTypes', 'VIMor', 'MORTypes', 'VMPowerState', 'ToolsStatus', 'VIProperty']
+           'FaultTypes', 'VIMor', 'MORTypes', 'VMPowerState', 'ToolsStatus', 'VIProperty',
+           'AsyncVIServer', 'VISessionPool']
 
 from pysphere.resources.vi_exception import VIException, VIApiException, \
                                             VITaskException, FaultTypes
@@ -173,4 +174,6 @@ from pysphere.vi_property import VIProperty
 from pysphere.vi_mor import VIMor, MORTypes
 from pysphere.vi_server import VIServer
 from pysphere.vi_virtual_machine import VMPowerState, ToolsStatus
+from pysphere.vi_async_server import AsyncVIServer
+from pysphere.vi_session_pool import VISessionPool
 #from version import version as __version__
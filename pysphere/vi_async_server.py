@@ -0,0 +1,217 @@
+#--
+# Copyright (c) 2012, Sebastian Tello
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions and the following disclaimer in the documentation
+#     and/or other materials provided with the distribution.
+#   * Neither the name of copyright holders nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#--
+
+import time
+
+from pysphere.resources import VimService_services as VI
+from pysphere.resources.vi_exception import VIException, VIApiException, \
+                                            VITaskException, FaultTypes
+from pysphere.ZSI.async_client import AsyncBinding, AsyncResult, gather
+from pysphere.vi_mor import MORTypes
+from pysphere.vi_property import VIProperty
+from pysphere.vi_task import VITask
+
+#SOAPAction header sent by the VimBindingSOAP methods
+SOAP_ACTION = "urn:vim25/5.1"
+
+class AsyncVIServer(object):
+
+    def __init__(self, server, max_per_host=8, loop=None):
+        """Non-blocking front-end that shares the session of a connected
+        VIServer. Requests are serialized and parsed by the same ZSI machinery
+        but sent over non-blocking sockets, so many of them can be in flight
+        from a single thread. Methods return AsyncResult objects, call their
+        result() method (or run()) to drive the event loop.
+          * server: a connected VIServer instance
+          * max_per_host: maximum number of requests in flight to the server,
+            the rest are queued.
+          * loop: (optional) an EventLoop shared with other AsyncVIServer
+            instances (e.g. connected to other servers). A new one is created
+            if not provided.
+        """
+        if not server.is_connected():
+            raise VIException("Must call 'connect' before invoking this method",
+                              FaultTypes.NOT_CONNECTED)
+        self._server = server
+        self._binding = AsyncBinding(server._proxy.binding, loop, max_per_host)
+        self.loop = self._binding.loop
+
+    def run(self, timeout=None):
+        """Runs the event loop until all the pending requests are done"""
+        self.loop.run(timeout)
+
+    def gather(self, results):
+        """Returns an AsyncResult with the list of values of @results"""
+        return gather(self.loop, results)
+
+    def retrieve_properties_traversal(self, property_names=[],
+                                      from_node=None, obj_type='ManagedEntity'):
+        """Asynchronous version of VIServer._retrieve_properties_traversal.
+        The AsyncResult value is the list of objectContent data objects."""
+        request, request_call = self._server._traversal_properties_request(
+                                            property_names, from_node, obj_type)
+        soapfilter = self._server._splice_traversal_specs
+        if not isinstance(request, VI.RetrievePropertiesExRequestMsg):
+            return self._invoke(request, soapfilter=soapfilter)
+
+        ret = AsyncResult(self.loop)
+        objects = []
+        def collect(result):
+            try:
+                retval = result.result()
+                if not retval:
+                    ret.set_result(objects or None)
+                    return
+                objects.extend(retval.Objects)
+                if not hasattr(retval, "Token"):
+                    ret.set_result(objects)
+                    return
+                request = VI.ContinueRetrievePropertiesExRequestMsg()
+                _this = request.new__this(
+                              self._server._do_service_content.PropertyCollector)
+                _this.set_attribute_type(MORTypes.PropertyCollector)
+                request.set_element__this(_this)
+                request.set_element_token(retval.Token)
+                self._invoke(request).add_callback(collect)
+            except Exception:
+                ret.set_exception()
+
+        self._invoke(request, soapfilter=soapfilter).add_callback(collect)
+        return ret
+
+    def wait_for_task(self, task, states=None, check_interval=2, timeout=-1):
+        """Asynchronous version of VITask.wait_for_state. @task might be a
+        VITask instance or a task MOR, if @states is not provided waits for the
+        task to either succeed or fail. The AsyncResult value is the state
+        reached, or a VIException with the TIME_OUT fault if @timeout
+        (in seconds) is reached."""
+        if isinstance(task, VITask):
+            task = task._mor
+        if states is None:
+            states = [VITask.STATE_SUCCESS, VITask.STATE_ERROR]
+        return self._wait_for_task_info(task, states, check_interval,
+                                        timeout).then(lambda info: info.state)
+
+    #-------------------#
+    #-- POWER METHODS --#
+    #-------------------#
+    def power_on(self, vm, sync_run=True, host=None):
+        """Asynchronous version of VIVirtualMachine.power_on. @vm might be a
+        VIVirtualMachine instance or a VM MOR. If @sync_run is True (default)
+        the AsyncResult completes when the task finishes (failing with a
+        VITaskException if it didn't succeed), otherwise its value is a VITask
+        instance as soon as the task is started."""
+        request = VI.PowerOnVM_TaskRequestMsg()
+        self._set_this(request, vm)
+        if host:
+            mor_host = request.new_host(host)
+            mor_host.set_attribute_type(host.get_attribute_type())
+            request.set_element_host(mor_host)
+        return self._run_task(request, sync_run)
+
+    def power_off(self, vm, sync_run=True):
+        """Asynchronous version of VIVirtualMachine.power_off, see power_on"""
+        request = VI.PowerOffVM_TaskRequestMsg()
+        self._set_this(request, vm)
+        return self._run_task(request, sync_run)
+
+    def reset(self, vm, sync_run=True):
+        """Asynchronous version of VIVirtualMachine.reset, see power_on"""
+        request = VI.ResetVM_TaskRequestMsg()
+        self._set_this(request, vm)
+        return self._run_task(request, sync_run)
+
+    def suspend(self, vm, sync_run=True):
+        """Asynchronous version of VIVirtualMachine.suspend, see power_on"""
+        request = VI.SuspendVM_TaskRequestMsg()
+        self._set_this(request, vm)
+        return self._run_task(request, sync_run)
+
+    #-------------------#
+    #-- PRIVATE METHODS #
+    #-------------------#
+    def _invoke(self, request, **kw):
+        """Sends @request, the AsyncResult value is the _returnval of the
+        response. Faults are raised as VIApiException"""
+        op_name = request.typecode.pname
+        response = getattr(VI, op_name + "ResponseMsg")
+        reply = self._binding.Call(request, response, soapaction=SOAP_ACTION,
+                                   **kw)
+        return reply.then(lambda r: getattr(r, "_returnval", None),
+                          _raise_api_exception)
+
+    def _set_this(self, request, vm):
+        mor = getattr(vm, "_mor", vm)
+        _this = request.new__this(mor)
+        _this.set_attribute_type(mor.get_attribute_type())
+        request.set_element__this(_this)
+
+    def _run_task(self, request, sync_run):
+        def started(task):
+            if not sync_run:
+                return VITask(task, self._server)
+            return self._wait_for_task_info(task,
+                                    [VITask.STATE_SUCCESS, VITask.STATE_ERROR],
+                                    2, -1).then(finished)
+        def finished(info):
+            if info.state == VITask.STATE_ERROR:
+                raise VITaskException(info.error)
+        return self._invoke(request).then(started)
+
+    def _wait_for_task_info(self, task, states, check_interval, timeout):
+        """Polls the 'info' property of @task every @check_interval seconds,
+        the AsyncResult value is a VIProperty of the TaskInfo once its state
+        is in @states"""
+        ret = AsyncResult(self.loop)
+        request, request_call = self._server._object_properties_request(task,
+                                                                      ['info'])
+        start_time = time.time()
+        def poll():
+            self._invoke(request).add_callback(check)
+        def check(result):
+            try:
+                retval = result.result()
+                objects = getattr(retval, "Objects", retval)
+                info = VIProperty(self._server, objects[0].PropSet[0].Val)
+                if info.state in states:
+                    ret.set_result(info)
+                    return
+                if timeout > 0 and (time.time() - start_time) > timeout:
+                    raise VIException("Timed out waiting for task state.",
+                                      FaultTypes.TIME_OUT)
+                self.loop.call_later(check_interval, poll)
+            except Exception:
+                ret.set_exception()
+        poll()
+        return ret
+
+def _raise_api_exception(exc_info):
+    if isinstance(exc_info[1], VI.ZSI.FaultException):
+        raise VIApiException(exc_info[1])
+    raise exc_info[0], exc_info[1], exc_info[2]
@@ -0,0 +1,368 @@
+#--
+# Copyright (c) 2012, Sebastian Tello
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions and the following disclaimer in the documentation
+#     and/or other materials provided with the distribution.
+#   * Neither the name of copyright holders nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#--
+
+import inspect
+import sys
+import threading
+import time
+
+from pysphere.resources.vi_exception import VIException, VITaskException, \
+                                            FaultTypes
+from pysphere.vi_mor import MORTypes
+from pysphere.vi_property import VIProperty
+from pysphere.vi_task import VITask
+
+class VIBatchItem(object):
+
+    STATE_PENDING   = 'pending'
+    STATE_RUNNING   = 'running'
+    STATE_SUCCESS   = 'success'
+    STATE_ERROR     = 'error'
+    STATE_CANCELLED = 'cancelled'
+
+    def __init__(self, vm, method, args, kwargs):
+        self.vm = vm
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.state = self.STATE_PENDING
+        self.result = None
+        self.exception = None
+        self.task = None
+        self._host = None
+        self._datastores = []
+
+    def done(self):
+        """True if the item finished, failed or was cancelled"""
+        return self.state in (self.STATE_SUCCESS, self.STATE_ERROR,
+                              self.STATE_CANCELLED)
+
+    def __repr__(self):
+        return "<VIBatchItem %s %s>" % (self.method, self.state)
+
+
+class VIBatch(object):
+
+    def __init__(self, server, max_workers=8, max_per_host=None,
+                 max_per_datastore=None, check_interval=2, max_check_errors=5):
+        """Runs VIVirtualMachine operations on many VMs concurrently.
+          * server: the VIServer instance the VMs belong to
+          * max_workers: number of threads issuing the requests
+          * max_per_host: (optional) maximum number of operations running at
+            the same time on VMs of the same host
+          * max_per_datastore: (optional) maximum number of operations running
+            at the same time on VMs stored in the same datastore
+          * check_interval: seconds between checks of the running tasks. The
+            state of all of them is retrieved in a single request.
+          * max_check_errors: number of checks in a row that may fail (e.g.
+            network errors) before the running tasks are failed with the
+            last error.
+        Operations that create a task (they accept a 'sync_run' argument) keep
+        their host and datastore slots until the task finishes, those returning
+        no task with sync_run=False fail with a TASK_ERROR VIException.
+        """
+        self._server = server
+        self._max_workers = max_workers
+        self._max_per_host = max_per_host
+        self._max_per_datastore = max_per_datastore
+        self._check_interval = check_interval
+        self._max_check_errors = max_check_errors
+        self._items = []
+        self._pending = []
+        self._tasks = {}
+        self._host_load = {}
+        self._datastore_load = {}
+        self._cond = threading.Condition()
+        self._started = False
+        self._live_workers = 0
+        self._waiter_alive = False
+        self._cancelled = False
+
+    def add(self, vm, method, *args, **kwargs):
+        """Queues the call of @method on the VIVirtualMachine @vm with the
+        given arguments. @method is either the name of the method (e.g.
+        'power_on') or a callable receiving the vm as its first argument.
+        Returns a VIBatchItem that holds the result or exception once done"""
+        item = VIBatchItem(vm, method, args, kwargs)
+        try:
+            item._host = str(vm.properties.runtime.host._obj)
+        except AttributeError:
+            pass
+        try:
+            item._datastores = [str(ds._obj) for ds in vm.properties.datastore]
+        except AttributeError:
+            pass
+        self._cond.acquire()
+        try:
+            if self._cancelled:
+                raise VIException("Can't add items to a cancelled batch",
+                                  FaultTypes.INVALID_OPERATION)
+            self._items.append(item)
+            self._pending.append(item)
+            if self._started:
+                self._start_threads()
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+        return item
+
+    def start(self):
+        """Starts the worker threads, if they are not running yet"""
+        self._cond.acquire()
+        try:
+            self._started = True
+            self._start_threads()
+        finally:
+            self._cond.release()
+
+    def wait(self, timeout=None):
+        """Waits until every queued item is done and returns the list of
+        VIBatchItem instances in the order they were added. Raises a
+        VIException if @timeout seconds are reached"""
+        self.start()
+        start_time = time.time()
+        self._cond.acquire()
+        try:
+            while [i for i in self._items if not i.done()]:
+                if timeout is not None:
+                    remaining = timeout - (time.time() - start_time)
+                    if remaining <= 0:
+                        raise VIException("Timed out waiting for batch.",
+                                          FaultTypes.TIME_OUT)
+                    self._cond.wait(min(remaining, 1))
+                else:
+                    self._cond.wait(1)
+            return list(self._items)
+        finally:
+            self._cond.release()
+
+    def run(self, timeout=None):
+        """Starts the batch and waits for it (see wait)"""
+        self.start()
+        return self.wait(timeout)
+
+    def cancel(self, cancel_tasks=False):
+        """Cancels the items not started yet. If @cancel_tasks is True also
+        attempts to cancel the tasks that are still running"""
+        self._cond.acquire()
+        try:
+            self._cancelled = True
+            for item in self._pending:
+                item.state = VIBatchItem.STATE_CANCELLED
+            self._pending = []
+            running = [i.task for i in self._tasks.itervalues()]
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+        if cancel_tasks:
+            for task in running:
+                try:
+                    task.cancel()
+                except VIException:
+                    pass
+
+    def get_results(self):
+        """Returns a list of (item, result, exception) tuples"""
+        return [(i, i.result, i.exception) for i in self._items]
+
+    #-------------------#
+    #-- PRIVATE METHODS #
+    #-------------------#
+    def _start_threads(self):
+        """Starts the missing worker threads and the task waiter. Must be
+        called with the condition acquired"""
+        threads = []
+        while self._live_workers < self._max_workers:
+            self._live_workers += 1
+            threads.append(threading.Thread(target=self._worker))
+        if not self._waiter_alive:
+            self._waiter_alive = True
+            threads.append(threading.Thread(target=self._task_waiter))
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+    def _has_capacity(self, item):
+        if self._max_per_host and item._host and \
+            self._host_load.get(item._host, 0) >= self._max_per_host:
+            return False
+        if self._max_per_datastore:
+            for ds in item._datastores:
+                if self._datastore_load.get(ds, 0) >= self._max_per_datastore:
+                    return False
+        return True
+
+    def _acquire_slots(self, item):
+        if item._host:
+            self._host_load[item._host] = self._host_load.get(item._host, 0)+1
+        for ds in item._datastores:
+            self._datastore_load[ds] = self._datastore_load.get(ds, 0) + 1
+
+    def _release_slots(self, item):
+        if item._host:
+            self._host_load[item._host] -= 1
+        for ds in item._datastores:
+            self._datastore_load[ds] -= 1
+
+    def _next_item(self):
+        """Returns the first pending item with free host/datastore slots,
+        waits if there is none but there are pending ones, returns None when
+        nothing is left. Must be called with the condition acquired"""
+        while self._pending:
+            for i, item in enumerate(self._pending):
+                if self._has_capacity(item):
+                    del self._pending[i]
+                    self._acquire_slots(item)
+                    item.state = VIBatchItem.STATE_RUNNING
+                    return item
+            self._cond.wait(1)
+        return None
+
+    def _finish(self, item, result=None, exception=None):
+        self._cond.acquire()
+        try:
+            item.result = result
+            item.exception = exception
+            if exception is None:
+                item.state = VIBatchItem.STATE_SUCCESS
+            else:
+                item.state = VIBatchItem.STATE_ERROR
+            self._release_slots(item)
+            self._cond.notifyAll()
+        finally:
+            self._cond.release()
+
+    def _worker(self):
+        while True:
+            self._cond.acquire()
+            try:
+                item = self._next_item()
+                if item is None:
+                    self._live_workers -= 1
+                    return
+            finally:
+                self._cond.release()
+            try:
+                method = item.method
+                if isinstance(method, basestring):
+                    method = getattr(item.vm, method)
+                    args = item.args
+                else:
+                    args = (item.vm,) + item.args
+                kwargs = dict(item.kwargs)
+                starts_task = _accepts_sync_run(method)
+                if starts_task:
+                    kwargs['sync_run'] = False
+                ret = method(*args, **kwargs)
+                if starts_task and ret is None:
+                    #the task would be lost, the item must not succeed
+                    raise VIException("%s didn't return its task"
+                                      % getattr(method, '__name__', method),
+                                      FaultTypes.TASK_ERROR)
+            except Exception, e:
+                self._finish(item, exception=e)
+                continue
+            if isinstance(ret, VITask):
+                self._cond.acquire()
+                try:
+                    item.task = ret
+                    self._tasks[str(ret._mor)] = item
+                    self._cond.notifyAll()
+                finally:
+                    self._cond.release()
+            else:
+                self._finish(item, result=ret)
+
+    def _task_waiter(self):
+        """Polls the state of all the running tasks at once. Tasks missing
+        from the reply (e.g. already purged by the server) fail with an
+        OBJECT_NOT_FOUND VIException, and all of them fail if the check fails
+        max_check_errors times in a row"""
+        errors = 0
+        while True:
+            self._cond.acquire()
+            try:
+                while not self._tasks:
+                    if not self._pending and not [i for i in self._items
+                                 if i.state == VIBatchItem.STATE_RUNNING]:
+                        self._waiter_alive = False
+                        return
+                    self._cond.wait(1)
+                tasks = dict(self._tasks)
+            finally:
+                self._cond.release()
+
+            try:
+                mors = [item.task._mor for item in tasks.itervalues()]
+                contents = self._server._get_object_properties_bulk(mors,
+                                                     {MORTypes.Task: ['info']})
+            except Exception, e:
+                #transient errors, try again on next check
+                errors += 1
+                if errors >= self._max_check_errors:
+                    for key, item in tasks.iteritems():
+                        self._finish_task(key, item, exception=e)
+                    errors = 0
+                time.sleep(self._check_interval)
+                continue
+            errors = 0
+
+            missing = dict(tasks)
+            for oc in contents or []:
+                item = missing.pop(str(oc.Obj), None)
+                if item is None or not hasattr(oc, "PropSet"):
+                    continue
+                info = VIProperty(self._server, oc.PropSet[0].Val)
+                item.task.info = info
+                if info.state == VITask.STATE_SUCCESS:
+                    self._finish_task(str(oc.Obj), item,
+                                      result=getattr(info, "result", None))
+                elif info.state == VITask.STATE_ERROR:
+                    self._finish_task(str(oc.Obj), item,
+                                      exception=VITaskException(info.error))
+            for key, item in missing.iteritems():
+                self._finish_task(key, item, exception=VIException(
+                                  "Task %s not found" % key,
+                                  FaultTypes.OBJECT_NOT_FOUND))
+            time.sleep(self._check_interval)
+
+    def _finish_task(self, key, item, result=None, exception=None):
+        self._cond.acquire()
+        try:
+            self._tasks.pop(key, None)
+        finally:
+            self._cond.release()
+        self._finish(item, result, exception)
+
+
+def _accepts_sync_run(method):
+    try:
+        return 'sync_run' in inspect.getargspec(method)[0]
+    except TypeError:
+        return False
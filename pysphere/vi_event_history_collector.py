@@ -145,11 +145,7 @@ class VIEventHistoryCollector(VIHistoryCollector):
         'viewable latest page'. If you use 'read_previous_events' all items
         are retrieved from the newest item to the oldest item.
         """
-        request = VI.ResetCollectorRequestMsg()
-        _this = request.new__this(self._mor)
-        _this.set_attribute_type(self._mor.get_attribute_type())
-        request.set_element__this(_this)
-        self._server._proxy.ResetCollector(request)
+        self._call_collector("ResetCollector")
 
     def rewind(self):
         """
@@ -158,11 +154,7 @@ class VIEventHistoryCollector(VIHistoryCollector):
         the newest item. This is the default setting when the collector is
         created.
         """
-        request = VI.RewindCollectorRequestMsg()
-        _this = request.new__this(self._mor)
-        _this.set_attribute_type(self._mor.get_attribute_type())
-        request.set_element__this(_this)
-        self._server._proxy.RewindCollector(request)
+        self._call_collector("RewindCollector")
 
     def __read_events(self, max_count, next_page):
 
@@ -171,20 +163,12 @@ class VIEventHistoryCollector(VIHistoryCollector):
                               FaultTypes.PARAMETER_ERROR)
 
         if next_page:
-            request = VI.ReadNextEventsRequestMsg()
+            operation = "ReadNextEvents"
         else:
-            request = VI.ReadPreviousEventsRequestMsg()
+            operation = "ReadPreviousEvents"
 
-        _this = request.new__this(self._mor)
-        _this.set_attribute_type(self._mor.get_attribute_type())
-        request.set_element__this(_this)
-
-        request.set_element_maxCount(max_count)
         try:
-            if next_page:
-                resp = self._server._proxy.ReadNextEvents(request)._returnval
-            else:
-                resp = self._server._proxy.ReadPreviousEvents(request)._returnval
+            resp = self._call_collector(operation, max_count)._returnval
 
             ret = []
             for event in resp:
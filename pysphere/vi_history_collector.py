@@ -28,6 +28,7 @@
 #--
 
 from pysphere.resources import VimService_services as VI
+from pysphere.ZSI.client import RequestTemplate
 from pysphere import VIException, FaultTypes
 
 class VIHistoryCollector(object):
@@ -54,11 +55,7 @@ class VIHistoryCollector(object):
         if not self._mor:
             raise VIException("History collector is not properly initialized",
                               FaultTypes.PARAMETER_ERROR)
-        request = VI.ResetCollectorRequestMsg()
-        _this = request.new__this(self._mor)
-        _this.set_attribute_type(self._mor.get_attribute_type())
-        request.set_element__this(_this)
-        self._server._proxy.ResetCollector(request)
+        self._call_collector("ResetCollector")
 
     def rewind(self):
         """
@@ -70,9 +67,25 @@ class VIHistoryCollector(object):
         if not self._mor:
             raise VIException("History collector is not properly initialized",
                               FaultTypes.PARAMETER_ERROR)
-        request = VI.RewindCollectorRequestMsg()
-        _this = request.new__this(self._mor)
-        _this.set_attribute_type(self._mor.get_attribute_type())
-        request.set_element__this(_this)
-        self._server._proxy.RewindCollector(request)
+        self._call_collector("RewindCollector")
 
+    def _call_collector(self, operation, max_count=None):
+        """Calls the @operation method (e.g. 'ReadNextEvents') of this
+        collector, with @max_count if given, and returns the response. The
+        request is filled in from a template of the server, serialized once
+        per operation and count."""
+        mor_type = self._mor.get_attribute_type()
+
+        def build():
+            request = getattr(VI, operation + "RequestMsg")()
+            _this = request.new__this(RequestTemplate.placeholder("this"))
+            _this.set_attribute_type(mor_type)
+            request.set_element__this(_this)
+            if max_count is not None:
+                request.set_element_maxCount(max_count)
+            return request
+
+        template = self._server._request_template(
+                           ("collector", operation, mor_type, max_count), build)
+        return getattr(self._server._proxy, operation)(template.request,
+                                        soapdata=template.fill(this=self._mor))
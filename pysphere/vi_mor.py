@@ -30,20 +30,52 @@
 from pysphere.resources.VimService_services_types import ns0
 
 class VIMor(str):
-    """str subclass representing a Managed Object Reference"""
-    
-    def __new__(self, value, mor_type):
-        return str.__new__(self, value)
-    
-    def __init__(self, value, mor_type):
-        self._mor_type = mor_type
-        self.typecode = ns0.ManagedObjectReference_Def(value)
-        
+    """str subclass representing a Managed Object Reference.
+    Instances are immutable and interned by (type, value) to save memory, but
+    the intern table is emptied when it grows too big, so references must be
+    compared with == and get_attribute_type(), not by identity. The MOR type
+    is held by a subclass per type and the typecode is shared, so instances
+    carry no __dict__"""
+
+    __slots__ = ()
+
+    typecode = ns0.ManagedObjectReference_Def(None)
+    _mor_type = None
+
+    #str subclasses can't be weak referenced, so the intern cache holds strong
+    #references and is emptied once it grows past _INTERN_LIMIT entries
+    _INTERN_LIMIT = 100000
+    _interned = {}
+    _subclasses = {}
+
+    def __new__(cls, value, mor_type):
+        key = (mor_type, str(value))
+        mor = VIMor._interned.get(key)
+        if mor is None:
+            mor = str.__new__(VIMor._subclass(mor_type), value)
+            if len(VIMor._interned) >= VIMor._INTERN_LIMIT:
+                VIMor._interned.clear()
+            mor = VIMor._interned.setdefault(key, mor)
+        return mor
+
+    def __reduce__(self):
+        return (VIMor, (str(self), self._mor_type))
+
     def get_attribute_type(self):
         return self._mor_type
-    
+
     def set_attribute_type(self, mor_type):
-        self._mor_type = mor_type
+        raise TypeError("VIMor instances are immutable, use VIMor(str(mor), "
+                        "mor_type)")
+
+    @staticmethod
+    def _subclass(mor_type):
+        cls = VIMor._subclasses.get(mor_type)
+        if cls is None:
+            cls = type('VIMor', (VIMor,), {'__slots__':(),
+                                           '_mor_type':mor_type})
+            cls = VIMor._subclasses.setdefault(mor_type, cls)
+        return cls
     
     @staticmethod
     def is_mor(obj):
@@ -29,11 +29,18 @@
 
 import sys
 import os
+import re
+import threading
+from copy import copy
 from base64 import b64encode, b64decode
 from urlparse import urlparse
 from socket import gethostbyaddr
 
 from pysphere.resources import VimService_services as VI
+from pysphere.ZSI.wstools.Utility import StreamElementProxy
+from pysphere.ZSI.writer import SoapWriter
+from pysphere.ZSI.parallel import ParallelParser
+from pysphere.ZSI.client import RequestTemplate
 
 from pysphere import VIException, VIApiException, VITaskException, FaultTypes
 from pysphere.vi_virtual_machine import VIVirtualMachine
@@ -44,6 +51,36 @@ from pysphere.vi_task_history_collector import VITaskHistoryCollector
 from pysphere.vi_property import VIProperty
 from pysphere.vi_mor import VIMor, MORTypes
 from pysphere.vi_task import VITask
+from pysphere.vi_batch import VIBatch
+from pysphere.vi_vm_index import VIVMIndex
+
+#Traversal specs to reach every managed entity from a container:
+#(name, type, path, names of the specs selected on the objects reached)
+_TRAVERSAL_SPECS = (
+    ('visitFolders', MORTypes.Folder, 'childEntity',
+     ('visitFolders', 'dcToHf', 'dcToVmf', 'crToH', 'crToRp', 'dcToDs',
+      'hToVm', 'dsToVm', 'rpToVm')),
+    ('dcToVmf', MORTypes.Datacenter, 'vmFolder', ('visitFolders',)),
+    ('dcToDs', MORTypes.Datacenter, 'datastore', ('visitFolders',)),
+    ('dcToHf', MORTypes.Datacenter, 'hostFolder', ('visitFolders',)),
+    ('crToH', MORTypes.ComputeResource, 'host', ()),
+    ('crToRp', MORTypes.ComputeResource, 'resourcePool', ('rpToRp', 'rpToVm')),
+    ('rpToRp', MORTypes.ResourcePool, 'resourcePool', ('rpToRp', 'rpToVm')),
+    ('hToVm', MORTypes.HostSystem, 'vm', ('visitFolders',)),
+    ('dsToVm', MORTypes.Datastore, 'vm', ('visitFolders',)),
+    ('rpToVm', MORTypes.ResourcePool, 'vm', ()),
+)
+
+#Managed entities a ContainerView can be created on
+_VIEW_CONTAINER_TYPES = (MORTypes.Folder, MORTypes.Datacenter,
+                         MORTypes.ComputeResource,
+                         MORTypes.ClusterComputeResource, MORTypes.ResourcePool,
+                         MORTypes.VirtualApp, MORTypes.HostSystem)
+
+_TRAVERSAL_SPECS_PLACEHOLDER = "__pysphere_traversal_specs__"
+_TRAVERSAL_SPECS_PLACEHOLDER_RE = re.compile(
+           r'<(\w+:|)selectSet\b[^>]*>\s*<(\w+:|)name\b[^>]*>%s</\2name>\s*'
+           r'</\1selectSet>' % _TRAVERSAL_SPECS_PLACEHOLDER)
 
 class VIServer:
 
@@ -55,10 +92,27 @@ class VIServer:
         self.__session = None
         self.__user = None
         self.__password = None
+        self.__locator_args = None
+        self.__passthrough = False
+        self.__server_url = None
+        self.__login_generation = 0
+        self.__relogin_lock = threading.Lock()
+        self.__keepalive_stop = None
+        self.__traversal_specs = None
+        self.__traversal_specs_xml = None
+        self.__container_views = {}
+        self.__container_views_generation = None
+        self.__container_views_lock = threading.Lock()
+        self.__vm_index = None
+        self.__parallel_parser = None
+        self.__request_templates = {}
+        self.__folders = None
         #By default impersonate the VI Client to be accepted by Virtual Server
         self.__initial_headers = {"User-Agent":"VMware VI Client/5.0.0"}
 
-    def connect(self, host, user=None, password=None, passthrough=False, trace_file=None, sock_timeout=None):
+    def connect(self, host, user=None, password=None, passthrough=False, trace_file=None, sock_timeout=None,
+                stream_writer=False, compression=False, transport=None,
+                transdict=None, instrument=None):
         """Opens a session to a VC/ESX server with the given credentials:
         @host: is the server's hostname or address. If the web service uses
         another protocol or port than the default, you must use the full
@@ -72,6 +126,17 @@ class VIServer:
         @sock_timeout: (optional) only for python >= 2.6, sets the connection
         timeout for sockets, in python 2.5 you'll  have to use
         socket.setdefaulttimeout(secs) to change the global setting.
+        @stream_writer: (optional) if True, requests are serialized straight
+        into a buffer (ZSI StreamElementProxy) instead of building and
+        canonicalizing a DOM, which is much faster for big requests.
+        @compression: (optional) if True, asks the server for gzip or deflate
+        compressed responses, which are decompressed while they're read.
+        @transport: (optional) the httplib.HTTPConnection subclass used to send
+        the requests, e.g. the record/replay transports in ZSI.replay
+        @transdict: (optional) dictionary of extra arguments for @transport
+        @instrument: (optional) given the timings of every SOAP request, e.g.
+        a ZSI.instrument.Histograms to dump per operation latencies as JSON
+        or Prometheus text
         """
         if (((user is None or password is None) and not passthrough)
         or ((user is not None or password is not None) and passthrough)):
@@ -90,96 +155,29 @@ class VIServer:
 
         else:
             server_url = 'https://%s/sdk' % host
+        self.__passthrough = passthrough
+        self.__server_url = server_url
 
         try:
             #get the server's proxy
-            locator = VI.VimServiceLocator()
             args = {'url':server_url}
             if trace_file:
                 trace=open(trace_file, 'w')
                 args['tracefile'] = trace
+            if transport:
+                args['transport'] = transport
+            args['transdict'] = dict(transdict or {})
             if sock_timeout and sys.version_info >= (2, 6):
-                args['transdict'] = {'timeout':sock_timeout}
-
-            self._proxy = locator.getVimPortType(**args)
-
-            for header, value in self.__initial_headers.iteritems():
-                self._proxy.binding.AddHeader(header, value)
-
-            #get service content from service instance
-            request = VI.RetrieveServiceContentRequestMsg()
-            mor_service_instance = request.new__this('ServiceInstance')
-            mor_service_instance.set_attribute_type(MORTypes.ServiceInstance)
-            request.set_element__this(mor_service_instance)
-            self._do_service_content = self._proxy.RetrieveServiceContent(
-                                                             request)._returnval
-            self.__server_type = self._do_service_content.About.Name
-            self.__api_version = self._do_service_content.About.ApiVersion
-            self.__api_type = self._do_service_content.About.ApiType
-
-            if not passthrough:
-                #login with user/password
-                request = VI.LoginRequestMsg()
-                mor_session_manager = request.new__this(
-                                            self._do_service_content.SessionManager)
-                mor_session_manager.set_attribute_type(MORTypes.SessionManager)
-                request.set_element__this(mor_session_manager)
-                request.set_element_userName(user)
-                request.set_element_password(password)
-                self.__session = self._proxy.Login(request)._returnval
-                self.__logged = True
+                args['transdict']['timeout'] = sock_timeout
+            if stream_writer:
+                args['writerclass'] = StreamElementProxy
+            if compression:
+                args['compression'] = True
+            if instrument is not None:
+                args['instrument'] = instrument
 
-            else:
-                fqdn, aliases, addrs = gethostbyaddr(urlparse(server_url).netloc)
-                if os.name == 'nt':
-                    #login with Windows session credentials
-                    try:
-                        from sspi import ClientAuth
-                    except ImportError:
-                        raise ImportError("To enable passthrough authentication please"\
-                            " install pywin32 (available for Windows only)")
-                    spn = "host/%s" % fqdn
-                    client = ClientAuth("Kerberos", targetspn=spn)
-
-                    def get_token(serverToken=None):
-                        if serverToken is not None:
-                            serverToken = b64decode(serverToken)
-                        err, bufs = client.authorize(serverToken)
-                        return b64encode(bufs[0].Buffer)
-                else:
-                    #login with MIT Kerberos credentials
-                    try:
-                        import kerberos
-                    except ImportError:
-                        raise ImportError("To enable passthrough authentication please"\
-                            " install python bindings for kerberos")
-                    spn = "host@%s" % fqdn
-                    flags = kerberos.GSS_C_INTEG_FLAG|kerberos.GSS_C_SEQUENCE_FLAG|\
-                        kerberos.GSS_C_REPLAY_FLAG|kerberos.GSS_C_CONF_FLAG
-                    errc, client = kerberos.authGSSClientInit(spn, gssflags=flags)
-
-                    def get_token(serverToken=''):
-                        cres = kerberos.authGSSClientStep(client, serverToken)
-                        return kerberos.authGSSClientResponse(client)
-
-                token = get_token()
-
-                while not self.__logged:
-                    try:
-                        request = VI.LoginBySSPIRequestMsg()
-                        mor_session_manager = request.new__this(
-                                                    self._do_service_content.SessionManager)
-                        mor_session_manager.set_attribute_type(MORTypes.SessionManager)
-                        request.set_element__this(mor_session_manager)
-                        request.set_element_base64Token(token)
-                        self.__session = self._proxy.LoginBySSPI(request)._returnval
-                        self.__logged = True
-                    except (VI.ZSI.FaultException), e:
-                        if e.fault.string == "fault.SSPIChallenge.summary":
-                            serverToken = e.fault.detail[0].Base64Token
-                            token = get_token(serverToken)
-                        else:
-                            raise e
+            self.__init_proxy(args)
+            self.__login()
 
         except (VI.ZSI.FaultException), e:
             raise VIApiException(e)
@@ -200,13 +198,50 @@ class VIServer:
         except(VI.ZSI.FaultException):
             return False
 
+    def start_keepalive(self, interval=600, relogin=True):
+        """Starts a background thread that calls keep_session_alive every
+        @interval seconds, so the session doesn't expire while idle.
+        @relogin: if True, requests failing with a NotAuthenticated fault
+            (e.g. the session expired anyway or the server was restarted) log
+            in again on the same binding with the credentials given to
+            connect and are replayed once, so the proxy, the service content
+            and the objects bound to this server remain valid.
+        The thread is stopped by stop_keepalive or disconnect."""
+        if not self.__logged:
+            raise VIException("Must call 'connect' before invoking this method",
+                              FaultTypes.NOT_CONNECTED)
+        if relogin and self.__user is None and not self.__passthrough:
+            raise VIException("Can't log in again a cloned session",
+                              FaultTypes.PARAMETER_ERROR)
+        self.stop_keepalive()
+        if relogin:
+            self._proxy = _ReloginProxy(self, self._proxy)
+        self.__keepalive_stop = threading.Event()
+        thread = threading.Thread(target=self.__keepalive,
+                                  args=(interval, self.__keepalive_stop))
+        thread.daemon = True
+        thread.start()
+
+    def stop_keepalive(self):
+        """Stops the thread started by start_keepalive, and the transparent
+        re-login of expired sessions."""
+        if self.__keepalive_stop:
+            self.__keepalive_stop.set()
+            self.__keepalive_stop = None
+        if isinstance(getattr(self, "_proxy", None), _ReloginProxy):
+            self._proxy = self._proxy._proxy
+
     def is_connected(self):
         """True if the user has successfuly logged in. False otherwise"""
         return self.__logged
 
     def disconnect(self):
         """Closes the open session with the VC/ESX Server."""
+        self.stop_keepalive()
         if self.__logged:
+            self.disable_vm_index()
+            self.disable_parallel_parse()
+            self.__destroy_container_views()
             try:
                 self.__logged = False
                 request = VI.LogoutRequestMsg()
@@ -218,6 +253,50 @@ class VIServer:
             except (VI.ZSI.FaultException), e:
                 raise VIApiException(e)
 
+    def enable_vm_index(self, max_age=0):
+        """Makes get_vm_by_name and get_vm_by_path look VMs up in an index of
+        names and paths instead of querying the whole inventory each time. The
+        index is loaded once and kept up to date through a private property
+        collector. VMs with duplicated names are returned in MOR order.
+        Lookups missing the index poll it again (see VIVMIndex), and paths in
+        a known datacenter are also searched with a single FindByDatastorePath.
+        @max_age: lookups first apply the changes reported by the collector if
+            the last poll is older than this number of seconds. 0 polls on
+            every lookup (a single small request), None never polls.
+        """
+        if not self.__logged:
+            raise VIException("Must call 'connect' before invoking this method",
+                              FaultTypes.NOT_CONNECTED)
+        self.disable_vm_index()
+        self.__vm_index = VIVMIndex(self, max_age)
+
+    def disable_vm_index(self):
+        """Stops using the index created by enable_vm_index, and releases it"""
+        if self.__vm_index:
+            self.__vm_index.destroy()
+            self.__vm_index = None
+
+    def enable_parallel_parse(self, processes=None, min_objects=1000,
+                              chunk_size=None):
+        """Parses the objects of big property collector replies (as those of
+        iter_properties or get_registered_vms on large inventories) in a pool
+        of worker processes. The reply is split between its objects before
+        building any DOM, the rest of the reply is parsed as usual.
+        @processes: number of worker processes, the number of CPUs by default
+        @min_objects: replies with fewer objects are parsed as usual
+        @chunk_size: objects parsed by each task, by default the objects are
+            spread in 4 tasks per worker process
+        """
+        self.disable_parallel_parse()
+        self.__parallel_parser = ParallelParser([VI.__name__], processes,
+                                                chunk_size, min_objects)
+
+    def disable_parallel_parse(self):
+        """Stops the worker processes of enable_parallel_parse"""
+        if self.__parallel_parser:
+            self.__parallel_parser.close()
+            self.__parallel_parser = None
+
     def get_file_manager(self):
         """Returns a File Manager entity"""
         return VIFileManager(self, self._do_service_content.FileManager)
@@ -341,6 +420,17 @@ class VIServer:
         if not self.__logged:
             raise VIException("Must call 'connect' before invoking this method",
                             FaultTypes.NOT_CONNECTED)
+        if self.__vm_index:
+            mors = self.__vm_index.find_by_path(path, datacenter)
+            datacenters = self.__vm_index.get_datacenters(datacenter)
+            if not mors and len(datacenters) == 1:
+                #e.g. registered after the last poll with max_age=None
+                mor = self.__find_by_datastore_path(path, datacenters[0])
+                mors = mor and [mor] or []
+            if mors:
+                return VIVirtualMachine(self, mors[0])
+            raise VIException("Could not find a VM with path '%s'" % path,
+                              FaultTypes.OBJECT_NOT_FOUND)
         try:
             dc_list = []
             if datacenter and VIMor.is_mor(datacenter):
@@ -353,28 +443,32 @@ class VIServer:
                     dc_list = list(dc.iterkeys())
 
             for mor_dc in dc_list:
-                request = VI.FindByDatastorePathRequestMsg()
-                mor_search_index = request.new__this(
-                                           self._do_service_content.SearchIndex)
-                mor_search_index.set_attribute_type(MORTypes.SearchIndex)
-                request.set_element__this(mor_search_index)
-                mor_datacenter = request.new_datacenter(mor_dc)
-                mor_datacenter.set_attribute_type(MORTypes.Datacenter)
-                request.set_element_datacenter(mor_datacenter)
-                request.set_element_path(path)
-                try:
-                    vm = self._proxy.FindByDatastorePath(request)._returnval
-                except VI.ZSI.FaultException:
-                    pass
-                else:
-                    if vm:
-                        return VIVirtualMachine(self, vm)
+                vm = self.__find_by_datastore_path(path, mor_dc)
+                if vm:
+                    return VIVirtualMachine(self, vm)
         except (VI.ZSI.FaultException), e:
             raise VIApiException(e)
 
         raise VIException("Could not find a VM with path '%s'" % path,
                           FaultTypes.OBJECT_NOT_FOUND)
 
+    def __find_by_datastore_path(self, path, mor_dc):
+        """Returns the MOR of the VM with vmx file @path in datacenter @mor_dc
+        through the SearchIndex, or None"""
+        request = VI.FindByDatastorePathRequestMsg()
+        mor_search_index = request.new__this(
+                                   self._do_service_content.SearchIndex)
+        mor_search_index.set_attribute_type(MORTypes.SearchIndex)
+        request.set_element__this(mor_search_index)
+        mor_datacenter = request.new_datacenter(mor_dc)
+        mor_datacenter.set_attribute_type(MORTypes.Datacenter)
+        request.set_element_datacenter(mor_datacenter)
+        request.set_element_path(path)
+        try:
+            return self._proxy.FindByDatastorePath(request)._returnval
+        except VI.ZSI.FaultException:
+            return None
+
     def get_vm_by_name(self, name, datacenter=None):
         """
         Returns an instance of VIVirtualMachine. Where its name matches @name.
@@ -387,6 +481,12 @@ class VIServer:
         if not self.__logged:
             raise VIException("Must call 'connect' before invoking this method",
                               FaultTypes.NOT_CONNECTED)
+        if self.__vm_index:
+            mors = self.__vm_index.find_by_name(name, datacenter)
+            if mors:
+                return VIVirtualMachine(self, mors[0])
+            raise VIException("Could not find a VM named '%s'" % name,
+                              FaultTypes.OBJECT_NOT_FOUND)
         try:
             nodes = [None]
             if datacenter and VIMor.is_mor(datacenter):
@@ -473,7 +573,7 @@ class VIServer:
                         if v==datacenter]
 
             for node in nodes:
-                obj_content = self._retrieve_properties_traversal(
+                obj_content = self._retrieve_inventory_properties(
                                             property_names=property_filter,
                                             from_node=node,
                                             obj_type=MORTypes.VirtualMachine)
@@ -513,11 +613,8 @@ class VIServer:
             for not status filter
         """
 
-        folders = self._get_managed_objects(MORTypes.Folder)
-        try:
-            folder_mor = [mor for mor, name in folders.iteritems()
-                          if name == folder_name][0]
-        except IndexError:
+        folder_mor = self._get_folder_by_name(folder_name)
+        if not folder_mor:
             raise VIException("Root folder not found: %s" % folder_name)
 
         properties = ['config.files.vmPathName', 'runtime.powerState']
@@ -555,6 +652,53 @@ class VIServer:
         except (VI.ZSI.FaultException), e:
             raise VIApiException(e)
 
+    def batch(self, max_workers=8, max_per_host=None, max_per_datastore=None,
+              check_interval=2, max_check_errors=5):
+        """Returns a VIBatch executor to run VIVirtualMachine operations on
+        many VMs concurrently. E.g.:
+            batch = server.batch(max_workers=10, max_per_host=4)
+            for vm in vms:
+                batch.add(vm, 'power_on')
+            for item in batch.run():
+                if item.exception: print item.vm, item.exception
+        @max_workers: number of threads issuing the requests
+        @max_per_host: (optional) maximum number of operations running at the
+            same time on VMs of the same host
+        @max_per_datastore: (optional) maximum number of operations running at
+            the same time on VMs stored in the same datastore
+        @check_interval: seconds between checks of the running tasks, the state
+            of all of them is retrieved in a single request.
+        @max_check_errors: number of checks in a row that may fail before the
+            running tasks are failed with the last error.
+        """
+        if not self.__logged:
+            raise VIException("Must call 'connect' before invoking this method",
+                              FaultTypes.NOT_CONNECTED)
+        return VIBatch(self, max_workers, max_per_host, max_per_datastore,
+                       check_interval, max_check_errors)
+
+    def clone_session(self):
+        """Returns a new VIServer instance logged in with a clone of this
+        session, obtained through a clone ticket (see acquire_clone_ticket).
+        The new instance doesn't need the user credentials and has its own
+        session on the server, so it can be used to spread the load of many
+        threads among several sessions."""
+        ticket = self.acquire_clone_ticket()
+        server = VIServer()
+        server.__initial_headers = dict(self.__initial_headers)
+        try:
+            server.__init_proxy(self.__locator_args)
+            request = VI.CloneSessionRequestMsg()
+            _this = request.new__this(server._do_service_content.SessionManager)
+            _this.set_attribute_type(MORTypes.SessionManager)
+            request.set_element__this(_this)
+            request.set_element_cloneTicket(ticket)
+            server.__session = server._proxy.CloneSession(request)._returnval
+            server.__logged = True
+        except (VI.ZSI.FaultException), e:
+            raise VIApiException(e)
+        return server
+
     def register_vm(self, path, name=None, sync_run=True, folder=None,
                     template=False, resourcepool=None, host=None):
         """Adds an existing virtual machine to the folder.
@@ -623,44 +767,57 @@ class VIServer:
             raise VIException("Must call 'connect' before invoking this method",
                               FaultTypes.NOT_CONNECTED)
         try:
-
-            request, request_call = self._retrieve_property_request()
-
-            _this = request.new__this(
-                                     self._do_service_content.PropertyCollector)
-            _this.set_attribute_type(MORTypes.PropertyCollector)
-            request.set_element__this(_this)
-
-            do_PropertyFilterSpec_specSet = request.new_specSet()
-
-            props_set = []
-            do_PropertySpec_propSet =do_PropertyFilterSpec_specSet.new_propSet()
-            do_PropertySpec_propSet.set_element_type(mor.get_attribute_type())
-            if not get_all:
-                do_PropertySpec_propSet.set_element_pathSet(property_names)
-            else:
-                do_PropertySpec_propSet.set_element_all(True)
-            props_set.append(do_PropertySpec_propSet)
-
-            objects_set = []
-            do_ObjectSpec_objSet = do_PropertyFilterSpec_specSet.new_objectSet()
-            obj = do_ObjectSpec_objSet.new_obj(mor)
-            obj.set_attribute_type(mor.get_attribute_type())
-            do_ObjectSpec_objSet.set_element_obj(obj)
-            do_ObjectSpec_objSet.set_element_skip(False)
-            objects_set.append(do_ObjectSpec_objSet)
-
-            do_PropertyFilterSpec_specSet.set_element_propSet(props_set)
-            do_PropertyFilterSpec_specSet.set_element_objectSet(objects_set)
-            request.set_element_specSet([do_PropertyFilterSpec_specSet])
-
-            ret = request_call(request)
+            mor_type = mor.get_attribute_type()
+            template = self._request_template(
+                ('object_properties', mor_type, tuple(property_names),
+                 bool(get_all)),
+                lambda: self._object_properties_request(
+                        VIMor(RequestTemplate.placeholder('obj'), mor_type),
+                        property_names, get_all)[0])
+            ret = self._retrieve_property_call()(template.request,
+                                            soapdata=template.fill(obj=mor))
             if ret and isinstance(ret, list):
                 return ret[0]
 
         except (VI.ZSI.FaultException), e:
             raise VIApiException(e)
 
+    def _object_properties_request(self, mor, property_names=[],
+                                   get_all=False):
+        """Returns the request object and the call request method pointer
+        to retrieve the properties in @property_names (or all if @get_all is
+        True) of the managed object reference @mor."""
+        request, request_call = self._retrieve_property_request()
+
+        _this = request.new__this(self._do_service_content.PropertyCollector)
+        _this.set_attribute_type(MORTypes.PropertyCollector)
+        request.set_element__this(_this)
+
+        do_PropertyFilterSpec_specSet = request.new_specSet()
+
+        props_set = []
+        do_PropertySpec_propSet = do_PropertyFilterSpec_specSet.new_propSet()
+        do_PropertySpec_propSet.set_element_type(mor.get_attribute_type())
+        if not get_all:
+            do_PropertySpec_propSet.set_element_pathSet(property_names)
+        else:
+            do_PropertySpec_propSet.set_element_all(True)
+        props_set.append(do_PropertySpec_propSet)
+
+        objects_set = []
+        do_ObjectSpec_objSet = do_PropertyFilterSpec_specSet.new_objectSet()
+        obj = do_ObjectSpec_objSet.new_obj(mor)
+        obj.set_attribute_type(mor.get_attribute_type())
+        do_ObjectSpec_objSet.set_element_obj(obj)
+        do_ObjectSpec_objSet.set_element_skip(False)
+        objects_set.append(do_ObjectSpec_objSet)
+
+        do_PropertyFilterSpec_specSet.set_element_propSet(props_set)
+        do_PropertyFilterSpec_specSet.set_element_objectSet(objects_set)
+        request.set_element_specSet([do_PropertyFilterSpec_specSet])
+
+        return request, request_call
+
     def _get_object_properties_bulk(self, mor_list, properties):
         """Similar to _get_object_properties but you can retrieve different sets
         of properties for many managed object of different types. @mor_list is a
@@ -728,46 +885,221 @@ class VIServer:
         @from_node (RootFolder by default). Returns the corresponding
         objectContent data object."""
         try:
-            if not from_node:
-                from_node = self._do_service_content.RootFolder
+            request, request_call = self._traversal_properties_request(
+                                            property_names, from_node, obj_type)
+            return request_call(request)
 
-            elif isinstance(from_node, tuple) and len(from_node) == 2:
-                from_node = VIMor(from_node[0], from_node[1])
-            elif not VIMor.is_mor(from_node):
-                raise VIException("from_node must be a MOR object or a "
-                                  "(<str> mor_id, <str> mor_type) tuple",
-                                  FaultTypes.PARAMETER_ERROR)
+        except (VI.ZSI.FaultException), e:
+            raise VIApiException(e)
 
-            request, request_call = self._retrieve_property_request()
+    def iter_properties(self, obj_type='ManagedEntity', property_names=[],
+                        from_node=None, page_size=1000, decode=False):
+        """Generator version of _retrieve_properties_traversal. Retrieves the
+        properties in @property_names of the managed objects of type @obj_type
+        found from @from_node (RootFolder by default), @page_size objects at a
+        time, and yields them one by one as objectContent data objects, or as
+        (mor, {property_name: value}) tuples if @decode is True.
+        If the generator is closed before reaching the last page, the rest of
+        the result set is discarded on the server. Servers with API versions
+        prior to 4.1 can't page results, so all the objects are retrieved in
+        a single call."""
+        if not self.__logged:
+            raise VIException("Must call 'connect' before invoking this method",
+                              FaultTypes.NOT_CONNECTED)
 
+        def get_page(retval):
+            if not retval:
+                return [], None
+            return retval.Objects, getattr(retval, "Token", None)
 
-            _this = request.new__this(
+        token = None
+        try:
+            try:
+                request, request_call = self._traversal_properties_request(
+                                            property_names, from_node, obj_type)
+                if self.__api_version >= "4.1":
+                    options = request.new_options()
+                    options.set_element_maxObjects(page_size)
+                    request.set_element_options(options)
+                    retval = self._proxy.RetrievePropertiesEx(request,
+                               soapfilter=self._splice_traversal_specs,
+                               **self.__parallel_parse_kw())._returnval
+                    content, token = get_page(retval)
+                else:
+                    content = request_call(request) or []
+
+                while True:
+                    for o in content:
+                        if decode:
+                            yield o.Obj, dict([(p.Name, p.Val) for p in
+                                               getattr(o, "PropSet", [])])
+                        else:
+                            yield o
+                    if token is None:
+                        break
+                    request = VI.ContinueRetrievePropertiesExRequestMsg()
+                    _this = request.new__this(
                                      self._do_service_content.PropertyCollector)
-            _this.set_attribute_type(MORTypes.PropertyCollector)
+                    _this.set_attribute_type(MORTypes.PropertyCollector)
+                    request.set_element__this(_this)
+                    request.set_element_token(token)
+                    retval = self._proxy.ContinueRetrievePropertiesEx(
+                                request, **self.__parallel_parse_kw())._returnval
+                    content, token = get_page(retval)
 
-            request.set_element__this(_this)
-            do_PropertyFilterSpec_specSet = request.new_specSet()
+            except (VI.ZSI.FaultException), e:
+                raise VIApiException(e)
+        finally:
+            if token is not None:
+                self.__cancel_retrieve_properties(token)
 
-            props_set = []
-            do_PropertySpec_propSet = do_PropertyFilterSpec_specSet.new_propSet()
-            do_PropertySpec_propSet.set_element_type(obj_type)
-            do_PropertySpec_propSet.set_element_pathSet(property_names)
-            props_set.append(do_PropertySpec_propSet)
+    def _traversal_properties_request(self, property_names=[],
+                                      from_node=None, obj_type='ManagedEntity'):
+        """Returns the request object and the call request method pointer
+        used by _retrieve_properties_traversal. The request must be sent with
+        soapfilter=self._splice_traversal_specs, as the call pointer does"""
+        if not from_node:
+            from_node = self._do_service_content.RootFolder
+
+        elif isinstance(from_node, tuple) and len(from_node) == 2:
+            from_node = VIMor(from_node[0], from_node[1])
+        elif not VIMor.is_mor(from_node):
+            raise VIException("from_node must be a MOR object or a "
+                              "(<str> mor_id, <str> mor_type) tuple",
+                              FaultTypes.PARAMETER_ERROR)
+
+        request, request_call = self._retrieve_property_request()
+
+        _this = request.new__this(self._do_service_content.PropertyCollector)
+        _this.set_attribute_type(MORTypes.PropertyCollector)
 
-            objects_set = self._get_traversal_objects_set(do_PropertyFilterSpec_specSet, from_node)
+        request.set_element__this(_this)
+        do_PropertyFilterSpec_specSet = request.new_specSet()
 
-            do_PropertyFilterSpec_specSet.set_element_propSet(props_set)
-            do_PropertyFilterSpec_specSet.set_element_objectSet(objects_set)
-            request.set_element_specSet([do_PropertyFilterSpec_specSet])
+        props_set = []
+        do_PropertySpec_propSet = do_PropertyFilterSpec_specSet.new_propSet()
+        do_PropertySpec_propSet.set_element_type(obj_type)
+        do_PropertySpec_propSet.set_element_pathSet(property_names)
+        props_set.append(do_PropertySpec_propSet)
+
+        objects_set = self._get_traversal_objects_set(
+                   do_PropertyFilterSpec_specSet, from_node, spliced_specs=True)
+
+        do_PropertyFilterSpec_specSet.set_element_propSet(props_set)
+        do_PropertyFilterSpec_specSet.set_element_objectSet(objects_set)
+        request.set_element_specSet([do_PropertyFilterSpec_specSet])
+
+        def call_pointer(request):
+            return request_call(request,
+                                soapfilter=self._splice_traversal_specs)
+
+        return request, call_pointer
+
+    def _retrieve_inventory_properties(self, property_names=[],
+                                      from_node=None, obj_type='ManagedEntity'):
+        """Same as _retrieve_properties_traversal, but if the server supports
+        them (API 4.0 and later) the objects are reached through a ContainerView
+        of @obj_type on @from_node instead of traversing the whole inventory.
+        Returns the corresponding objectContent data object."""
+        if not from_node:
+            from_node = self._do_service_content.RootFolder
+        if (self.__api_version < "4.0" or not VIMor.is_mor(from_node)
+            or from_node.get_attribute_type() not in _VIEW_CONTAINER_TYPES
+            #views don't include their container
+            or from_node.get_attribute_type() == obj_type):
+            return self._retrieve_properties_traversal(property_names,
+                                                       from_node, obj_type)
+        try:
+            view = self._get_container_view(from_node, obj_type)
+
+            request, request_call = self._retrieve_property_request()
+            _this = request.new__this(self._do_service_content.PropertyCollector)
+            _this.set_attribute_type(MORTypes.PropertyCollector)
+            request.set_element__this(_this)
+
+            spec_set = request.new_specSet()
+            prop_set = spec_set.new_propSet()
+            prop_set.set_element_type(obj_type)
+            prop_set.set_element_pathSet(property_names)
+            spec_set.set_element_propSet([prop_set])
+
+            object_set = spec_set.new_objectSet()
+            obj = object_set.new_obj(view)
+            obj.set_attribute_type(MORTypes.ContainerView)
+            object_set.set_element_obj(obj)
+            object_set.set_element_skip(True)
+            traverse_view = VI.ns0.TraversalSpec_Def('selectSet').pyclass()
+            traverse_view.set_element_name('traverseView')
+            traverse_view.set_element_type(MORTypes.ContainerView)
+            traverse_view.set_element_path('view')
+            traverse_view.set_element_skip(False)
+            object_set.set_element_selectSet([traverse_view])
+            spec_set.set_element_objectSet([object_set])
+            request.set_element_specSet([spec_set])
 
             return request_call(request)
 
         except (VI.ZSI.FaultException), e:
             raise VIApiException(e)
 
+    def _get_container_view(self, container, obj_type):
+        """Returns a ContainerView of the managed objects of type @obj_type
+        within @container (recursively). Views are created once per session
+        and reused by later requests, disconnect destroys them."""
+        key = (str(container), obj_type)
+        self.__container_views_lock.acquire()
+        try:
+            #views belong to the session, a new login invalidates them
+            if self.__container_views_generation != self.__login_generation:
+                self.__container_views = {}
+                self.__container_views_generation = self.__login_generation
+            view = self.__container_views.get(key)
+            if view is None:
+                request = VI.CreateContainerViewRequestMsg()
+                _this = request.new__this(self._do_service_content.ViewManager)
+                _this.set_attribute_type(MORTypes.ViewManager)
+                request.set_element__this(_this)
+                mor_container = request.new_container(container)
+                mor_container.set_attribute_type(
+                                                container.get_attribute_type())
+                request.set_element_container(mor_container)
+                request.set_element_type([obj_type])
+                request.set_element_recursive(True)
+                view = self._proxy.CreateContainerView(request)._returnval
+                self.__container_views[key] = view
+            return view
+        finally:
+            self.__container_views_lock.release()
+
+    def __destroy_container_views(self):
+        """Destroys the views created by _get_container_view"""
+        self.__container_views_lock.acquire()
+        try:
+            views = []
+            if self.__container_views_generation == self.__login_generation:
+                views = self.__container_views.values()
+            self.__container_views = {}
+        finally:
+            self.__container_views_lock.release()
+        for view in views:
+            try:
+                request = VI.DestroyViewRequestMsg()
+                _this = request.new__this(view)
+                _this.set_attribute_type(MORTypes.ContainerView)
+                request.set_element__this(_this)
+                self._proxy.DestroyView(request)
+            except (VI.ZSI.FaultException):
+                #the server destroys them along with the session anyway
+                pass
+
     def _create_filter(self, property_names=[],
-                       from_node=None, obj_type='ManagedEntity', partial_updates=True):
-        """Creates filter with given parameters and returns its MOR"""
+                       from_node=None, obj_type='ManagedEntity', partial_updates=True,
+                       collector=None):
+        """Creates filter with given parameters and returns its MOR. The filter
+        is created on the session's property collector unless the MOR of
+        another @collector is given"""
+        if not collector:
+            collector = self._do_service_content.PropertyCollector
         try:
             if not from_node:
                 from_node = self._do_service_content.RootFolder
@@ -780,7 +1112,7 @@ class VIServer:
                                   FaultTypes.PARAMETER_ERROR)
 
             request = VI.CreateFilterRequestMsg()
-            _this = request.new__this(self._do_service_content.PropertyCollector)
+            _this = request.new__this(collector)
             _this.set_attribute_type(MORTypes.PropertyCollector)
             request.set_element__this(_this)
             request.set_element_partialUpdates(partial_updates)
@@ -806,29 +1138,6 @@ class VIServer:
         either RetrieveProperties or RetrievePropertiesEx depending on
         RetrievePropertiesEx being supported or not"""
 
-        def call_retrieve_properties(request):
-            return self._proxy.RetrieveProperties(request)._returnval
-
-        def call_retrieve_properties_ex(request):
-            retval = self._proxy.RetrievePropertiesEx(
-                                                 request)._returnval
-            if not retval:
-                return None
-            ret = retval.Objects
-            while hasattr(retval, "Token"):
-                token = retval.Token
-                request = VI.ContinueRetrievePropertiesExRequestMsg()
-
-                _this = request.new__this(
-                                     self._do_service_content.PropertyCollector)
-                _this.set_attribute_type(MORTypes.PropertyCollector)
-                request.set_element__this(_this)
-                request.set_element_token(token)
-                retval = self._proxy.ContinueRetrievePropertiesEx(
-                                                  request)._returnval
-                ret.extend(retval.Objects)
-            return ret
-
         if self.__api_version >= "4.1":
             #RetrieveProperties is deprecated (but supported) in sdk 4.1.
             #skd 4.1 adds RetrievePropertiesEx with an extra 'options' arg
@@ -837,16 +1146,82 @@ class VIServer:
             #set options
             options = request.new_options()
             request.set_element_options(options)
-            call_pointer = call_retrieve_properties_ex
 
         else:
             request = VI.RetrievePropertiesRequestMsg()
-            call_pointer = call_retrieve_properties
 
-        return request, call_pointer
+        return request, self._retrieve_property_call()
 
-    def _wait_for_updates(self, version='', max_object_updates=None, max_wait_seconds=None):
+    def _retrieve_property_call(self):
+        """Returns the call request method pointer for the requests made by
+        _retrieve_property_request"""
+        if self.__api_version >= "4.1":
+            return self.__call_retrieve_properties_ex
+        return self.__call_retrieve_properties
+
+    def __call_retrieve_properties(self, request, **kw):
+        kw.update(self.__parallel_parse_kw(('returnval',)))
+        return self._proxy.RetrieveProperties(request, **kw)._returnval
+
+    def __call_retrieve_properties_ex(self, request, **kw):
+        kw.update(self.__parallel_parse_kw())
+        retval = self._proxy.RetrievePropertiesEx(request, **kw)._returnval
+        if not retval:
+            return None
+        ret = retval.Objects
+        while hasattr(retval, "Token"):
+            token = retval.Token
+            request = VI.ContinueRetrievePropertiesExRequestMsg()
+
+            _this = request.new__this(
+                                 self._do_service_content.PropertyCollector)
+            _this.set_attribute_type(MORTypes.PropertyCollector)
+            request.set_element__this(_this)
+            request.set_element_token(token)
+            retval = self._proxy.ContinueRetrievePropertiesEx(
+                            request, **self.__parallel_parse_kw())._returnval
+            ret.extend(retval.Objects)
+        return ret
 
+    def _request_template(self, key, build):
+        """Returns the RequestTemplate kept under @key, made from the request
+        returned by @build the first time. The values that are not
+        placeholders (object types, property names, counts) must be part of
+        @key. Templates are dropped along with the proxy they were serialized
+        for"""
+        template = self.__request_templates.get(key)
+        if template is None:
+            template = self.__request_templates.setdefault(key,
+                                RequestTemplate(self._proxy.binding, build()))
+        return template
+
+    def __parallel_parse_kw(self, path=('returnval', 'objects')):
+        """Returns the keyword arguments for a property collector call to
+        parse in parallel the objects found at @path in its reply, if
+        enable_parallel_parse was called"""
+        if not self.__parallel_parser:
+            return {}
+        return {'replyparser':self.__parallel_parser.items(*path)}
+
+    def __cancel_retrieve_properties(self, token):
+        """Discards the remaining pages of a RetrievePropertiesEx result set"""
+        try:
+            request = VI.CancelRetrievePropertiesExRequestMsg()
+            _this = request.new__this(self._do_service_content.PropertyCollector)
+            _this.set_attribute_type(MORTypes.PropertyCollector)
+            request.set_element__this(_this)
+            request.set_element_token(token)
+            self._proxy.CancelRetrievePropertiesEx(request)
+        except (VI.ZSI.FaultException):
+            #the result set expires on the server anyway
+            pass
+
+    def _wait_for_updates(self, version='', max_object_updates=None, max_wait_seconds=None,
+                          collector=None):
+        """Waits for the changes reported by the filters of the session's
+        property collector (or of @collector if given) since @version"""
+        if not collector:
+            collector = self._do_service_content.PropertyCollector
         try:
             if self.__api_version >= "4.1":
                 request = VI.WaitForUpdatesExRequestMsg()
@@ -859,14 +1234,12 @@ class VIServer:
                 method = self._proxy.WaitForUpdatesEx
             else:
                 if max_wait_seconds is None:
-                    print 'WaitForUpdates'
                     request = VI.WaitForUpdatesRequestMsg()
                     method = self._proxy.WaitForUpdates
                 else:
-                    print 'CheckForUpdates'
                     request = VI.CheckForUpdatesRequestMsg()
                     method = self._proxy.CheckForUpdates
-            _this = request.new__this(self._do_service_content.PropertyCollector)
+            _this = request.new__this(collector)
             _this.set_attribute_type(MORTypes.PropertyCollector)
             request.set_element__this(_this)
             request.set_element_version(version)
@@ -876,7 +1249,12 @@ class VIServer:
         except (VI.ZSI.FaultException), e:
             raise VIApiException(e)
 
-    def _get_traversal_objects_set(self, specSet, from_node):
+    def _get_traversal_objects_set(self, specSet, from_node,
+                                   spliced_specs=False):
+        """Returns the objectSet to traverse the inventory from @from_node.
+        If @spliced_specs is True the traversal specs are replaced by a
+        placeholder, and the request must be sent with
+        soapfilter=self._splice_traversal_specs"""
         objects_set = []
         do_ObjectSpec_objSet = specSet.new_objectSet()
         mor_obj = do_ObjectSpec_objSet.new_obj(from_node)
@@ -884,117 +1262,62 @@ class VIServer:
         do_ObjectSpec_objSet.set_element_obj(mor_obj)
         do_ObjectSpec_objSet.set_element_skip(False)
 
-        #Recurse through all ResourcePools
-        rp_to_rp = VI.ns0.TraversalSpec_Def('rpToRp').pyclass()
-        rp_to_rp.set_element_name('rpToRp')
-        rp_to_rp.set_element_type(MORTypes.ResourcePool)
-        rp_to_rp.set_element_path('resourcePool')
-        rp_to_rp.set_element_skip(False)
-        rp_to_vm = VI.ns0.TraversalSpec_Def('rpToVm').pyclass()
-        rp_to_vm.set_element_name('rpToVm')
-        rp_to_vm.set_element_type(MORTypes.ResourcePool)
-        rp_to_vm.set_element_path('vm')
-        rp_to_vm.set_element_skip(False)
-
-        spec_array_resource_pool = [do_ObjectSpec_objSet.new_selectSet(),
-                                    do_ObjectSpec_objSet.new_selectSet()]
-        spec_array_resource_pool[0].set_element_name('rpToRp')
-        spec_array_resource_pool[1].set_element_name('rpToVm')
-
-        rp_to_rp.set_element_selectSet(spec_array_resource_pool)
-
-        #Traversal through resource pool branch
-        cr_to_rp = VI.ns0.TraversalSpec_Def('crToRp').pyclass()
-        cr_to_rp.set_element_name('crToRp')
-        cr_to_rp.set_element_type(MORTypes.ComputeResource)
-        cr_to_rp.set_element_path('resourcePool')
-        cr_to_rp.set_element_skip(False)
-        spec_array_computer_resource = [do_ObjectSpec_objSet.new_selectSet(),
-                                        do_ObjectSpec_objSet.new_selectSet()]
-        spec_array_computer_resource[0].set_element_name('rpToRp');
-        spec_array_computer_resource[1].set_element_name('rpToVm');
-        cr_to_rp.set_element_selectSet(spec_array_computer_resource)
-
-        #Traversal through host branch
-        cr_to_h = VI.ns0.TraversalSpec_Def('crToH').pyclass()
-        cr_to_h.set_element_name('crToH')
-        cr_to_h.set_element_type(MORTypes.ComputeResource)
-        cr_to_h.set_element_path('host')
-        cr_to_h.set_element_skip(False)
-
-        #Traversal through hostFolder branch
-        dc_to_hf = VI.ns0.TraversalSpec_Def('dcToHf').pyclass()
-        dc_to_hf.set_element_name('dcToHf')
-        dc_to_hf.set_element_type(MORTypes.Datacenter)
-        dc_to_hf.set_element_path('hostFolder')
-        dc_to_hf.set_element_skip(False)
-        spec_array_datacenter_host = [do_ObjectSpec_objSet.new_selectSet()]
-        spec_array_datacenter_host[0].set_element_name('visitFolders')
-        dc_to_hf.set_element_selectSet(spec_array_datacenter_host)
-
-        #Traversal through vmFolder branch
-        dc_to_vmf = VI.ns0.TraversalSpec_Def('dcToVmf').pyclass()
-        dc_to_vmf.set_element_name('dcToVmf')
-        dc_to_vmf.set_element_type(MORTypes.Datacenter)
-        dc_to_vmf.set_element_path('vmFolder')
-        dc_to_vmf.set_element_skip(False)
-        spec_array_datacenter_vm = [do_ObjectSpec_objSet.new_selectSet()]
-        spec_array_datacenter_vm[0].set_element_name('visitFolders')
-        dc_to_vmf.set_element_selectSet(spec_array_datacenter_vm)
-
-        #Traversal through datastore branch
-        dc_to_ds = VI.ns0.TraversalSpec_Def('dcToDs').pyclass()
-        dc_to_ds.set_element_name('dcToDs')
-        dc_to_ds.set_element_type(MORTypes.Datacenter)
-        dc_to_ds.set_element_path('datastore')
-        dc_to_ds.set_element_skip(False)
-        spec_array_datacenter_ds = [do_ObjectSpec_objSet.new_selectSet()]
-        spec_array_datacenter_ds[0].set_element_name('visitFolders')
-        dc_to_ds.set_element_selectSet(spec_array_datacenter_ds)
-
-        #Recurse through all hosts
-        h_to_vm = VI.ns0.TraversalSpec_Def('hToVm').pyclass()
-        h_to_vm.set_element_name('hToVm')
-        h_to_vm.set_element_type(MORTypes.HostSystem)
-        h_to_vm.set_element_path('vm')
-        h_to_vm.set_element_skip(False)
-        spec_array_host_vm = [do_ObjectSpec_objSet.new_selectSet()]
-        spec_array_host_vm[0].set_element_name('visitFolders')
-        h_to_vm.set_element_selectSet(spec_array_host_vm)
-
-        #Recurse through all datastores
-        ds_to_vm = VI.ns0.TraversalSpec_Def('dsToVm').pyclass()
-        ds_to_vm.set_element_name('dsToVm')
-        ds_to_vm.set_element_type(MORTypes.Datastore)
-        ds_to_vm.set_element_path('vm')
-        ds_to_vm.set_element_skip(False)
-        spec_array_datastore_vm = [do_ObjectSpec_objSet.new_selectSet()]
-        spec_array_datastore_vm[0].set_element_name('visitFolders')
-        ds_to_vm.set_element_selectSet(spec_array_datastore_vm)
-
-        #Recurse through the folders
-        visit_folders = VI.ns0.TraversalSpec_Def('visitFolders').pyclass()
-        visit_folders.set_element_name('visitFolders')
-        visit_folders.set_element_type(MORTypes.Folder)
-        visit_folders.set_element_path('childEntity')
-        visit_folders.set_element_skip(False)
-        spec_array_visit_folders = []
-        for i in ('visitFolders', 'dcToHf', 'dcToVmf', 'crToH', 'crToRp',
-                  'dcToDs', 'hToVm', 'dsToVm', 'rpToVm'):
-            select_set = do_ObjectSpec_objSet.new_selectSet()
-            select_set.set_element_name(i)
-            spec_array_visit_folders.append(select_set)
-
-        visit_folders.set_element_selectSet(spec_array_visit_folders)
-
-        #Add all of them here
-        spec_array = [visit_folders, dc_to_vmf, dc_to_ds, dc_to_hf, cr_to_h,
-                      cr_to_rp, rp_to_rp, h_to_vm, ds_to_vm, rp_to_vm]
-
-        do_ObjectSpec_objSet.set_element_selectSet(spec_array)
+        if spliced_specs:
+            placeholder = do_ObjectSpec_objSet.new_selectSet()
+            placeholder.set_element_name(_TRAVERSAL_SPECS_PLACEHOLDER)
+            do_ObjectSpec_objSet.set_element_selectSet([placeholder])
+        else:
+            do_ObjectSpec_objSet.set_element_selectSet(
+                                                  self._get_traversal_specs())
         objects_set.append(do_ObjectSpec_objSet)
         return objects_set
 
+    def _get_traversal_specs(self):
+        """Returns the list of TraversalSpec objects to reach every managed
+        entity, they are built only once and shared by all the requests"""
+        if self.__traversal_specs is None:
+            specs = []
+            for name, mo_type, path, select in _TRAVERSAL_SPECS:
+                spec = VI.ns0.TraversalSpec_Def(name).pyclass()
+                spec.set_element_name(name)
+                spec.set_element_type(mo_type)
+                spec.set_element_path(path)
+                spec.set_element_skip(False)
+                if select:
+                    select_set = []
+                    for i in select:
+                        selection = VI.ns0.SelectionSpec_Def(
+                                                         'selectSet').pyclass()
+                        selection.set_element_name(i)
+                        select_set.append(selection)
+                    spec.set_element_selectSet(select_set)
+                specs.append(spec)
+            self.__traversal_specs = specs
+        return self.__traversal_specs
+
+    def _splice_traversal_specs(self, soapdata):
+        """Replaces the placeholder set by _get_traversal_objects_set in the
+        serialized request @soapdata with the traversal specs, which are
+        serialized only once"""
+        if self.__traversal_specs_xml is None:
+            #each spec is written as a standalone selectSet element, which
+            #declares the namespaces it uses, so it can go in any request
+            xml = []
+            for spec in self._get_traversal_specs():
+                typecode = copy(spec.typecode)
+                typecode.nspname = typecode.schema
+                typecode.pname = 'selectSet'
+                sw = SoapWriter(envelope=False,
+                                outputclass=self._proxy.binding.writerclass)
+                xml.append(str(sw.serialize(spec, typecode)))
+            self.__traversal_specs_xml = "".join(xml)
+        soapdata, count = _TRAVERSAL_SPECS_PLACEHOLDER_RE.subn(
+                                  lambda m: self.__traversal_specs_xml, soapdata)
+        if count != 1:
+            raise VIException("Traversal specs placeholder not found in the "
+                              "request", FaultTypes.INVALID_OPERATION)
+        return soapdata
+
     def _set_header(self, name, value):
         """Sets a HTTP header to be sent with the SOAP requests.
         E.g. for impersonation of a particular client.
@@ -1015,10 +1338,33 @@ class VIServer:
         else:
             self._proxy.binding.ResetHeaders()
 
+    def _get_folder_by_name(self, name):
+        """Returns the MOR of a folder named @name, or None if there isn't
+        any. If several folders have that name, the one with the lowest MOR.
+        Folders are indexed by name once per VIServer. The folder found in
+        the index is checked to still have that name, and the index is loaded
+        again when it doesn't (renamed or deleted) or @name isn't in it."""
+        folders = self.__folders
+        if folders is not None and name in folders:
+            mor = folders[name]
+            try:
+                oc = self._get_object_properties(mor, property_names=['name'])
+            except VIApiException:
+                oc = None
+            for prop in getattr(oc, "PropSet", None) or []:
+                if prop.Name == "name" and prop.Val == name:
+                    return mor
+        folders = {}
+        for mor, folder_name in sorted(self._get_managed_objects(
+                                               MORTypes.Folder).iteritems()):
+            folders.setdefault(folder_name, mor)
+        self.__folders = folders
+        return folders.get(name)
+
     def _get_managed_objects(self, mo_type, from_mor=None):
         """Returns a dictionary of managed objects and their names"""
 
-        content = self._retrieve_properties_traversal(property_names=['name'],
+        content = self._retrieve_inventory_properties(property_names=['name'],
                                                       from_node=from_mor,
                                                       obj_type=mo_type)
         if not content: return {}
@@ -1027,6 +1373,137 @@ class VIServer:
         except VI.ZSI.FaultException, e:
             raise VIApiException(e)
 
+    def _call_with_relogin(self, method, args, kwargs):
+        """Calls a proxy method, if it fails because the session is not
+        authenticated, logs in again and replays the request once"""
+        generation = self.__login_generation
+        try:
+            return method(*args, **kwargs)
+        except (VI.ZSI.FaultException), e:
+            exc_info = sys.exc_info()
+            if not _is_not_authenticated(e) or not self.__relogin(generation):
+                raise exc_info[0], exc_info[1], exc_info[2]
+        return method(*args, **kwargs)
+
+    def __relogin(self, generation):
+        """Logs in again unless another thread already did it after
+        @generation. Returns False if the session can't be recovered"""
+        self.__relogin_lock.acquire()
+        try:
+            if not self.__logged:
+                return False
+            if generation == self.__login_generation:
+                self._proxy.binding.ResetCookies()
+                try:
+                    self.__login()
+                except (VI.ZSI.FaultException):
+                    return False
+            return True
+        finally:
+            self.__relogin_lock.release()
+
+    def __keepalive(self, interval, stop):
+        while True:
+            stop.wait(interval)
+            if stop.isSet() or not self.__logged:
+                return
+            try:
+                self.keep_session_alive()
+            except Exception:
+                #network errors, try again in the next round
+                pass
+
+    def __login(self):
+        """Logs in on the current binding with the credentials given to
+        connect"""
+        if not self.__passthrough:
+            #login with user/password
+            request = VI.LoginRequestMsg()
+            mor_session_manager = request.new__this(
+                                        self._do_service_content.SessionManager)
+            mor_session_manager.set_attribute_type(MORTypes.SessionManager)
+            request.set_element__this(mor_session_manager)
+            request.set_element_userName(self.__user)
+            request.set_element_password(self.__password)
+            self.__session = self._proxy.Login(request)._returnval
+
+        else:
+            fqdn, aliases, addrs = gethostbyaddr(urlparse(self.__server_url).netloc)
+            if os.name == 'nt':
+                #login with Windows session credentials
+                try:
+                    from sspi import ClientAuth
+                except ImportError:
+                    raise ImportError("To enable passthrough authentication please"\
+                        " install pywin32 (available for Windows only)")
+                spn = "host/%s" % fqdn
+                client = ClientAuth("Kerberos", targetspn=spn)
+
+                def get_token(serverToken=None):
+                    if serverToken is not None:
+                        serverToken = b64decode(serverToken)
+                    err, bufs = client.authorize(serverToken)
+                    return b64encode(bufs[0].Buffer)
+            else:
+                #login with MIT Kerberos credentials
+                try:
+                    import kerberos
+                except ImportError:
+                    raise ImportError("To enable passthrough authentication please"\
+                        " install python bindings for kerberos")
+                spn = "host@%s" % fqdn
+                flags = kerberos.GSS_C_INTEG_FLAG|kerberos.GSS_C_SEQUENCE_FLAG|\
+                    kerberos.GSS_C_REPLAY_FLAG|kerberos.GSS_C_CONF_FLAG
+                errc, client = kerberos.authGSSClientInit(spn, gssflags=flags)
+
+                def get_token(serverToken=''):
+                    cres = kerberos.authGSSClientStep(client, serverToken)
+                    return kerberos.authGSSClientResponse(client)
+
+            token = get_token()
+
+            logged = False
+            while not logged:
+                try:
+                    request = VI.LoginBySSPIRequestMsg()
+                    mor_session_manager = request.new__this(
+                                                self._do_service_content.SessionManager)
+                    mor_session_manager.set_attribute_type(MORTypes.SessionManager)
+                    request.set_element__this(mor_session_manager)
+                    request.set_element_base64Token(token)
+                    self.__session = self._proxy.LoginBySSPI(request)._returnval
+                    logged = True
+                except (VI.ZSI.FaultException), e:
+                    if e.fault.string == "fault.SSPIChallenge.summary":
+                        serverToken = e.fault.detail[0].Base64Token
+                        token = get_token(serverToken)
+                    else:
+                        raise e
+        self.__logged = True
+        self.__login_generation += 1
+
+    def __init_proxy(self, locator_args):
+        """Creates the server's proxy with the given locator arguments and
+        retrieves the service content"""
+        locator = VI.VimServiceLocator()
+        self.__locator_args = locator_args
+        self._proxy = locator.getVimPortType(**locator_args)
+        self.__request_templates = {}
+
+        for header, value in self.__initial_headers.iteritems():
+            self._proxy.binding.AddHeader(header, value)
+
+        #get service content from service instance
+        request = VI.RetrieveServiceContentRequestMsg()
+        mor_service_instance = request.new__this('ServiceInstance')
+        mor_service_instance.set_attribute_type(MORTypes.ServiceInstance)
+        request.set_element__this(mor_service_instance)
+        self._do_service_content = self._proxy.RetrieveServiceContent(
+                                                         request)._returnval
+        self.__server_type = self._do_service_content.About.Name
+        self.__api_version = self._do_service_content.About.ApiVersion
+        self.__api_type = self._do_service_content.About.ApiType
+
     #---- DEPRECATED METHODS ----#
 
     def _get_clusters(self, from_cache=False):
@@ -1061,3 +1538,34 @@ class VIServer:
 
         ret = self.get_resource_pools()
         return dict([(v,k) for k,v in ret.iteritems()])
+
+class _ReloginProxy:
+    """Wraps a server's proxy so its requests are replayed once after
+    logging in again if the session is no longer authenticated"""
+
+    _SESSION_METHODS = ('Login', 'LoginBySSPI', 'Logout', 'CloneSession',
+                        'RetrieveServiceContent')
+
+    def __init__(self, server, proxy):
+        self._server = server
+        self._proxy = proxy
+
+    def __getattr__(self, name):
+        attr = getattr(self._proxy, name)
+        if name == 'binding' or name in self._SESSION_METHODS:
+            return attr
+        def call(*args, **kwargs):
+            return self._server._call_with_relogin(attr, args, kwargs)
+        return call
+
+def _is_not_authenticated(e):
+    """True if @e, either a FaultException or the VIApiException built from
+    it, was raised by a NotAuthenticated fault"""
+    if isinstance(e, VIException):
+        fault = e.fault
+    else:
+        try:
+            fault = e.fault.detail[0].typecode.pname
+        except (AttributeError, IndexError, TypeError):
+            return False
+    return fault in ('NotAuthenticated', 'NotAuthenticatedFault')
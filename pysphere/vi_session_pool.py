@@ -0,0 +1,240 @@
+#--
+# Copyright (c) 2012, Sebastian Tello
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions and the following disclaimer in the documentation
+#     and/or other materials provided with the distribution.
+#   * Neither the name of copyright holders nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#--
+
+import threading
+import time
+
+from pysphere.resources.vi_exception import VIException, VIApiException, \
+                                            FaultTypes
+from pysphere.vi_server import _is_not_authenticated
+
+class VISessionPool(object):
+
+    ROUND_ROBIN  = 'round_robin'
+    LEAST_LOADED = 'least_loaded'
+
+    def __init__(self, server, size=4, policy=ROUND_ROBIN,
+                 health_check_interval=None):
+        """Pool of sessions cloned from the session of a connected VIServer
+        (see VIServer.clone_session). Worker threads acquire a session, use it
+        and release it, so the load is spread among @size sessions instead of
+        being serialized by the server on a single one.
+          * server: a connected VIServer, only used to clone the sessions.
+          * size: number of cloned sessions.
+          * policy: either VISessionPool.ROUND_ROBIN (default) or
+            VISessionPool.LEAST_LOADED (the session with less threads using it)
+          * health_check_interval: (optional) if set, a background thread checks
+            every that many seconds that the idle sessions are still alive and
+            re-clones the ones that expired (see check_health).
+        """
+        if not server.is_connected():
+            raise VIException("Must call 'connect' before invoking this method",
+                              FaultTypes.NOT_CONNECTED)
+        if policy not in (self.ROUND_ROBIN, self.LEAST_LOADED):
+            raise VIException("policy must be either '%s' or '%s'"
+                              % (self.ROUND_ROBIN, self.LEAST_LOADED),
+                              FaultTypes.PARAMETER_ERROR)
+        self._server = server
+        self._policy = policy
+        self._lock = threading.RLock()
+        self._sessions = [server.clone_session() for i in range(size)]
+        self._load = [0] * size
+        self._next = 0
+        #indexes of the sessions being re-cloned
+        self._replacing = set()
+        self._closed = False
+        self._checker = None
+        if health_check_interval:
+            self._checker = threading.Thread(target=self._health_checker,
+                                             args=(health_check_interval,))
+            self._checker.daemon = True
+            self._checker.start()
+
+    def acquire(self):
+        """Returns the VIServer instance of a pooled session, according to the
+        selection policy. Call release() when done with it"""
+        self._lock.acquire()
+        try:
+            if self._closed:
+                raise VIException("The session pool is closed",
+                                  FaultTypes.NOT_CONNECTED)
+            n = len(self._sessions)
+            order = [(self._next + i) % n for i in range(n)]
+            #sessions being re-cloned are skipped while there are others
+            order = [i for i in order if i not in self._replacing] or order
+            if self._policy == self.LEAST_LOADED:
+                #ties are broken in round robin order
+                index = min(order, key=lambda i: self._load[i])
+            else:
+                index = order[0]
+            self._next = (index + 1) % len(self._sessions)
+            self._load[index] += 1
+            return self._sessions[index]
+        finally:
+            self._lock.release()
+
+    def release(self, session, expired=False):
+        """Returns a session acquired with acquire() to the pool. If @expired
+        is True the session is replaced by a new clone"""
+        self._lock.acquire()
+        try:
+            index = self._index(session)
+            if index is None:
+                return
+            self._load[index] -= 1
+            if not expired or not self._mark_replacing(index):
+                return
+        finally:
+            self._lock.release()
+        self._reclone(index, session)
+
+    def call(self, func, *args, **kwargs):
+        """Calls func(session, *args, **kwargs) with an acquired session and
+        returns its result. If the session turns out to be not authenticated
+        (e.g. it expired) it is replaced by a new clone and the call is
+        retried once with it"""
+        for attempt in (0, 1):
+            session = self.acquire()
+            try:
+                ret = func(session, *args, **kwargs)
+            except VIApiException, e:
+                if attempt or not _is_not_authenticated(e):
+                    self.release(session)
+                    raise
+                self.release(session, expired=True)
+            except:
+                self.release(session)
+                raise
+            else:
+                self.release(session)
+                return ret
+
+    def check_health(self):
+        """Asks the server time through every idle session and re-clones the
+        ones that are no longer alive. Returns the number of sessions
+        replaced"""
+        self._lock.acquire()
+        try:
+            idle = [s for i, s in enumerate(self._sessions) if not self._load[i]]
+        finally:
+            self._lock.release()
+
+        replaced = 0
+        for session in idle:
+            try:
+                alive = session.keep_session_alive()
+            except VIException:
+                alive = False
+            if alive:
+                continue
+            self._lock.acquire()
+            try:
+                index = self._index(session)
+                if index is None or self._load[index] or \
+                   not self._mark_replacing(index):
+                    continue
+            finally:
+                self._lock.release()
+            if self._reclone(index, session):
+                replaced += 1
+        return replaced
+
+    def get_load(self):
+        """Returns a list with the number of threads using each session"""
+        return list(self._load)
+
+    def close(self):
+        """Logs out all the cloned sessions. The server the sessions were
+        cloned from remains connected"""
+        self._lock.acquire()
+        try:
+            self._closed = True
+            sessions, self._sessions = self._sessions, []
+        finally:
+            self._lock.release()
+        for session in sessions:
+            try:
+                session.disconnect()
+            except VIException:
+                pass
+
+    def _index(self, session):
+        for index, s in enumerate(self._sessions):
+            if s is session:
+                return index
+        return None
+
+    def _mark_replacing(self, index):
+        #must be called holding the lock. Returns False if another thread is
+        #already re-cloning that session
+        if index in self._replacing:
+            return False
+        self._replacing.add(index)
+        return True
+
+    def _reclone(self, index, old):
+        #the clone is done without holding the lock, so that other threads
+        #can keep acquiring and releasing the rest of the sessions meanwhile.
+        #Returns True if the new session took the place of the old one
+        try:
+            new = self._server.clone_session()
+        except:
+            self._lock.acquire()
+            try:
+                self._replacing.discard(index)
+            finally:
+                self._lock.release()
+            raise
+        self._lock.acquire()
+        try:
+            self._replacing.discard(index)
+            swapped = not self._closed and self._sessions[index] is old
+            if swapped:
+                self._sessions[index] = new
+                #threads still holding the old session won't release it
+                self._load[index] = 0
+        finally:
+            self._lock.release()
+        try:
+            if swapped:
+                old.disconnect()
+            else:
+                new.disconnect()
+        except VIException:
+            pass
+        return swapped
+
+    def _health_checker(self, interval):
+        while not self._closed:
+            time.sleep(interval)
+            try:
+                self.check_health()
+            except VIException:
+                #the source session might be down, try again later
+                pass
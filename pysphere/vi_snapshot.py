@@ -37,6 +37,10 @@ class VISnapshot:
         self._name = snapshot_tree_prop.name
         self._description = snapshot_tree_prop.description
         self._create_time = snapshot_tree_prop.createTime
+        if parent is not None:
+            self._path = parent._path + '/' + self._name
+        else:
+            self._path = '/' + self._name
         self.__children = []
         for child in getattr(snapshot_tree_prop, 'childSnapshotList', []):
             snap = VISnapshot(child, self)
@@ -71,14 +75,7 @@ class VISnapshot:
         """returns the full path of this snapshot. This path is formed with the
         names of all the ancestors starting with and separated by '/'.
         E.g. /base/base2/child"""
-        path= ''
-        if(self._parent is not None):
-            parent_path = self._parent.get_path()
-            path = parent_path + '/' + self._name
-        else:
-            path = '/' + self._name
-
-        return path
+        return self._path
 
     def get_state(self):
         """Returns either 'poweredOff', 'poweredOn', or 'suspended' which
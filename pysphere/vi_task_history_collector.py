@@ -151,20 +151,12 @@ class VITaskHistoryCollector(VIHistoryCollector):
                               FaultTypes.PARAMETER_ERROR)
         
         if next_page:
-            request = VI.ReadNextTasksRequestMsg()
+            operation = "ReadNextTasks"
         else:
-            request = VI.ReadPreviousTasksRequestMsg()
-            
-        _this = request.new__this(self._mor)
-        _this.set_attribute_type(self._mor.get_attribute_type())
-        request.set_element__this(_this)
-        
-        request.set_element_maxCount(max_count)
+            operation = "ReadPreviousTasks"
+
         try:
-            if next_page:
-                resp = self._server._proxy.ReadNextTasks(request)._returnval
-            else:
-                resp = self._server._proxy.ReadPreviousTasks(request)._returnval
+            resp = self._call_collector(operation, max_count)._returnval
             
             ret = []
             for task in resp:
@@ -45,6 +45,9 @@ class VIVirtualMachine(VIManagedEntity):
         VIManagedEntity.__init__(self, server, mor)
         self._root_snapshots = []
         self._snapshot_list = []
+        self._snapshots_by_name = {}
+        self._snapshots_by_path = {}
+        self._snapshots_by_mor = {}
         self._disks = []
         self._files = {}
         self._devices = {}
@@ -447,21 +450,15 @@ class VIVirtualMachine(VIManagedEntity):
         """
         try:
             #get the folder to create the VM
-            folders = self._server._retrieve_properties_traversal(
-                                         property_names=['name', 'childEntity'],
-                                         obj_type=MORTypes.Folder)
             folder_mor = None
-            for f in folders:
-                fname = ""
-                children = []
-                for prop in f.PropSet:
-                    if prop.Name == "name":
-                        fname = prop.Val
-                    elif prop.Name == "childEntity":
-                        children = prop.Val.ManagedObjectReference
-                if folder == fname or (not folder and self._mor in children):
-                    folder_mor = f.Obj
-                    break
+            if folder:
+                folder_mor = self._server._get_folder_by_name(folder)
+            else:
+                oc = self._server._get_object_properties(self._mor,
+                                                      property_names=['parent'])
+                for prop in getattr(oc, "PropSet", None) or []:
+                    if prop.Name == "parent":
+                        folder_mor = prop.Val
             if not folder_mor and folder:
                 raise VIException("Couldn't find folder %s" % folder,
                                   FaultTypes.OBJECT_NOT_FOUND)
@@ -506,10 +503,10 @@ class VIVirtualMachine(VIManagedEntity):
                 elif isinstance(snapshot, VISnapshot):
                     sn_mor = snapshot._mor
                 elif isinstance(snapshot, basestring):
-                    for sn in self.get_snapshots():
-                        if sn.get_name() == snapshot:
-                            sn_mor = sn._mor
-                            break
+                    self.refresh_snapshot_list()
+                    sn = self._snapshots_by_name.get(snapshot)
+                    if sn:
+                        sn_mor = sn._mor
                 if not sn_mor:
                     raise VIException("Could not find snapshot '%s'" % snapshot,
                                       FaultTypes.OBJECT_NOT_FOUND)
@@ -711,12 +708,12 @@ class VIVirtualMachine(VIManagedEntity):
 
     def get_current_snapshot_name(self):
         """Returns the name of the current snapshot (if any)."""
-        self.__update_properties()
+        self.refresh_snapshot_list()
         if not self.__current_snapshot:
             return None
-        for snap in self._snapshot_list:
-            if str(self.__current_snapshot) == str(snap._mor):
-                return snap._name
+        snap = self._snapshots_by_mor.get(str(self.__current_snapshot))
+        if snap:
+            return snap._name
         return None
 
     def revert_to_snapshot(self, sync_run=True, host=None):
@@ -759,14 +756,11 @@ class VIVirtualMachine(VIManagedEntity):
         returned. You may additionally provided a managed object reference to a
         host where the VM should be reverted at."""
 
-        mor = None
-        for snap in self._snapshot_list:
-            if snap._name == name:
-                mor = snap._mor
-                break
-        if not mor:
+        snap = self._snapshots_by_name.get(name)
+        if not snap:
             raise VIException("Could not find snapshot '%s'" % name,
                               FaultTypes.OBJECT_NOT_FOUND)
+        mor = snap._mor
 
         try:
             request = VI.RevertToSnapshot_TaskRequestMsg()
@@ -802,14 +796,11 @@ class VIVirtualMachine(VIManagedEntity):
         returned. You may additionally provided a managed object reference to a
         host where the VM should be reverted at."""
 
-        mor = None
-        for snap in self._snapshot_list:
-            if snap.get_path() == path and snap._index == index:
-                mor = snap._mor
-                break
-        if not mor:
+        snap = self._snapshots_by_path.get((path, index))
+        if not snap:
             raise VIException("Couldn't find snapshot with path '%s' (index %d)"
                               % (path, index), FaultTypes.OBJECT_NOT_FOUND)
+        mor = snap._mor
 
         try:
             request = VI.RevertToSnapshot_TaskRequestMsg()
@@ -892,11 +883,7 @@ class VIVirtualMachine(VIManagedEntity):
             raise VIException("There is no current snapshot",
                               FaultTypes.OBJECT_NOT_FOUND)
 
-        target_snap = None
-        for snap in self._snapshot_list:
-            if snap._mor == self.__current_snapshot:
-                target_snap = snap
-                break
+        target_snap = self._snapshots_by_mor.get(str(self.__current_snapshot))
 
         return self.__rename_snapshot(target_snap, new_name, new_description)
 
@@ -905,11 +892,7 @@ class VIVirtualMachine(VIManagedEntity):
         If @new_name is None, snapshot name remains unchanged.
         If @new_description is None snapshot description remains unchanged."""
         self.refresh_snapshot_list()
-        target_snap = None
-        for snap in self._snapshot_list:
-            if snap._name == name:
-                target_snap = snap
-                break
+        target_snap = self._snapshots_by_name.get(name)
         if target_snap is None:
             raise VIException("Could not find snapshot '%s'" % name,
                               FaultTypes.OBJECT_NOT_FOUND)
@@ -922,11 +905,7 @@ class VIVirtualMachine(VIManagedEntity):
         If @new_name is None, snapshot name remains unchanged.
         If @new_description is None snapshot description remains unchanged."""
 
-        target_snap = None
-        for snap in self._snapshot_list:
-            if snap.get_path() == path and snap._index == index:
-                target_snap = snap
-                break
+        target_snap = self._snapshots_by_path.get((path, index))
         if not target_snap:
             raise VIException("Couldn't find snapshot with path '%s' (index %d)"
                               % (path, index), FaultTypes.OBJECT_NOT_FOUND)
@@ -954,14 +933,11 @@ class VIVirtualMachine(VIManagedEntity):
         returns (raises an exception if the task didn't succeed). If sync_run is
         set to False the task is started an a VITask instance is returned."""
 
-        mor = None
-        for snap in self._snapshot_list:
-            if snap._name == name:
-                mor = snap._mor
-                break
-        if mor is None:
+        snap = self._snapshots_by_name.get(name)
+        if snap is None:
             raise VIException("Could not find snapshot '%s'" % name,
                               FaultTypes.OBJECT_NOT_FOUND)
+        mor = snap._mor
 
         return self.__delete_snapshot(mor, remove_children, sync_run)
 
@@ -976,21 +952,38 @@ class VIVirtualMachine(VIManagedEntity):
         task is started an a VITask instance is returned.
         """
 
-        mor = None
-        for snap in self._snapshot_list:
-            if snap.get_path() == path and snap._index == index:
-                mor = snap._mor
-                break
-        if not mor:
+        snap = self._snapshots_by_path.get((path, index))
+        if not snap:
             raise VIException("Couldn't find snapshot with path '%s' (index %d)"
                               % (path, index), FaultTypes.OBJECT_NOT_FOUND)
+        mor = snap._mor
 
-        self.__delete_snapshot(mor, remove_children, sync_run)
+        return self.__delete_snapshot(mor, remove_children, sync_run)
 
 
     def refresh_snapshot_list(self):
-        """Refreshes the internal list of snapshots of this VM"""
-        self.__update_properties()
+        """Refreshes the internal list of snapshots of this VM. Only the
+        'snapshot' property is retrieved, the rest of the VM properties are
+        left as they are"""
+        oc = self._server._get_object_properties(self._mor,
+                                                 property_names=['snapshot'])
+        value = None
+        for prop in getattr(oc, "PropSet", None) or []:
+            if prop.Name == "snapshot":
+                value = prop.Val
+        snapshot = None
+        if value is not None:
+            snapshot = VIProperty(self._server, value)
+        self.__update_snapshots(snapshot)
+
+        #keep the cached properties consistent with the new snapshot tree
+        if self.properties is not None and self.properties._values_set:
+            if snapshot is None:
+                self.properties._values.pop("snapshot", None)
+                self.properties.__dict__.pop("snapshot", None)
+            else:
+                self.properties._values["snapshot"] = value
+                self.properties.snapshot = snapshot
 
     #--------------------------#
     #-- VMWARE TOOLS METHODS --#
@@ -1665,37 +1658,48 @@ class VIVirtualMachine(VIManagedEntity):
     #-- PRIVATE METHODS --#
     #---------------------#
 
-    def __create_snapshot_list(self):
-        """Creates a VISnapshot list with the snapshots this VM has. Stores that
-        list in self._snapshot_list"""
-
-        def create_list(snap_list=[], cur_node=None):
-            #first create the trees of snapshots
-            if not cur_node:
-                children = self._root_snapshots
-            else:
-                children = cur_node.get_children()
-
-            for snap in children:
-                    snap_list.append(snap)
-                    create_list(snap_list, snap)
-
-            return snap_list
-
-        self._snapshot_list = create_list()
-
-        path_list = []
-        for snap in self._snapshot_list:
-            path_list.append(snap.get_path())
+    def __update_snapshots(self, snapshot):
+        """Rebuilds the snapshot tree and list from @snapshot, the VIProperty
+        of the VM 'snapshot' property (None if the VM has no snapshots)"""
+        self.__current_snapshot = None
+        root_snapshots = []
+        if snapshot is not None:
+            if hasattr(snapshot, "currentSnapshot"):
+                self.__current_snapshot = snapshot.currentSnapshot._obj
 
-        path_list = list(set([x for x in path_list if path_list.count(x) > 1]))
+            for root_snap in snapshot.rootSnapshotList:
+                root = VISnapshot(root_snap)
+                root_snapshots.append(root)
+        self._root_snapshots = root_snapshots
+        self.__create_snapshot_list()
 
-        for snap_path in path_list:
-            v = 0
-            for snap in self._snapshot_list:
-                if(snap.get_path() == snap_path):
-                    snap._index = v
-                    v += 1
+    def __create_snapshot_list(self):
+        """Creates a VISnapshot list with the snapshots this VM has. Stores that
+        list in self._snapshot_list, and indexes the snapshots by name (the
+        first one found), by (path, index) and by MOR"""
+        snap_list = []
+        by_name = {}
+        by_path = {}
+        by_mor = {}
+        #depth first, children in order
+        pending = self._root_snapshots[::-1]
+        while pending:
+            snap = pending.pop()
+            snap_list.append(snap)
+            path = snap.get_path()
+            index = 0
+            while (path, index) in by_path:
+                index += 1
+            snap._index = index
+            by_path[(path, index)] = snap
+            by_name.setdefault(snap._name, snap)
+            by_mor[str(snap._mor)] = snap
+            pending.extend(snap.get_children()[::-1])
+
+        self._snapshot_list = snap_list
+        self._snapshots_by_name = by_name
+        self._snapshots_by_path = by_path
+        self._snapshots_by_mor = by_mor
 
     def __create_pendant_task_collector(self):
         """sets the MOR of a TaskHistoryCollector which will retrieve
@@ -1929,19 +1933,7 @@ class VIVirtualMachine(VIManagedEntity):
 
         #----------------------#
         #-- UPDATE SNAPSHOTS --#
-
-        root_snapshots = []
-        if hasattr(self.properties, "snapshot"):
-            if hasattr(self.properties.snapshot, "currentSnapshot"):
-                self.__current_snapshot = \
-                                   self.properties.snapshot.currentSnapshot._obj
-
-
-            for root_snap in self.properties.snapshot.rootSnapshotList:
-                root = VISnapshot(root_snap)
-                root_snapshots.append(root)
-        self._root_snapshots = root_snapshots
-        self.__create_snapshot_list()
+        self.__update_snapshots(getattr(self.properties, "snapshot", None))
 
         #-----------------------#
         #-- SET RESOURCE POOL --#
@@ -0,0 +1,241 @@
+#--
+# Copyright (c) 2012, Sebastian Tello
+# All rights reserved.
+
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+#   * Redistributions of source code must retain the above copyright notice,
+#     this list of conditions and the following disclaimer.
+#   * Redistributions in binary form must reproduce the above copyright notice,
+#     this list of conditions and the following disclaimer in the documentation
+#     and/or other materials provided with the distribution.
+#   * Neither the name of copyright holders nor the names of its contributors
+#     may be used to endorse or promote products derived from this software
+#     without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+#--
+
+import threading
+import time
+
+from pysphere.resources import VimService_services as VI
+from pysphere.resources.vi_exception import VIApiException
+from pysphere.vi_mor import MORTypes
+
+class VIVMIndex(object):
+
+    PROPERTIES = ['name', 'config.files.vmPathName']
+
+    def __init__(self, server, max_age=0):
+        """Indexes the VMs of @server by name and by path (the vmx file path)
+        for each datacenter. The index is loaded once and then kept up to date
+        with the changes reported by a property collector.
+          * server: a connected VIServer instance
+          * max_age: lookups poll the collector for changes if the last poll
+            is older than this number of seconds, or if they miss and the poll
+            wasn't done by that same lookup. 0 polls on every lookup, if None
+            changes are only applied when update() is called.
+        """
+        self.max_age = max_age
+        self._server = server
+        self._lock = threading.RLock()
+        self.__load()
+
+    def update(self):
+        """Applies the changes reported by the property collector since the
+        last update"""
+        self._lock.acquire()
+        try:
+            try:
+                self.__update()
+            except VIApiException:
+                #the collector doesn't survive the session (e.g. after a
+                #re-login), start over
+                self.destroy()
+                self.__load()
+        finally:
+            self._lock.release()
+
+    def find_by_name(self, name, datacenter=None):
+        """Returns a list with the MORs of the VMs named @name, sorted by MOR.
+        If the name or MOR of a datacenter is given, only the VMs in it are
+        returned"""
+        return self.__find('_by_name', name, datacenter)
+
+    def find_by_path(self, path, datacenter=None):
+        """Returns a list with the MORs of the VMs whose vmx file is @path
+        (e.g. '[datastore1] vm1/vm1.vmx'), sorted by MOR. If the name or MOR
+        of a datacenter is given, only the VMs in it are returned"""
+        return self.__find('_by_path', path, datacenter)
+
+    def get_datacenters(self, datacenter=None):
+        """Returns a list with the MORs of the datacenters indexed. If the name
+        or MOR of a datacenter is given, only that one (if indexed)"""
+        self._lock.acquire()
+        try:
+            datacenters = sorted(self._datacenters.iteritems())
+        finally:
+            self._lock.release()
+        return [mor for mor, name in datacenters
+                if not datacenter or datacenter in (str(mor), name)]
+
+    def destroy(self):
+        """Releases the property collector (or its filters) on the server"""
+        self._lock.acquire()
+        try:
+            collector = self._collector
+            filters = self._filters.values()
+            self._collector = None
+            self._filters = {}
+        finally:
+            self._lock.release()
+        if collector is None:
+            return
+        try:
+            if collector is not self._server._do_service_content.\
+                                                              PropertyCollector:
+                request = VI.DestroyPropertyCollectorRequestMsg()
+                _this = request.new__this(collector)
+                _this.set_attribute_type(MORTypes.PropertyCollector)
+                request.set_element__this(_this)
+                self._server._proxy.DestroyPropertyCollector(request)
+            else:
+                for mor_filter, datacenter in filters:
+                    request = VI.DestroyPropertyFilterRequestMsg()
+                    _this = request.new__this(mor_filter)
+                    _this.set_attribute_type(MORTypes.PropertyFilter)
+                    request.set_element__this(_this)
+                    self._server._proxy.DestroyPropertyFilter(request)
+        except (VI.ZSI.FaultException):
+            #the server destroys them along with the session anyway
+            pass
+
+    def __load(self):
+        self._version = ''
+        self._last_update = None
+        self._vms = {}
+        self._by_name = {}
+        self._by_path = {}
+        self._datacenters = self._server.get_datacenters()
+        self._collector = self.__create_collector()
+        self._filters = {}
+        for datacenter in self._datacenters.iterkeys():
+            mor_filter = self._server._create_filter(self.PROPERTIES,
+                                             from_node=datacenter,
+                                             obj_type=MORTypes.VirtualMachine,
+                                             collector=self._collector)
+            self._filters[str(mor_filter)] = (mor_filter, datacenter)
+        self.__update()
+
+    def __create_collector(self):
+        """Creates a private property collector, so the updates this index
+        waits for don't get mixed with the session's filters. Servers prior to
+        API 4.0 share the session collector."""
+        content = self._server._do_service_content
+        if self._server.get_api_version() < "4.0":
+            return content.PropertyCollector
+        try:
+            request = VI.CreatePropertyCollectorRequestMsg()
+            _this = request.new__this(content.PropertyCollector)
+            _this.set_attribute_type(MORTypes.PropertyCollector)
+            request.set_element__this(_this)
+            return self._server._proxy.CreatePropertyCollector(
+                                                            request)._returnval
+        except (VI.ZSI.FaultException), e:
+            raise VIApiException(e)
+
+    def __update(self):
+        while True:
+            update_set = self._server._wait_for_updates(self._version,
+                                                      max_wait_seconds=0,
+                                                      collector=self._collector)
+            if not update_set:
+                break
+            self._version = update_set.Version
+            for filter_update in getattr(update_set, "FilterSet", None) or []:
+                mor_filter = self._filters.get(str(filter_update.Filter))
+                if not mor_filter:
+                    continue
+                for object_update in getattr(filter_update, "ObjectSet",
+                                             None) or []:
+                    self.__apply(mor_filter[1], object_update)
+            if not getattr(update_set, "Truncated", False):
+                break
+        self._last_update = time.time()
+
+    def __apply(self, datacenter, object_update):
+        key = str(object_update.Obj)
+        entry = self._vms.get(key)
+        if object_update.Kind == 'leave':
+            #a VM moving to another datacenter might have entered it first
+            if entry and entry[1] == datacenter:
+                self.__remove(key)
+            return
+        name = path = None
+        if entry:
+            name, path = entry[2], entry[3]
+        for change in getattr(object_update, "ChangeSet", None) or []:
+            value = None
+            if change.Op not in ('remove', 'indirectRemove'):
+                value = getattr(change, "Val", None)
+            if change.Name == 'name':
+                name = value
+            elif change.Name == 'config.files.vmPathName':
+                path = value
+        self.__remove(key)
+        entry = (object_update.Obj, datacenter, name, path)
+        self._vms[key] = entry
+        if name is not None:
+            self._by_name.setdefault(name, {})[key] = entry
+        if path is not None:
+            self._by_path.setdefault(path, {})[key] = entry
+
+    def __remove(self, key):
+        entry = self._vms.pop(key, None)
+        if not entry:
+            return
+        for index, value in ((self._by_name, entry[2]),
+                             (self._by_path, entry[3])):
+            entries = index.get(value)
+            if entries is not None:
+                entries.pop(key, None)
+                if not entries:
+                    del index[value]
+
+    def __find(self, index, value, datacenter):
+        #index is the attribute name, update() may load new indexes
+        polled = False
+        if self.max_age is not None and (self._last_update is None or
+                              time.time() - self._last_update >= self.max_age):
+            self.update()
+            polled = True
+        entries = self.__lookup(index, value, datacenter)
+        if not entries and self.max_age is not None and not polled:
+            #the VM might have been created since the last poll
+            self.update()
+            entries = self.__lookup(index, value, datacenter)
+        #names might be duplicated, the order must not depend on the dict's
+        entries.sort()
+        return [mor for key, mor in entries]
+
+    def __lookup(self, index, value, datacenter):
+        self._lock.acquire()
+        try:
+            entries = getattr(self, index).get(value, {}).items()
+            datacenters = self._datacenters
+        finally:
+            self._lock.release()
+        return [(key, e[0]) for key, e in entries if not datacenter or
+                datacenter in (str(e[1]), datacenters.get(e[1]))]
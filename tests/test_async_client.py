@@ -0,0 +1,140 @@
+import time
+import socket
+import threading
+from unittest import TestCase
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from pysphere.ZSI import TC, FaultException
+from pysphere.ZSI.client import Binding
+from pysphere.ZSI.async_client import AsyncBinding, EventLoop, gather
+
+REPLY = ('<?xml version="1.0" encoding="UTF-8"?>'
+         '<soapenv:Envelope '
+         'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/">'
+         '<soapenv:Body>%s</soapenv:Body></soapenv:Envelope>')
+PONG = '<ns:PingResponse xmlns:ns="urn:test">pong</ns:PingResponse>'
+FAULT = ('<soapenv:Fault><faultcode>ServerFaultCode</faultcode>'
+         '<faultstring>ping refused</faultstring></soapenv:Fault>')
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers['content-length']))
+        server.lock.acquire()
+        server.requests.append((self.path, self.headers.get('cookie'), body))
+        server.active += 1
+        server.max_active = max(server.max_active, server.active)
+        server.lock.release()
+        time.sleep(server.delay)
+        server.lock.acquire()
+        server.active -= 1
+        server.lock.release()
+
+        if self.path == '/fault':
+            status, data = 500, REPLY % FAULT
+        else:
+            status, data = 200, REPLY % PONG
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Set-Cookie', 'vmware_soap_session="session-1"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        #clients that timed out close the connection before the reply
+        pass
+
+class AsyncBindingTest(TestCase):
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.active = self.server.max_active = 0
+        self.server.delay = 0
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _binding(self, path='/sdk', **kw):
+        return Binding(url=self.url + path, **kw)
+
+    def _ping(self, async_binding):
+        return async_binding.Call('ping', TC.String(pname=('urn:test',
+                                                           'PingResponse')),
+                                  requesttypecode=TC.String(pname='Ping'))
+
+    def test_call(self):
+        async_binding = AsyncBinding(self._binding())
+        assert self._ping(async_binding).result(timeout=10) == 'pong'
+        path, cookie, body = self.server.requests[0]
+        assert path == '/sdk'
+        assert '>ping</Ping>' in body
+
+    def test_max_per_host(self):
+        self.server.delay = 0.2
+        async_binding = AsyncBinding(self._binding(), max_per_host=2)
+        results = [self._ping(async_binding) for i in range(6)]
+        assert self.server.max_active <= 2
+        values = gather(async_binding.loop, results).result(timeout=30)
+        assert values == ['pong'] * 6
+        assert self.server.max_active == 2
+        assert len(self.server.requests) == 6
+        assert not async_binding.loop.pending()
+
+    def test_fault(self):
+        async_binding = AsyncBinding(self._binding('/fault'))
+        result = self._ping(async_binding)
+        self.assertRaises(FaultException, result.result, 10)
+        assert result.failed()
+
+    def test_connection_refused(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%d/sdk' % sock.getsockname()[1]
+        sock.close()
+        async_binding = AsyncBinding(Binding(url=url))
+        self.assertRaises(socket.error, self._ping(async_binding).result, 10)
+        #the slot of the failed request is released
+        assert async_binding._active.values() == [0]
+
+    def test_timeout(self):
+        self.server.delay = 1
+        async_binding = AsyncBinding(self._binding(transdict={'timeout':0.2}))
+        self.assertRaises(socket.timeout, self._ping(async_binding).result, 10)
+
+    def test_cookies(self):
+        binding = self._binding()
+        async_binding = AsyncBinding(binding)
+        self._ping(async_binding).result(timeout=10)
+        assert binding.cookies['vmware_soap_session'].value == 'session-1'
+        self._ping(async_binding).result(timeout=10)
+        assert self.server.requests[0][1] is None
+        assert 'vmware_soap_session="session-1"' in self.server.requests[1][1]
+
+class EventLoopTest(TestCase):
+
+    def test_call_later(self):
+        loop = EventLoop()
+        calls = []
+        loop.call_later(0.1, calls.append, 2)
+        loop.call_later(0, calls.append, 1)
+        cancelled = loop.call_later(0.05, calls.append, 3)
+        loop.cancel_call(cancelled)
+        loop.run(timeout=5)
+        assert calls == [1, 2]
+        assert not loop.pending()
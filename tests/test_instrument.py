@@ -0,0 +1,58 @@
+import socket
+import threading
+from unittest import TestCase
+
+from pysphere.ZSI import TC
+from pysphere.ZSI.client import Binding
+from pysphere.ZSI.instrument import Histograms
+
+from tests.test_async_client import _Handler, _Server
+
+class InstrumentTest(TestCase):
+
+    def _ping(self, binding):
+        binding.Send(None, 'Ping', 'ping',
+                     requesttypecode=TC.String(pname='Ping'))
+        return binding.Receive(TC.String(pname=('urn:test', 'PingResponse')))
+
+    def test_exchange(self):
+        server = _Server(('127.0.0.1', 0), _Handler)
+        server.lock = threading.Lock()
+        server.requests = []
+        server.active = server.max_active = 0
+        server.delay = 0
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            histograms = Histograms()
+            binding = Binding(url='http://127.0.0.1:%d/sdk' %
+                              server.server_address[1], instrument=histograms)
+            for _ in range(3):
+                assert self._ping(binding) == 'pong'
+        finally:
+            server.shutdown()
+            server.server_close()
+        stats = histograms.snapshot()['Ping']
+        assert stats['total']['count'] == 3
+        assert not stats['errors']
+        assert stats['request_bytes']['min'] == len(server.requests[0][2])
+        assert stats['response_bytes']['min'] > 0
+        for phase in ('serialize', 'connect', 'send', 'wait', 'read',
+                      'parse'):
+            assert stats['phases'][phase]['count'] == 3, phase
+        assert 'operation="Ping"' in histograms.prometheus()
+
+    def test_send_error(self):
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%d/sdk' % sock.getsockname()[1]
+        sock.close()
+        histograms = Histograms()
+        binding = Binding(url=url, instrument=histograms)
+        self.assertRaises(socket.error, self._ping, binding)
+        stats = histograms.snapshot()['Ping']
+        assert stats['errors'] == {'error':1}
+        assert stats['total']['count'] == 1
+        assert 'connect' in stats['phases']
+        assert 'send' not in stats['phases']
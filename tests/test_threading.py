@@ -5,7 +5,7 @@ import time
 import ConfigParser
 from unittest import TestCase
 
-from pysphere import VIServer
+from pysphere import VIServer, VISessionPool, VITask, VIMor, MORTypes
 
 class ThreadingTest(TestCase):
 
@@ -69,8 +69,75 @@ class ThreadingTest(TestCase):
         [t.join() for t in threads]
         
         assert self.passes
-        
-        
-        
-                
-        
\ No newline at end of file
+
+    def test_batch(self):
+        vms = self.server.get_registered_vms()
+        random.shuffle(vms)
+        vms = [self.server.get_vm_by_path(path) for path in vms[:10]]
+        expected = [vm.get_status(basic_status=True) for vm in vms]
+
+        batch = self.server.batch(max_workers=4, max_per_host=2)
+        for vm in vms:
+            batch.add(vm, 'get_status', basic_status=True)
+        items = batch.run(timeout=300)
+
+        assert [i.vm for i in items] == vms
+        assert [i.exception for i in items] == [None] * len(vms)
+        assert [i.result for i in items] == expected
+
+    def test_batch_tasks(self):
+        #finished tasks go through the same path as the ones started by
+        #operations called with sync_run=False
+        collector = self.server.get_task_history_collector()
+        tasks = collector.get_latest_tasks()[:5]
+        vm = self.server.get_vm_by_path(self.server.get_registered_vms()[0])
+
+        batch = self.server.batch(max_workers=2, check_interval=1)
+        items = []
+        for task in tasks:
+            def existing_task(vm, sync_run=True, task=task):
+                assert sync_run is False
+                return VITask(task._mor, self.server)
+            items.append(batch.add(vm, existing_task))
+        batch.run(timeout=120)
+
+        for item, task in zip(items, tasks):
+            assert item.task is not None
+            if task.get_state() == VITask.STATE_SUCCESS:
+                assert item.state == item.STATE_SUCCESS
+            else:
+                assert item.state == item.STATE_ERROR
+
+    def test_batch_missing_task(self):
+        vm = self.server.get_vm_by_path(self.server.get_registered_vms()[0])
+        purged = VIMor("task-pysphere-unexistent", MORTypes.Task)
+        batch = self.server.batch(check_interval=1, max_check_errors=2)
+        item = batch.add(vm, lambda vm, sync_run=True:
+                                                VITask(purged, self.server))
+        batch.run(timeout=60)
+        assert item.state == item.STATE_ERROR
+        assert isinstance(item.exception, Exception)
+
+    def test_session_pool(self):
+        hosts = self.server.get_hosts()
+        pool = VISessionPool(self.server, size=3,
+                             policy=VISessionPool.LEAST_LOADED)
+        self.passes = True
+        def check_result(times):
+            for _ in xrange(times):
+                try:
+                    if pool.call(lambda session: session.get_hosts()) != hosts:
+                        self.passes = False
+                except:
+                    self.passes = False
+        threads = [Thread(target=check_result, args=(random.randint(3, 6),))
+                   for i in range(6)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        [t.join() for t in threads]
+        assert pool.get_load() == [0, 0, 0]
+        assert pool.check_health() == 0
+        pool.close()
+
+        assert self.passes
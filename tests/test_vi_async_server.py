@@ -0,0 +1,68 @@
+import os
+import ConfigParser
+from unittest import TestCase
+
+from pysphere import VIServer, AsyncVIServer, VIMor, MORTypes, VIException, \
+                     VIApiException, FaultTypes
+
+class AsyncVIServerTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config_path = os.path.join(os.path.dirname(__file__), "config.ini")
+        cls.config = ConfigParser.ConfigParser()
+        cls.config.read(config_path)
+
+        host = cls.config.get("READ_ONLY_ENV", "host")
+        user = cls.config.get("READ_ONLY_ENV", "user")
+        pswd = cls.config.get("READ_ONLY_ENV", "password")
+
+        cls.server = VIServer()
+        cls.server.connect(host, user, pswd)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.disconnect()
+
+    def names(self, contents):
+        return dict([(o.Obj, o.PropSet[0].Val) for o in contents or []])
+
+    def test_not_connected(self):
+        try:
+            AsyncVIServer(VIServer())
+        except VIException, e:
+            assert e.fault == FaultTypes.NOT_CONNECTED
+        else:
+            raise AssertionError("VIException not raised")
+
+    def test_retrieve_properties_traversal(self):
+        async_server = AsyncVIServer(self.server, max_per_host=2)
+        types = [MORTypes.HostSystem, MORTypes.VirtualMachine,
+                 MORTypes.Datastore]
+        results = [async_server.retrieve_properties_traversal(['name'],
+                                                              obj_type=t)
+                   for t in types]
+        contents = async_server.gather(results).result(timeout=300)
+        for obj_type, found in zip(types, contents):
+            expected = self.server._retrieve_properties_traversal(['name'],
+                                                            obj_type=obj_type)
+            assert self.names(found) == self.names(expected)
+
+    def test_wait_for_task(self):
+        async_server = AsyncVIServer(self.server)
+        collector = self.server.get_task_history_collector()
+        tasks = collector.get_latest_tasks()[:5]
+        results = [async_server.wait_for_task(task, check_interval=1,
+                                              timeout=60)
+                   for task in tasks]
+        states = async_server.gather(results).result(timeout=300)
+        for task, state in zip(tasks, states):
+            assert state in (task.STATE_SUCCESS, task.STATE_ERROR)
+            assert state == task.get_state()
+
+    def test_api_fault(self):
+        async_server = AsyncVIServer(self.server)
+        vm = VIMor("vm-pysphere-unexistent", MORTypes.VirtualMachine)
+        result = async_server.power_on(vm)
+        self.assertRaises(VIApiException, result.result, 60)
+        assert result.failed()
@@ -1,10 +1,12 @@
 import os
 import random
+import pickle
 import ConfigParser
 from unittest import TestCase
 
-from pysphere import VIServer, VIProperty, MORTypes, VIException, FaultTypes, \
-                     VMPowerState, ToolsStatus
+from pysphere import VIServer, VIProperty, VIMor, MORTypes, VIException, \
+                     FaultTypes, VMPowerState, ToolsStatus
+from pysphere.ZSI.instrument import Histograms
 
 class VIServerTest(TestCase):
 
@@ -108,6 +110,30 @@ class VIServerTest(TestCase):
         assert sorted(all_vms) == sorted(vms_by_datacenter) == sorted(
                                                                  vms_by_root_rp)
 
+    def test_container_views(self):
+        for mo_type in (MORTypes.HostSystem, MORTypes.Datastore,
+                        MORTypes.ClusterComputeResource, MORTypes.Datacenter):
+            oc = self.server._retrieve_properties_traversal(
+                                        property_names=['name'],
+                                        obj_type=mo_type)
+            expected = dict([(o.Obj, o.PropSet[0].Val) for o in oc or []])
+            assert self.server._get_managed_objects(mo_type) == expected
+        for dc in self.server.get_datacenters().keys():
+            oc = self.server._retrieve_properties_traversal(
+                                        property_names=['name'],
+                                        from_node=dc,
+                                        obj_type=MORTypes.HostSystem)
+            expected = dict([(o.Obj, o.PropSet[0].Val) for o in oc or []])
+            assert self.server.get_hosts(from_mor=dc) == expected
+
+    def test_get_folder_by_name(self):
+        folders = self.server._get_managed_objects(MORTypes.Folder)
+        for mor, name in folders.items():
+            #duplicated names resolve to the lowest MOR
+            assert self.server._get_folder_by_name(name) == \
+                   min([m for m, n in folders.items() if n == name])
+        assert self.server._get_folder_by_name("zaraza") is None
+
     def test_get_registered_vms_by_datacenter(self):
         for dc_key, dc_name in self.server.get_datacenters().items():
             vms1 = self.server.get_registered_vms(datacenter=dc_key)
@@ -151,12 +177,111 @@ class VIServerTest(TestCase):
             assert vm.get_tools_status() in [ToolsStatus.RUNNING,
                                              ToolsStatus.RUNNING_OLD]
         
+    def test_iter_properties(self):
+        oc = self.server._retrieve_properties_traversal(
+                                               property_names=['name'],
+                                               obj_type=MORTypes.VirtualMachine)
+        expected = dict([(o.Obj, o.PropSet[0].Val) for o in oc])
+        found = dict([(mor, props['name']) for mor, props in
+                      self.server.iter_properties(MORTypes.VirtualMachine,
+                                                  ['name'], page_size=7,
+                                                  decode=True)])
+        assert found == expected
+
+        #stop early, the remaining pages are discarded
+        gen = self.server.iter_properties(MORTypes.VirtualMachine, ['name'],
+                                          page_size=1)
+        if expected:
+            assert gen.next().Obj in expected
+        gen.close()
+        assert self.server.is_connected()
+
     def test_is_connected(self):
         assert self.server.is_connected()
 
     def test_keep_session_alive(self):
         assert self.server.keep_session_alive()
+
+    def test_keepalive_relogin(self):
+        server = VIServer()
+        server.connect(self.config.get("READ_ONLY_ENV", "host"),
+                       self.config.get("READ_ONLY_ENV", "user"),
+                       self.config.get("READ_ONLY_ENV", "password"))
+        server.start_keepalive(interval=60)
+        hosts = server.get_hosts()
+        #drop the session cookie, the next request is not authenticated
+        server._proxy.binding.ResetCookies()
+        assert server.get_hosts() == hosts
+        server.disconnect()
+
+    def test_stream_writer(self):
+        server = VIServer()
+        server.connect(self.config.get("READ_ONLY_ENV", "host"),
+                       self.config.get("READ_ONLY_ENV", "user"),
+                       self.config.get("READ_ONLY_ENV", "password"),
+                       stream_writer=True)
+        assert server.get_hosts() == self.server.get_hosts()
+        assert (sorted(server.get_registered_vms()) ==
+                sorted(self.server.get_registered_vms()))
+        server.disconnect()
         
+    def test_mor_interning(self):
+        for mor in self.server.get_hosts().keys():
+            vimor = VIMor(mor, MORTypes.HostSystem)
+            for other in (VIMor(str(mor), MORTypes.HostSystem),
+                          pickle.loads(pickle.dumps(vimor))):
+                assert other == vimor
+                assert other.get_attribute_type() == MORTypes.HostSystem
+            folder = VIMor(mor, MORTypes.Folder)
+            assert folder.get_attribute_type() == MORTypes.Folder
+            self.assertRaises(TypeError, vimor.set_attribute_type,
+                              MORTypes.Folder)
+            assert vimor.get_attribute_type() == MORTypes.HostSystem
+
+    def test_compression(self):
+        server = VIServer()
+        server.connect(self.config.get("READ_ONLY_ENV", "host"),
+                       self.config.get("READ_ONLY_ENV", "user"),
+                       self.config.get("READ_ONLY_ENV", "password"),
+                       compression=True)
+        assert server.get_hosts() == self.server.get_hosts()
+        assert (sorted(server.get_registered_vms()) ==
+                sorted(self.server.get_registered_vms()))
+        server.disconnect()
+
+    def test_parallel_parse(self):
+        server = VIServer()
+        server.connect(self.config.get("READ_ONLY_ENV", "host"),
+                       self.config.get("READ_ONLY_ENV", "user"),
+                       self.config.get("READ_ONLY_ENV", "password"))
+        server.enable_parallel_parse(processes=2, min_objects=2, chunk_size=3)
+        assert (sorted(server.get_registered_vms()) ==
+                sorted(self.server.get_registered_vms()))
+        expected = dict(self.server.iter_properties(MORTypes.VirtualMachine,
+                                                    ['name'], decode=True))
+        found = dict(server.iter_properties(MORTypes.VirtualMachine, ['name'],
+                                            page_size=10, decode=True))
+        assert found == expected
+        server.disconnect()
+
+    def test_instrument(self):
+        histograms = Histograms()
+        server = VIServer()
+        server.connect(self.config.get("READ_ONLY_ENV", "host"),
+                       self.config.get("READ_ONLY_ENV", "user"),
+                       self.config.get("READ_ONLY_ENV", "password"),
+                       instrument=histograms)
+        server.get_hosts()
+        server.disconnect()
+        stats = histograms.snapshot()
+        for operation in ('RetrieveServiceContent', 'Login', 'Logout'):
+            assert stats[operation]['total']['count'] == 1
+            assert stats[operation]['response_bytes']['min'] > 0
+            for phase in ('serialize', 'connect', 'send', 'wait', 'read',
+                          'parse'):
+                assert phase in stats[operation]['phases']
+        assert 'operation="Login"' in histograms.prometheus()
+
     def test_api_version_and_server(self):
         assert self.server.get_api_version()
         assert self.server.get_server_type()
@@ -198,6 +323,28 @@ class VIServerTest(TestCase):
             else:
                 raise AssertionError("VM shouldn't be found")
                 
+    def test_vm_index(self):
+        server = VIServer()
+        server.connect(self.config.get("READ_ONLY_ENV", "host"),
+                       self.config.get("READ_ONLY_ENV", "user"),
+                       self.config.get("READ_ONLY_ENV", "password"))
+        server.enable_vm_index()
+        vms = self.server.get_registered_vms()
+        random.shuffle(vms)
+        for path in vms[:10]:
+            vm = self.server.get_vm_by_path(path)
+            name = vm.properties.name
+            assert server.get_vm_by_path(path)._mor == vm._mor
+            assert (server.get_vm_by_name(name)._mor ==
+                    self.server.get_vm_by_name(name)._mor)
+        try:
+            server.get_vm_by_name("zaraza")
+        except VIException, e:
+            assert e.fault == FaultTypes.OBJECT_NOT_FOUND
+        else:
+            assert False
+        server.disconnect()
+
     def test_get_object_properties(self):
         hosts = self.server.get_hosts()
         props = ['name', 'summary.config.vmotionEnabled']
@@ -232,6 +379,15 @@ class VIServerTest(TestCase):
                 if p.Name == 'name':
                     assert p.Val == name
                     
+    def test_get_object_properties_template(self):
+        #the second round is filled in from the templates of the first one
+        hosts = self.server.get_hosts()
+        for mor, name in hosts.items() * 2:
+            prop = self.server._get_object_properties(mor,
+                                                      property_names=['name'])
+            assert prop.Obj == mor
+            assert prop.PropSet[0].Val == name
+
     def test_get_object_properties_bulk(self):
         
         hosts = self.server.get_hosts()
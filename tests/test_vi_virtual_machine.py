@@ -105,6 +105,21 @@ class VIVirtualMachineTest(TestCase):
         vm.set_extra_config({'isolation.tools.diskWiper.disable':'TRUE',
                              'isolation.tools.diskShrink.disable':'TRUE'})
 
+    def test_snapshot_ops(self):
+        vm = self.vm_toy
+        count = len(vm.get_snapshots())
+        vm.create_snapshot("pysphere-test", memory=False, quiesce=False)
+        assert vm.get_current_snapshot_name() == "pysphere-test"
+        assert len(vm.get_snapshots()) == count + 1
+        assert vm.properties.snapshot.currentSnapshot._obj == \
+               [s for s in vm.get_snapshots()
+                if s.get_name() == "pysphere-test"][0]._mor
+        vm.rename_current_snapshot(new_name="pysphere-test2")
+        assert vm.get_current_snapshot_name() == "pysphere-test2"
+        vm.delete_named_snapshot("pysphere-test2")
+        vm.refresh_snapshot_list()
+        assert len(vm.get_snapshots()) == count
+
     def test_guest_power_ops(self):
         vm = self.start_vm_with_tools()
         time.sleep(20)
@@ -0,0 +1,128 @@
+from unittest import TestCase
+import sys
+
+from pysphere.ZSI import TC, EvaluateException, _children, \
+     _child_elements, _find_href, _find_arraytype
+from pysphere.ZSI.TC import Nilled, _is_xsd_or_soap_ns
+from pysphere.ZSI.parse import ParsedSoap
+from pysphere.ZSI.wstools.Namespaces import SOAP
+
+ENVELOPE = ('<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:soapenc="http://schemas.xmlsoap.org/soap/encoding/" '
+            'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+            '<soapenv:Body>%s</soapenv:Body></soapenv:Envelope>')
+
+class RecursiveAny(TC.Any):
+    '''The recursive parser Any had before the explicit stack'''
+
+    def parse_into_dict_or_list(self, elt, ps):
+        c = _child_elements(elt)
+        count = len(c)
+        v = []
+        if count == 0:
+            href = _find_href(elt)
+            if not href: return v
+            elt = ps.FindLocalHREF(href, elt)
+            self.checktype(elt, ps)
+            c = _child_elements(elt)
+            count = len(c)
+            if count == 0: return self.listify(v)
+        if self.nilled(elt, ps): return Nilled
+
+        for c_elt in c:
+            v.append((str(c_elt.localName),
+                      self.__class__(**self.kwargs).parse(c_elt, ps)))
+
+        return self.listify(v)
+
+    def parse(self, elt, ps):
+        (ns,type) = self.checkname(elt, ps)
+        if not type and self.nilled(elt, ps): return Nilled
+        if len(_children(elt)) == 0:
+            href = _find_href(elt)
+            if not href:
+                if self.minOccurs < 1:
+                    if _is_xsd_or_soap_ns(ns):
+                        parser = TC.Any.parsemap.get((None,type))
+                        if parser: return parser.parse(elt, ps)
+                    if ((ns,type) == (SOAP.ENC,'Array') or
+                        (_find_arraytype(elt) or '').endswith('[0]')):
+                        return []
+                    return None
+                raise EvaluateException('Required Any missing',
+                        ps.Backtrace(elt))
+            elt = ps.FindLocalHREF(href, elt)
+            (ns,type) = self.checktype(elt, ps)
+        if not type and elt.namespaceURI == SOAP.ENC:
+            ns,type = SOAP.ENC, elt.localName
+        if not type or (ns,type) == (SOAP.ENC,'Array'):
+            if self.aslist or _find_arraytype(elt):
+                return [ self.__class__(**self.kwargs).parse(e, ps)
+                            for e in _child_elements(elt) ]
+            if len(_child_elements(elt)) == 0:
+                return self.simple_value(elt, ps)
+            return self.parse_into_dict_or_list(elt, ps)
+        parser = TC.Any.parsemap.get((ns,type))
+        if not parser and _is_xsd_or_soap_ns(ns):
+            parser = TC.Any.parsemap.get((None,type))
+        if not parser:
+            raise EvaluateException('''Any can't parse element''',
+                    ps.Backtrace(elt))
+        return parser.parse(elt, ps)
+
+
+class AnyParseTest(TestCase):
+
+    def _compare(self, content, **kw):
+        ps = ParsedSoap(ENVELOPE % content)
+        value = TC.Any(**kw).parse(ps.body_root, ps)
+        expected = RecursiveAny(**kw).parse(ps.body_root, ps)
+        assert value == expected, (value, expected)
+        return value
+
+    def test_nested(self):
+        value = self._compare(
+            '<root><name xsi:type="xsd:string">vm</name>'
+            '<info><count xsi:type="xsd:int">3</count>'
+            '<flags><on xsi:type="xsd:boolean">true</on><off>false</off>'
+            '</flags><when xsi:type="xsd:double">1.5</when></info>'
+            '<text>plain</text></root>')
+        assert value['info']['flags']['on'] is True
+        self._compare('<root><a><b><c>1</c><d>2</d></b></a></root>',
+                      aslist=True)
+
+    def test_arrays(self):
+        self._compare(
+            '<root><list soapenc:arrayType="xsd:anyType[3]">'
+            '<item xsi:type="xsd:int">1</item><item>two</item>'
+            '<item><x>3</x></item></list>'
+            '<empty soapenc:arrayType="xsd:anyType[0]"/>'
+            '<soapenc:Array><item>a</item><item>b</item></soapenc:Array>'
+            '</root>')
+
+    def test_empty(self):
+        self._compare('<root><a/><b></b><c xsi:nil="true"/>'
+                      '<d xsi:type="xsd:string"/><e> </e>'
+                      '<f><!-- comment --></f><g>\n  <!-- c -->\n</g></root>',
+                      nillable=True)
+        value = self._compare('<root><!-- comment --></root>')
+        assert value == '', value
+        assert self._compare('<root>\n  \n</root>') == '\n  \n'
+
+    def test_href(self):
+        self._compare('<root><a href="#id1"/><b><c href="#id1"/></b></root>'
+                      '<shared id="id1"><x>1</x><y>two</y></shared>')
+
+    def test_deep(self):
+        depth = sys.getrecursionlimit() * 2
+        value = self._parse_deep(depth)
+        for _ in range(depth):
+            value = value['a']
+        assert value == 'leaf'
+
+    def _parse_deep(self, depth):
+        ps = ParsedSoap(ENVELOPE % ('<root>%sleaf%s</root>' %
+                                    ('<a>' * depth, '</a>' * depth)))
+        return TC.Any().parse(ps.body_root, ps)
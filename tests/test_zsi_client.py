@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import zlib
+import threading
+from unittest import TestCase
+
+from pysphere.ZSI import TC
+from pysphere.ZSI.TCcompound import Struct
+from pysphere.ZSI.client import Binding, RequestTemplate, _Decompressor, \
+     _gzip
+from pysphere.ZSI.wstools.Utility import StreamElementProxy
+
+from tests.test_async_client import REPLY, PONG, _Handler, _Server
+
+NS = 'urn:test'
+
+class _Request(object):
+    pass
+
+_Request.typecode = Struct(_Request,
+                           [TC.String(pname=(NS, 'name'), aname='name'),
+                            TC.String(pname=(NS, 'token'), aname='token'),
+                            TC.Iint(pname=(NS, 'count'), aname='count')],
+                           pname=(NS, 'Find'),
+                           attribute_typecode_dict={'key':TC.String()})
+
+def _request(name, token, key, count=3):
+    request = _Request()
+    request.name = name
+    request.token = token
+    request.count = count
+    request._attrs = {'key':key}
+    return request
+
+class RequestTemplateTest(TestCase):
+
+    def test_fill(self):
+        for writerclass in (None, StreamElementProxy):
+            binding = Binding(url='http://127.0.0.1/sdk',
+                              writerclass=writerclass)
+            placeholder = RequestTemplate.placeholder
+            template = RequestTemplate(binding,
+                                       _request(placeholder('name'),
+                                                placeholder('token'),
+                                                placeholder('key')))
+            assert template.names == frozenset(['name', 'token', 'key'])
+            for name, token, key in (
+                    ('vm-1', 'token', 'key'),
+                    ('a & b < c > d', '"quoted" & \'single\'', '<&>"'),
+                    (u'caf\xe9 中文', '', '\xc3\xbc & \xc3\xb6'),
+                    ('line\nbreak', 'tab\there', 'tab\tlf\ncr\rend')):
+                expected = str(binding.SerializeRequest(None, None,
+                                                _request(name, token, key)))
+                filled = template.fill(name=name, token=token, key=key)
+                assert filled == expected, (writerclass, filled, expected)
+
+    def test_placeholder_names(self):
+        self.assertRaises(ValueError, RequestTemplate.placeholder, 'a-b')
+
+
+PAYLOAD = REPLY % ''.join(['<ns:item xmlns:ns="urn:test">%d</ns:item>' % i
+                           for i in range(500)])
+
+def _deflate(data, wbits):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+ENCODED = (('gzip', _gzip(PAYLOAD)), ('x-gzip', _gzip(PAYLOAD)),
+           ('deflate', zlib.compress(PAYLOAD)),
+           ('deflate', _deflate(PAYLOAD, -zlib.MAX_WBITS)))
+
+class DecompressorTest(TestCase):
+
+    def _decompress(self, encoding, data, size):
+        decompressor = _Decompressor(encoding)
+        chunks = [decompressor.feed(data[i:i+size])
+                  for i in range(0, len(data), size)]
+        chunks.append(decompressor.flush())
+        return ''.join(chunks)
+
+    def test_whole(self):
+        for encoding, data in ENCODED:
+            assert self._decompress(encoding, data, len(data)) == PAYLOAD, \
+                   encoding
+
+    def test_split(self):
+        for encoding, data in ENCODED:
+            for size in (1, 2, 3, 7, 100, 1024):
+                assert self._decompress(encoding, data, size) == PAYLOAD, \
+                       (encoding, size)
+
+    def test_empty(self):
+        for encoding, data in (('gzip', _gzip('')),
+                               ('deflate', zlib.compress('')),
+                               ('deflate', _deflate('', -zlib.MAX_WBITS))):
+            assert self._decompress(encoding, data, 1) == '', encoding
+
+
+class _CompressingHandler(_Handler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['content-length']))
+        self.server.requests.append((self.path,
+                                     self.headers.get('accept-encoding'),
+                                     body))
+        encoding, data = ENCODED[int(self.path.split('/')[-1])]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class CompressedReplyTest(TestCase):
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _CompressingHandler)
+        self.server.requests = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.url = 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_read(self):
+        for i in range(len(ENCODED)):
+            for size in (1, 5, 8192):
+                binding = Binding(url='%s/sdk/%d' % (self.url, i),
+                                  compression=True)
+                binding.readChunkSize = size
+                binding.Send(None, 'Ping', 'ping',
+                             requesttypecode=TC.String(pname='Ping'))
+                assert binding.ReceiveRaw() == PAYLOAD, (ENCODED[i][0], size)
+        assert self.server.requests[0][1] == 'gzip, deflate'
@@ -0,0 +1,72 @@
+from unittest import TestCase
+
+from pysphere.ZSI import TC, TCnumbers, EvaluateException
+from pysphere.ZSI.TCcompound import ComplexType
+from pysphere.ZSI.parse import ParsedSoap
+
+NS = 'urn:test'
+ENVELOPE = ('<soapenv:Envelope '
+            'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+            'xmlns:t="urn:test" xmlns:o="urn:other"><soapenv:Body>'
+            '%s</soapenv:Body></soapenv:Envelope>')
+ITEM = '<t:item><t:name>%s</t:name><t:key>%d</t:key>%s</t:item>'
+
+def _typecode():
+    item = ComplexType(None,
+                [TC.String(pname=(NS, 'name'), aname='name'),
+                 TCnumbers.Iint(pname=(NS, 'key'), aname='key', minOccurs=0),
+                 TC.String(pname=(NS, 'tag'), aname='tag', minOccurs=0,
+                           maxOccurs='unbounded')],
+                pname=(NS, 'item'), aname='item', minOccurs=0,
+                maxOccurs='unbounded', specialized=True)
+    return ComplexType(None, [TC.String(pname=(NS, 'token'), aname='token',
+                                        minOccurs=0), item],
+                       pname=(NS, 'list'), specialized=True)
+
+class SpecializedParseTest(TestCase):
+
+    def _parse(self, content):
+        """Parses @content with the specialized and the generic parser,
+        returns both results or exceptions"""
+        results = []
+        for specialized in (True, False):
+            typecode = _typecode()
+            for what in typecode.ofwhat:
+                what.specialized = specialized
+            ps = ParsedSoap(ENVELOPE % content)
+            try:
+                if specialized:
+                    results.append(typecode.parse_specialized(ps.body_root, ps,
+                                                      typecode._specialize()))
+                else:
+                    results.append(typecode._parse_generic(ps.body_root, ps))
+            except EvaluateException, e:
+                results.append(e.__class__)
+        return results
+
+    def test_valid(self):
+        items = [ITEM % ('vm-%d' % i, i, '<t:tag>a</t:tag>' * (i % 3))
+                 for i in range(10)]
+        for content in ('<t:list><t:token>x</t:token>%s</t:list>'
+                                                             % ''.join(items),
+                        '<t:list>%s</t:list>' % items[1],
+                        '<t:list></t:list>',
+                        '<t:list>\n <t:item><t:name>n</t:name></t:item>\n'
+                        ' <!-- comment --></t:list>'):
+            specialized, generic = self._parse(content)
+            assert specialized == generic, (specialized, generic)
+            assert isinstance(specialized, dict)
+
+    def test_invalid(self):
+        for content in (
+                #unknown child
+                '<t:list>%s</t:list>' % (ITEM % ('a', 1, '<t:size>2</t:size>')),
+                #child in another namespace
+                '<t:list>%s</t:list>' % (ITEM % ('a', 1, '<o:tag>b</o:tag>')),
+                #missing required field
+                '<t:list><t:item><t:key>1</t:key></t:item></t:list>',
+                #non repeated field twice
+                '<t:list><t:token>x</t:token><t:token>y</t:token></t:list>'):
+            specialized, generic = self._parse(content)
+            assert specialized is generic is EvaluateException, \
+                   (content, specialized, generic)
@@ -0,0 +1,67 @@
+from unittest import TestCase
+
+from pysphere.ZSI import _find_type, _find_nil, _find_href, _find_attr, \
+     _find_arraytype
+from pysphere.ZSI.parse import ParsedSoap
+
+REPLY = '''<soapenv:Envelope
+ xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/"
+ xmlns:soapenc="http://schemas.xmlsoap.org/soap/encoding/"
+ xmlns:xsd="http://www.w3.org/2001/XMLSchema"
+ xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"
+ xmlns:xsi1999="http://www.w3.org/1999/XMLSchema-instance"><soapenv:Body>
+<root xmlns="urn:test" xmlns:t="urn:test">
+ <plain>text</plain>
+ <typed xsi:type="xsd:string">text</typed>
+ <typed1999 xsi1999:type="xsd:int">1</typed1999>
+ <nil xsi:nil="true"/>
+ <nil1 xsi:nil="1"/>
+ <nilfalse xsi:nil="false" t:other="x"/>
+ <null xsi1999:null="1"/>
+ <empty xsi:type="" xsi:nil=""/>
+ <ref href="#id1"/>
+ <noref href=""/>
+ <array soapenc:arrayType="xsd:anyType[2]" xsi:type="soapenc:Array">
+  <item>1</item><item>2</item>
+ </array>
+</root>
+<shared id="id1" xsi:type="xsd:string">shared</shared>
+</soapenv:Body></soapenv:Envelope>'''
+
+def _elements(node):
+    for child in node.childNodes:
+        if child.nodeType == child.ELEMENT_NODE:
+            yield child
+            for e in _elements(child):
+                yield e
+
+class ElementAttrsTest(TestCase):
+
+    def _check(self, ps, elt):
+        attrs = ps.GetElementAttrs(elt)
+        name = elt.localName
+        assert attrs.type == _find_type(elt), name
+        assert attrs.nil == _find_nil(elt), name
+        assert attrs.href == _find_href(elt), name
+        assert attrs.id == _find_attr(elt, 'id'), name
+        assert attrs.arraytype == _find_arraytype(elt), name
+
+    def test_lookups(self):
+        ps = ParsedSoap(REPLY)
+        elements = list(_elements(ps.dom))
+        assert len(elements) == 17
+        for _ in range(2):
+            for elt in elements:
+                self._check(ps, elt)
+
+    def test_other_documents(self):
+        ps = ParsedSoap(REPLY)
+        for elt in _elements(ps.dom):
+            self._check(ps, elt)
+        #elements of documents parsed and freed meanwhile may get the ids
+        #of cached ones
+        for i in range(20):
+            other = ParsedSoap(REPLY.replace('xsd:', 'xsd:t%d' % i))
+            for elt in _elements(other.dom):
+                self._check(ps, elt)
+            del other
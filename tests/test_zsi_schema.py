@@ -0,0 +1,140 @@
+from unittest import TestCase
+import multiprocessing
+
+from pysphere.resources import VimService_services as VI
+from pysphere.ZSI import parallel
+from pysphere.ZSI.parse import ParsedSoap
+from pysphere.ZSI.parallel import ParallelParser
+from pysphere.ZSI.schema import TypeDefinition
+
+REPLY = ('<?xml version="1.0" encoding="UTF-8"?>'
+         '<soapenv:Envelope '
+         'xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" '
+         'xmlns:xsd="http://www.w3.org/2001/XMLSchema" '
+         'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">'
+         '<soapenv:Body><RetrievePropertiesExResponse xmlns="urn:vim25">'
+         '<returnval><objects><obj type="VirtualMachine">vm-1</obj>'
+         '<propSet><name>config.hardware.device</name>'
+         '<val xsi:type="ArrayOfVirtualDevice">'
+         '<VirtualDevice xsi:type="VirtualDisk"><key>2000</key>'
+         '<deviceInfo><label>Hard disk 1</label><summary>16,777,216 KB'
+         '</summary></deviceInfo>'
+         '<backing xsi:type="VirtualDiskFlatVer2BackingInfo">'
+         '<fileName>[datastore1] vm-1/vm-1.vmdk</fileName>'
+         '<diskMode>persistent</diskMode></backing>'
+         '<controllerKey>1000</controllerKey><unitNumber>0</unitNumber>'
+         '<capacityInKB>16777216</capacityInKB></VirtualDevice>'
+         '<VirtualDevice xsi:type="VirtualE1000"><key>4000</key>'
+         '<deviceInfo><label>Network adapter 1</label><summary>VM Network'
+         '</summary></deviceInfo>'
+         '<backing xsi:type="VirtualEthernetCardNetworkBackingInfo">'
+         '<deviceName>VM Network</deviceName></backing>'
+         '<controllerKey>100</controllerKey><unitNumber>7</unitNumber>'
+         '<addressType>assigned</addressType></VirtualDevice>'
+         '</val></propSet></objects></returnval>'
+         '</RetrievePropertiesExResponse></soapenv:Body></soapenv:Envelope>')
+
+OBJECTS = REPLY[REPLY.index('<objects>'):REPLY.index('</returnval>')]
+
+def _reply(count):
+    return REPLY.replace(OBJECTS, ''.join([OBJECTS.replace('vm-1', 'vm-%d' % i)
+                                           for i in range(count)]))
+
+def _state(value):
+    '''Comparable form of a parsed value: pyclass instances become their
+    class name, typecode type, immutable base value and attributes.
+    '''
+    if isinstance(value, list):
+        return [_state(v) for v in value]
+    if not hasattr(value, 'typecode'):
+        return value
+    attrs = dict(getattr(value, '__dict__', {}))
+    for cls in type(value).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if hasattr(value, name):
+                attrs[name] = getattr(value, name)
+    base = isinstance(value, basestring) and str(value) or None
+    return (type(value).__name__, value.typecode.type, base,
+            sorted([(k, _state(v)) for k, v in attrs.iteritems()]))
+
+class SubstituteTypeTest(TestCase):
+
+    def setUp(self):
+        TypeDefinition._substitutes.clear()
+
+    def _devices(self):
+        response = ParsedSoap(REPLY).Parse(
+                                    VI.RetrievePropertiesExResponseMsg.typecode)
+        return response._returnval.Objects[0].PropSet[0].Val.VirtualDevice
+
+    def test_derived_types(self):
+        #the substitute typecodes are checked and cached by the first parse,
+        #the second one uses the cache
+        for i in range(2):
+            disk, nic = self._devices()
+            assert disk.typecode.type == ("urn:vim25", "VirtualDisk")
+            assert disk.Key == 2000
+            assert disk.CapacityInKB == 16777216
+            assert disk.Backing.typecode.type == ("urn:vim25",
+                                            "VirtualDiskFlatVer2BackingInfo")
+            assert disk.Backing.FileName == "[datastore1] vm-1/vm-1.vmdk"
+            assert nic.typecode.type == ("urn:vim25", "VirtualE1000")
+            assert nic.Backing.DeviceName == "VM Network"
+            assert nic.UnitNumber == 7
+
+
+class _NoCpuCount(object):
+    '''multiprocessing of platforms that can't count the CPUs'''
+    Pool = staticmethod(multiprocessing.Pool)
+
+    def cpu_count(self):
+        raise NotImplementedError('cpu_count')
+
+class _NoPool(_NoCpuCount):
+    '''multiprocessing of platforms without working semaphores'''
+
+    def Pool(self, *args):
+        raise ImportError('This platform lacks a functioning sem_open')
+
+class ParallelParserTest(TestCase):
+
+    def setUp(self):
+        self.typecode = VI.RetrievePropertiesExResponseMsg.typecode
+        self.data = _reply(20)
+        self.serial = ParsedSoap(self.data).Parse(self.typecode)
+
+    def tearDown(self):
+        parallel.multiprocessing = multiprocessing
+
+    def _parse(self, **kw):
+        parser = ParallelParser([VI.__name__], min_items=2, **kw)
+        try:
+            reply = parser.items('returnval', 'objects')(self.data,
+                                                         self.typecode)
+            return reply, parser._pool
+        finally:
+            parser.close()
+
+    def test_pool(self):
+        for chunk_size in (None, 1, 3, 100):
+            reply, _ = self._parse(processes=2, chunk_size=chunk_size)
+            assert reply is not None
+            objects = reply._returnval.Objects
+            assert [str(o.Obj) for o in objects] == ['vm-%d' % i
+                                                     for i in range(20)]
+            assert objects[7].Obj.get_attribute_type() == 'VirtualMachine'
+            assert _state(reply) == _state(self.serial), chunk_size
+
+    def test_cpu_count(self):
+        parallel.multiprocessing = _NoCpuCount()
+        reply, (pool, processes) = self._parse()
+        assert processes == 2
+        assert _state(reply) == _state(self.serial)
+
+    def test_serial_fallback(self):
+        parallel.multiprocessing = None
+        reply, pool = self._parse()
+        assert reply is pool is None
+        parallel.multiprocessing = _NoPool()
+        reply, (pool, _) = self._parse()
+        assert reply is pool is None
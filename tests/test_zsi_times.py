@@ -0,0 +1,61 @@
+from unittest import TestCase
+from calendar import timegm
+from datetime import datetime
+import time
+
+from pysphere.ZSI.TCtimes import gDateTime, Gregorian
+
+CANONICAL = ['2013-01-01T10:20:30', '2013-07-15T23:59:59.5',
+             '2013-01-01T10:20:30.123456', '2013-07-01T00:00:00Z',
+             '2013-12-31T23:30:00.25Z', '2013-01-01T10:20:30+02:00',
+             '2013-07-01T01:00:00.75+05:30', '2013-01-01T22:20:30-05:00',
+             '2013-07-01T20:00:00.001-09:30']
+
+class gDateTimeTest(TestCase):
+
+    def _parse(self, text, output):
+        return gDateTime(output=output).text_to_data(text, None, None)
+
+    def test_fast_path(self):
+        typecode = gDateTime()
+        for text in CANONICAL:
+            assert typecode.text_to_data(text, None, None) == \
+                   Gregorian.text_to_data(typecode, text, None, None), text
+
+    def test_outputs(self):
+        for text, epoch in (('2013-07-01T00:00:00Z', 1372636800.0),
+                            ('2013-12-31T23:30:00.25Z', 1388532600.25),
+                            ('2013-01-01T10:20:30+02:00', 1357028430.0),
+                            ('2013-07-01T01:00:00.75+05:30', 1372620600.75),
+                            ('2013-01-01T22:20:30-05:00', 1357096830.0),
+                            ('1970-01-01T00:00:00Z', 0.0),
+                            ('1970-01-01T00:00:00.25+01:00', -3599.75),
+                            ('1969-12-31T23:59:59.5Z', -0.5),
+                            ('1970-01-02T10:00:00-02:00', 129600.0)):
+            assert self._parse(text, 'epoch') == epoch, text
+            local = datetime.fromtimestamp(epoch)
+            assert self._parse(text, 'datetime') == local, text
+            if int(text[:4]) > 1970:
+                assert self._parse(text, 'tuple') == \
+                       local.timetuple()[:6] + (local.microsecond // 1000,
+                                                0, 0), text
+
+    def test_outputs_local_time(self):
+        for text in ('2013-01-01T10:20:30', '2013-07-15T23:59:59.5',
+                     '1970-01-01T00:00:00.125'):
+            fields = tuple([int(x) for x in (text[:4], text[5:7], text[8:10],
+                            text[11:13], text[14:16], text[17:19])])
+            fraction = float('0' + text[19:])
+            assert self._parse(text, 'epoch') == \
+                   time.mktime(fields + (0, 0, -1)) + fraction, text
+            assert self._parse(text, 'datetime') == \
+                   datetime(*fields + (int(fraction * 1000000),)), text
+            assert self._parse(text, 'tuple') == \
+                   fields + (int(fraction * 1000), 0, 0), text
+
+    def test_keywords(self):
+        typecode = gDateTime('when', 'alias', output='epoch')
+        assert typecode.aname == 'alias'
+        assert typecode.output == 'epoch'
+        assert gDateTime('when').output == 'tuple'
+        self.assertRaises(ValueError, gDateTime, 'when', output='time')
@@ -0,0 +1,34 @@
+from unittest import TestCase
+from xml.dom import minidom
+
+from pysphere.ZSI import TC, SoapWriter
+from pysphere.ZSI.TCcompound import Struct
+from pysphere.ZSI.wstools.Utility import ElementProxy, StreamElementProxy
+
+NS = 'urn:test'
+
+class Holder(object):
+    pass
+
+class StreamWriterTest(TestCase):
+
+    def _serialize(self, outputclass, pyobj, typecode):
+        sw = SoapWriter(outputclass=outputclass)
+        sw.serialize(pyobj, typecode)
+        return str(sw)
+
+    def test_xml_content(self):
+        doc = minidom.parseString(
+            '<o:root xmlns:o="urn:other" xmlns:p="urn:p"><o:a o:x="1 &amp; 2">'
+            'text &lt;<!-- comment --><p:b/><![CDATA[<c>]]></o:a>'
+            '</o:root>')
+        typecode = Struct(Holder, [TC.String(pname=(NS, 'name'),
+                                             aname='name'),
+                                   TC.XML(pname=(NS, 'data'), aname='data')],
+                          pname=(NS, 'holder'))
+        pyobj = Holder()
+        pyobj.name = u'a & b \xe9'
+        pyobj.data = doc.documentElement.firstChild
+        expected = self._serialize(ElementProxy, pyobj, typecode)
+        assert self._serialize(StreamElementProxy, pyobj, typecode) == \
+               expected, expected